@@ -1,17 +1,17 @@
 import discord
-import sqlite3
-from cogs.danisen import *
-import json
-import os
 import logging
-from constants import CONFIG_PATH
+import os
+from cogs.danisen import Danisen
+from utils.members import member_cache_options
+from constants import CONFIG_PATH, MEMBER_CACHE_MODE
 
 
 def create_bot(con):
     intents = discord.Intents.default()
     intents.members = True
 
-    bot = discord.Bot(intents=intents)
+    # Large servers don't need every member cached, the cog fetches the ones it needs
+    bot = discord.Bot(intents=intents, **member_cache_options(os.getenv('MEMBER_CACHE', MEMBER_CACHE_MODE)))
 
     bot.add_cog(Danisen(bot,con,CONFIG_PATH))
 
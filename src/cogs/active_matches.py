@@ -0,0 +1,165 @@
+import itertools
+import time
+from cogs.database import DanisenRow
+
+class ActiveMatch:
+    """A match that has been made and not yet reported, cancelled or expired"""
+    __slots__ = ("match_id", "p1", "p2", "started_at", "report_message", "ongoing_message")
+
+    def __init__(self, match_id, p1, p2, started_at):
+        self.match_id = match_id
+        self.p1 = p1  # Queue entries of both players
+        self.p2 = p2
+        self.started_at = started_at  # unix time
+        self.report_message = None  # (channel_id, message_id) of the message with the report dropdown
+        self.ongoing_message = None  # (channel_id, message_id) of the post in the ongoing matches channel
+
+    def players(self):
+        return (self.p1['discord_id'], self.p2['discord_id'])
+
+class ActiveMatches:
+    """Open matches of one guild by match id, with each player's match for O(1) lookups.
+
+    Each match holds one of the guild's max_active_matches slots until end() is called for it, so
+    the number of slots in use is always len(self). end() only frees a match once, so a report
+    racing a cancel or an expiry can't free a slot twice. With a MatchStore, matches are also kept in
+    the database and their ids come from it.
+    """
+    def __init__(self, clock=time.time, store=None):
+        self.clock = clock
+        self.store = store
+        self.matches = {}  # Format: match_id: ActiveMatch, oldest first
+        self.by_player = {}  # Format: discord_id: match_id
+        self.ids = itertools.count(1)
+
+    def __len__(self):
+        return len(self.matches)
+
+    def __iter__(self):
+        return iter(self.matches.values())
+
+    def _add(self, match):
+        self.matches[match.match_id] = match
+        for discord_id in match.players():
+            self.by_player[discord_id] = match.match_id
+
+    def start(self, p1, p2):
+        match = ActiveMatch(None, p1, p2, self.clock())
+        match.match_id = next(self.ids) if self.store is None else self.store.add(match)
+        self._add(match)
+        return match
+
+    def restore(self):
+        # Loads the matches the store still has open, returns them
+        matches = self.store.load() if self.store is not None else []
+        for match in matches:
+            self._add(match)
+        return matches
+
+    def update(self, match):
+        # Saves changes to a match's message ids
+        if self.store is not None:
+            self.store.update(match)
+
+    def get(self, match_id):
+        return self.matches.get(match_id)
+
+    def for_player(self, discord_id):
+        match_id = self.by_player.get(discord_id)
+        return None if match_id is None else self.matches[match_id]
+
+    def end(self, match_id):
+        # Removes the match and returns it, or None if it had already ended
+        match = self.matches.pop(match_id, None)
+        if match is not None:
+            for discord_id in match.players():
+                if self.by_player.get(discord_id) == match_id:
+                    del self.by_player[discord_id]
+            if self.store is not None:
+                self.store.remove(match_id)
+        return match
+
+    def clear(self):
+        self.matches.clear()
+        self.by_player.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def expires_at(self, expiry_seconds):
+        # Unix time the oldest match expires, or None if there are no matches or they don't expire
+        if not expiry_seconds or not self.matches:
+            return None
+        return next(iter(self.matches.values())).started_at + expiry_seconds
+
+    def expired(self, expiry_seconds):
+        # Matches started more than expiry_seconds ago
+        if not expiry_seconds:
+            return []
+        cutoff = self.clock() - expiry_seconds
+        return list(itertools.takewhile(lambda match: match.started_at <= cutoff, self.matches.values()))
+
+def _location(channel_id, message_id):
+    return (channel_id, message_id) if message_id else None
+
+class MatchStore:
+    """The active_matches rows of one guild, so open matches and their report dropdowns survive restarts"""
+    def __init__(self, con, guild_id):
+        self.con = con
+        self.guild_id = guild_id
+
+    def add(self, match):
+        # Saves a new match, returns its id
+        cur = self.con.execute(
+            "INSERT INTO active_matches (guild_id, p1_discord_id, p1_character, p2_discord_id, p2_character, started_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (self.guild_id, match.p1['discord_id'], match.p1['character'], match.p2['discord_id'], match.p2['character'], match.started_at)
+        )
+        self.con.commit()
+        return cur.lastrowid
+
+    def update(self, match):
+        report = match.report_message or (None, None)
+        ongoing = match.ongoing_message or (None, None)
+        self.con.execute(
+            "UPDATE active_matches SET report_channel_id=?, report_message_id=?, ongoing_channel_id=?, ongoing_message_id=? WHERE id=?",
+            (*report, *ongoing, match.match_id)
+        )
+        self.con.commit()
+
+    def remove(self, match_id):
+        self.con.execute("DELETE FROM active_matches WHERE id=?", (match_id,))
+        self.con.commit()
+
+    def clear(self):
+        self.con.execute("DELETE FROM active_matches WHERE guild_id=?", (self.guild_id,))
+        self.con.commit()
+
+    def player(self, discord_id, character):
+        # The player's queue entry as join_queue builds it, or None if they've unregistered since
+        row = self.con.execute(
+            "SELECT users.guild_id AS guild_id, users.discord_id AS discord_id, player_name, nickname, keyword, character, dan, points FROM players JOIN users ON players.guild_id = users.guild_id AND players.discord_id = users.discord_id WHERE users.guild_id=? AND users.discord_id=? AND character=?",
+            (self.guild_id, discord_id, character)
+        ).fetchone()
+        if row is None:
+            return None
+        player = DanisenRow(row)
+        player['requeue'] = False
+        return player
+
+    def load(self):
+        # Open matches oldest first. Matches whose players have unregistered since are dropped
+        matches = []
+        for row in self.con.execute("SELECT * FROM active_matches WHERE guild_id=? ORDER BY id", (self.guild_id,)).fetchall():
+            p1 = self.player(row['p1_discord_id'], row['p1_character'])
+            p2 = self.player(row['p2_discord_id'], row['p2_character'])
+            if p1 is None or p2 is None:
+                self.remove(row['id'])
+                continue
+            match = ActiveMatch(row['id'], p1, p2, row['started_at'])
+            match.report_message = _location(row['report_channel_id'], row['report_message_id'])
+            match.ongoing_message = _location(row['ongoing_channel_id'], row['ongoing_message_id'])
+            matches.append(match)
+        return matches
+
+def open_match_guilds(con):
+    """guild_ids with matches left open in the database"""
+    return [row[0] for row in con.execute("SELECT DISTINCT guild_id FROM active_matches").fetchall()]
@@ -1,163 +1,125 @@
 import discord
-import json
 import logging
-class MatchSelect(discord.ui.Select):
-    def __init__(self, bot, p1, p2, active_match_msg):
-        self.p1 = p1
-        self.p2 = p2
-        self.bot = bot
-        self.active_match_msg = active_match_msg
-
-        # Create and configure logger
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.DEBUG)
-
-        options = [
-            discord.SelectOption(
-                label=f"{p1['player_name']} ({p1['character']})",
-                description=f"{p1['player_name']}'s victory!"
-            ),
-            discord.SelectOption(
-                label=f"{p2['player_name']} ({p2['character']})",
-                description=f"{p2['player_name']}'s victory!"
-            ),
-            discord.SelectOption(
-                label="Cancel Match",
-                description="Cancel the match. This will remove both players from the queue."
-            )
-        ]
-    
-        super().__init__(
-            placeholder = "Report match winner",
-            min_values = 1,
-            max_values = 1,
-            options = options
-        )
-
-    async def callback(self, interaction: discord.Interaction):
-        await interaction.response.defer()
-        valid_ids = [self.p1['discord_id'], self.p2['discord_id']]
-
-        if interaction.user.id not in valid_ids and not interaction.user.guild_permissions.administrator:
-            return
-        self.disabled=True
-        self.view.disable_all_items()
-        self.view.stop()
-
-        self.logger.info("Match has been reported")
-
-        self.bot.cur_active_matches -= 1
-        self.logger.info(f"cur_active_matches reduced {self.bot.cur_active_matches}")
-
-        #remove players from match dict
-        self.bot.in_match[self.p1['discord_id']] = False
-        self.bot.in_match[self.p2['discord_id']] = False
-
-        self.logger.debug(f"match report callback recieved value {self.values[0]}")
-        self.logger.debug(f"match report player1 is {self.p1['player_name']} ({self.p1['character']})")
-
-        # Deletes message in #all-active-matches, if not None
-        if self.active_match_msg:
-            await self.active_match_msg.delete()
-
-        if self.values[0] == "Cancel Match":
-            self.logger.info(f"Match has been cancelled between {self.p1['player_name']} and {self.p2['player_name']}")
-            await interaction.respond(f"The match between <@{self.p1['discord_id']}>'s {self.p1['character']} and <@{self.p2['discord_id']}>'s {self.p2['character']} has been cancelled, and these player's characters will not be readded to the queue. Please rejoin the queue with these characters if you wish to keep matching.")
-            await interaction.message.delete()
-            return
-        elif self.values[0] == f"{self.p1['player_name']} ({self.p1['character']})":
-            await self.bot.report_match_queue(interaction, self.p1, self.p2, "player1")
-        elif self.values[0] == f"{self.p2['player_name']} ({self.p2['character']})":
-            await self.bot.report_match_queue(interaction, self.p1, self.p2, "player2")
-        else:
-            await interaction.respond(f"A match reporting error has occured, report didn't match either player. You should never see this.")
-
-        # Removed rejoining queue in favour of requeue button        
-        # if self.p1['requeue']:
-        #     self.bot.rejoin_queue(self.p1)
-        # if self.p2['requeue']:
-        #     self.bot.rejoin_queue(self.p2)
-
-        # await self.bot.matchmake(interaction) # disabling automatic matchmaking
-
-
-        await interaction.message.delete()
-
-class MatchView(discord.ui.View):
-    # json_path = r"C:\\Users\Deled\Desktop\Danisen\\_overlays\streamcontrol.json"
-    def __init__(self, bot, p1, p2, active_match_msg):
-        super().__init__(timeout=None)
-        self.p1 = p1
-        self.p2 = p2
-        self.add_item(MatchSelect(bot, p1, p2, active_match_msg))
-    
-    # @discord.ui.button(label="Update Stream", style=discord.ButtonStyle.primary)
-    # async def button_callback(self, button, interaction):
-    #     await interaction.response.defer()
-    #     if not interaction.user.guild_permissions.administrator:
-    #         return
-
-    #     with open(self.json_path, "r+") as f:
-    #         overlay = json.load(f)
-    #         overlay["mText1"] = self.p1["character"]
-    #         overlay["mText2"] = self.p2["character"]
-    #         overlay["p1Name"] = self.p1["player_name"]
-    #         overlay["p1Score"] = 0
-    #         overlay["p2Name"] = self.p2["player_name"]
-    #         overlay["p2Score"] = 0
-    #         f.seek(0)
-    #         f.truncate(0)
-    #         json.dump(overlay,f)
-
-    #     await interaction.respond("Stream Updated") 
-
-class RequeueView(discord.ui.View):
-    def __init__(self, bot, p1, p2):
-        super().__init__(timeout=120.0, disable_on_timeout=True)
-        self.bot = bot
-        self.p1 = p1
-        self.p2 = p2
-        self.p1_rejoined = False
-        self.p2_rejoined = False
-
-        # Create and configure logger
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.DEBUG)
-
-    @discord.ui.button(label="Click to re-join the matchmaking queue as the same character", style=discord.ButtonStyle.primary)
-    async def button_callback(self, button, interaction):
-        await interaction.response.defer()
-        self.logger.debug(f"User {interaction.user.name} requested to rejoin the queue with button")
-        valid_ids = [self.p1['discord_id'], self.p2['discord_id']]
-
-        if interaction.user.id not in valid_ids:
-            await interaction.respond(content=f"You weren't in this match, so you cannot use this button to rejoin the queue.", ephemeral=True)
-
-        if self.p1['discord_id'] == interaction.user.id and not self.p1_rejoined:
-            await self.bot.rejoin_queue(interaction, self.p1)
-            await interaction.respond(content=f"{self.p1['player_name']}'s {self.p1['character']} has rejoined the matchmaking queue!", ephemeral=True)
-            self.p1_rejoined = True
-        elif self.p2['discord_id'] == interaction.user.id and not self.p2_rejoined:
-            await self.bot.rejoin_queue(interaction, self.p2)
-            await interaction.respond(content=f"{self.p2['player_name']}'s {self.p2['character']} has rejoined the matchmaking queue!", ephemeral=True)
-            self.p2_rejoined = True
-        else:
-            await interaction.respond(content=f"You've already re-joined the queue.", ephemeral=True)
-
-    # Override default
-    async def on_timeout(self) -> None:
-        if self.disable_on_timeout:
-            self.disable_all_items()
-
-            if not self._message or self._message.flags.ephemeral:
-                message = self.parent
-            else:
-                message = self.message
-
-            if message:
-                m = await message.edit(view=None)
-                if m:
-                    self._message = m
-
-        
-
+from time import time
+from constants import CUSTOM_ID_PREFIX, REQUEUE_BUTTON_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Match messages carry no view objects. Their components have custom_ids of the form prefix:action:id, and
+# dispatch_component answers them from the active match store or the matches table, so they cost no memory
+# while they wait and keep working after a restart.
+
+def custom_id(action, target_id):
+    return f"{CUSTOM_ID_PREFIX}:{action}:{target_id}"
+
+def parse_custom_id(value):
+    # Returns (action, id) for one of our custom_ids, or None for anything else
+    prefix, _, rest = value.partition(":")
+    action, _, target_id = rest.partition(":")
+    if prefix != CUSTOM_ID_PREFIX or not target_id.isdigit():
+        return None
+    return action, int(target_id)
+
+def match_report_view(match):
+    # Report dropdown for an active match. Stop it once sent, so py-cord doesn't keep it in its view store
+    p1, p2 = match.p1, match.p2
+    view = discord.ui.View(timeout=None)
+    view.add_item(discord.ui.Select(
+        custom_id=custom_id("report", match.match_id),
+        placeholder="Report match winner",
+        min_values=1,
+        max_values=1,
+        options=[
+            discord.SelectOption(label=f"{p1['player_name']} ({p1['character']})", value="player1", description=f"{p1['player_name']}'s victory!"),
+            discord.SelectOption(label=f"{p2['player_name']} ({p2['character']})", value="player2", description=f"{p2['player_name']}'s victory!"),
+            discord.SelectOption(label="Cancel Match", value="cancel", description="Cancel the match. This will remove both players from the queue."),
+        ],
+    ))
+    return view
+
+def requeue_view(report_id):
+    # Requeue button under a reported match, report_id being its row in the matches table
+    view = discord.ui.View(timeout=None)
+    view.add_item(discord.ui.Button(
+        custom_id=custom_id("requeue", report_id),
+        label="Click to re-join the matchmaking queue as the same character",
+        style=discord.ButtonStyle.primary,
+    ))
+    return view
+
+async def handle_report(cog, interaction, match_id):
+    await interaction.response.defer()
+    engine = cog.get_engine(interaction.guild_id)
+    match = engine.active.get(match_id)
+    if match is None:
+        await interaction.respond("This match has already been reported, cancelled or expired.", ephemeral=True)
+        return
+    if interaction.user.id not in match.players() and not interaction.user.guild_permissions.administrator:
+        return
+
+    # Nothing is awaited between the lookup and ending the match, so only one report of it gets through
+    engine.end_match(match_id)
+    p1, p2 = match.p1, match.p2
+    choice = interaction.data["values"][0]
+    logger.info(f"Match {match_id} has been reported as {choice}")
+
+    # Deletes message in #all-active-matches, if any
+    await cog.delete_match_message(match.ongoing_message)
+
+    if choice == "cancel":
+        logger.info(f"Match has been cancelled between {p1['player_name']} and {p2['player_name']}")
+        await interaction.respond(f"The match between <@{p1['discord_id']}>'s {p1['character']} and <@{p2['discord_id']}>'s {p2['character']} has been cancelled, and these player's characters will not be readded to the queue. Please rejoin the queue with these characters if you wish to keep matching.")
+    elif choice in ("player1", "player2"):
+        await cog.report_match_queue(interaction, p1, p2, choice)
+    else:
+        await interaction.respond(f"A match reporting error has occured, report didn't match either player. You should never see this.")
+
+    await interaction.message.delete()
+
+async def handle_requeue(cog, interaction, report_id):
+    await interaction.response.defer()
+    logger.debug(f"User {interaction.user.name} requested to rejoin the queue with button")
+    report = cog.database_cur.execute(
+        "SELECT winner_discord_id, winner_character, loser_discord_id, loser_character, played_at FROM matches WHERE guild_id=? AND id=?",
+        (interaction.guild_id, report_id)
+    ).fetchone()
+    characters = {report['winner_discord_id']: report['winner_character'], report['loser_discord_id']: report['loser_character']} if report else {}
+
+    if interaction.user.id not in characters:
+        await interaction.respond(content=f"You weren't in this match, so you cannot use this button to rejoin the queue.", ephemeral=True)
+        return
+    if time() - (report['played_at'] or 0) > REQUEUE_BUTTON_SECONDS:
+        await interaction.message.edit(view=None)
+        await interaction.respond(content=f"This button has expired, please use /joinqueue instead.", ephemeral=True)
+        return
+
+    # Each player gets one requeue per report, or the button would keep putting them back after later matches
+    now = time()
+    cog.requeued = {key: used_at for key, used_at in cog.requeued.items() if now - used_at <= REQUEUE_BUTTON_SECONDS}
+    requeue_key = (interaction.guild_id, report_id, interaction.user.id)
+    character = characters[interaction.user.id]
+    engine = cog.get_engine(interaction.guild_id)
+    if engine.is_queued(interaction.user.id, character) or requeue_key in cog.requeued:
+        await interaction.respond(content=f"You've already re-joined the queue.", ephemeral=True)
+        return
+    if engine.is_in_match(interaction.user.id):
+        await interaction.respond(content=f"You are in an active match and cannot queue up", ephemeral=True)
+        return
+    await cog.rejoin_queue(interaction, {"discord_id": interaction.user.id, "character": character})
+    if engine.is_queued(interaction.user.id, character):
+        cog.requeued[requeue_key] = now
+    await interaction.respond(content=f"{interaction.user.name}'s {character} has rejoined the matchmaking queue!", ephemeral=True)
+
+COMPONENT_HANDLERS = {
+    "report": handle_report,
+    "requeue": handle_requeue,
+}
+
+async def dispatch_component(cog, interaction):
+    """Answers a component interaction on one of our messages. Returns False if it wasn't ours"""
+    parsed = parse_custom_id(interaction.data.get("custom_id", ""))
+    if parsed is None or parsed[0] not in COMPONENT_HANDLERS:
+        return False
+    action, target_id = parsed
+    await COMPONENT_HANDLERS[action](cog, interaction, target_id)
+    return True
@@ -1,9 +1,23 @@
-import discord, sqlite3, asyncio, json, logging, re
+import discord, sqlite3, asyncio, io, json, logging, math, re
 from discord.ext import commands, pages
 from cogs.database import *
 from cogs.custom_views import *
+from cogs.season import rollover_season, create_seasons_table
+from cogs.matchmaking import MatchmakingEngine
+from cogs.active_matches import MatchStore, open_match_guilds
+from cogs.recent_opponents import player_history
+from cogs.scoring import score_match
+from cogs.stats import StatsSnapshots
+from cogs.profiles import ProfileCache, query_profile
+from cogs.lazy_pages import LazyPages, list_source, query_source
+from utils.interactions import InteractionWatchdog, defer_once
+from utils.diagnostics import Diagnostics, count_instances
+from utils.members import MemberResolver
+from utils.ratelimit import RateLimiter, RateLimited
+from utils.config import LadderConfig, ConfigWatcher, guild_config_dict, parse_config_value
 import os
-from collections import deque
+from collections import Counter
+from functools import partial
 from constants import *
 from random import choice
 from datetime import datetime
@@ -12,6 +26,10 @@ from time import time
 class Danisen(commands.Cog):
     # Predefined constants
     players = ["player1", "player2"] # These are the presets for specifying which player won in /reportmatch, NOT danisen player names
+    # Commands that reply only to the user, so they're deferred the same way. A reply after a defer takes the defer's
+    # visibility, so every reply of these commands is ephemeral and every reply of the others is public
+    ephemeral_commands = {"leaderboard", "queuestats", "responsetimes", "profilebot", "memoryreport", "viewconfig", "setconfig", "getinvite"}
+    command_aliases = {"jq": "joinqueue", "lq": "leavequeue", "vq": "viewqueue"} # Short commands share their full command's rate limit
 
     def __init__(self, bot, database, config_path):
         # Initialize the cog
@@ -20,134 +38,249 @@ class Danisen(commands.Cog):
 
         self.bot = bot
         self.config_path = config_path
+        self.engines = {}  # Format: guild_id: MatchmakingEngine
+        self.profiles = ProfileCache()  # Rendered /profile embeds
+        self.members = MemberResolver()  # Members looked up by id, for when they aren't in py-cord's member cache
+        self.interaction_watchdog = InteractionWatchdog()  # Defers slow commands before Discord's 3 second deadline
+        self.rate_limiter = RateLimiter()  # Per user limits from the rate_limits setting
+        self.requeued = {}  # Format: (guild_id, report_id, discord_id): time the requeue button was used, see custom_views
+        self.diagnostics = Diagnostics(self.structure_sizes)  # On demand profiling for the bot owner
+        self.raw_config = {}  # Defaults until a config file loads, so a broken file at startup still leaves a working config
+        self.guild_configs = {}  # Format: guild_id: LadderConfig
+        self.runtime_overrides = {}  # Format: guild_id: {key: value} set by admin commands, kept across reloads but not saved
         self.update_config()
+        self.config_watcher_task = None
 
         # Database setup
         self.database_con = database
         self.database_con.row_factory = sqlite3.Row
         self.database_cur = self.database_con.cursor()
+        enable_wal(self.database_con)  # The stats thread reads on its own connection while reports commit
 
-        # Table for a discord user and profile config
-        self.database_cur.execute(f"CREATE TABLE IF NOT EXISTS users("
-                                                                    f"discord_id INT PRIMARY KEY,"
-                                                                    f"player_name TEXT NOT NULL,"
-                                                                    f"nickname TEXT,"
-                                                                    f"keyword TEXT"
-                                                                    f")")
-
-        # Table for characters registered by a discord user
-        self.database_cur.execute(f"CREATE TABLE IF NOT EXISTS players("
-                                                                    f"discord_id INT NOT NULL,"
-                                                                    f"character TEXT NOT NULL,"
-                                                                    f"dan INT NOT NULL,"
-                                                                    f"points FLOAT NOT NULL,"
-                                                                    f"FOREIGN KEY (discord_id) REFERENCES users ON UPDATE CASCADE ON DELETE CASCADE,"
-                                                                    f"PRIMARY KEY (discord_id, character)"
-                                                                    f")")
-
-        # Table for match history
-        self.database_cur.execute(f"CREATE TABLE IF NOT EXISTS matches("
-                                                                    f"id INTEGER PRIMARY KEY,"
-                                                                    f"winner_discord_id INT,"
-                                                                    f"winner_character TEXT,"
-                                                                    f"loser_discord_id INT,"
-                                                                    f"loser_character TEXT,"
-                                                                    f"FOREIGN KEY (winner_discord_id, winner_character) REFERENCES players(discord_id, character) ON UPDATE CASCADE ON DELETE SET NULL,"
-                                                                    f"FOREIGN KEY (loser_discord_id, loser_character) REFERENCES players(discord_id, character) ON UPDATE CASCADE ON DELETE SET NULL"
-                                                                    f")")
-
-        self.database_cur.execute(f"CREATE TABLE IF NOT EXISTS invites("
-                                                                    f"discord_id INT NOT NULL,"
-                                                                    f"invite_link TEXT,"
-                                                                    f"timestamp INTEGER," # uses unix time
-                                                                    f"FOREIGN KEY (discord_id) REFERENCES users (discord_id) ON UPDATE CASCADE ON DELETE CASCADE,"
-                                                                    f"PRIMARY KEY (discord_id)"
-                                                                    f")")
-
-        # Queue and matchmaking setup
-        self.dans_in_queue = {dan: deque() for dan in range(1, self.total_dans + 1)}
-        self.matchmaking_queue = deque()   
-        self.cur_active_matches = 0
-        self.in_queue = {}  # Format: discord_id@character: [in_queue, deque of last played discord_ids]
-        self.in_match = {}  # Format: discord_id: in_match
-        self.matchmaking_coro = None  # Task created with asyncio to run start_matchmaking after a set delay
-
-        # Synchronization
-        self.queue_lock = asyncio.Lock()
+        # Tables for users, their characters, match history and invites, all keyed by guild
+        setup_database(self.database_con)
+
+        # Table for finished seasons
+        create_seasons_table(self.database_cur)
+
+        self.season_rollover_running = set()  # guild_ids with a rollover in progress
+
+        # Rendered /danisenstats pages, refreshed in the background after changes
+        self.stats = StatsSnapshots(self.database_con, self.render_stats_pages)
+        self.stats_task = None
 
     def can_manage_role(self, bot_member, role):
         # Check if the bot can manage a specific role
         return bot_member.top_role.position > role.position and bot_member.guild_permissions.manage_roles
 
     def update_config(self):
-        # Load configuration from the config file
+        # Load configuration from the config file and swap every guild over to it. Returns False if the file was
+        # unreadable or invalid, in which case the current config is kept
         config = {}  # Initialize config as an empty dictionary
         try:
             if os.path.exists(self.config_path):
                 with open(self.config_path, 'r') as f:
                     config = json.load(f)
+            # Build every guild's config up front so a bad value can't leave some guilds swapped and others not
+            guild_configs = {guild_id: self.build_config(config, guild_id) for guild_id in self.engines}
+            self.build_config(config, None)
         except Exception as e:
-            self.logger.warning(f"Failed to load configuration: {str(e)}")  # Fix logging issue
-
-        # Set all configuration values
-
-        # DISCORD CHANNEL ID CONFIG
-        self.ACTIVE_MATCHES_CHANNEL_ID = int(config.get('ACTIVE_MATCHES_CHANNEL_ID', 0))
-        self.REPORTED_MATCHES_CHANNEL_ID = int(config.get('REPORTED_MATCHES_CHANNEL_ID', 0))
-        self.ONGOING_MATCHES_CHANNEL_ID = int(config.get('ONGOING_MATCHES_CHANNEL_ID', 0))
-        self.WELCOME_CHANNEL_ID = int(config.get('WELCOME_CHANNEL_ID', 0))
-        self.DANISEN_STATUS_CHANNEL_ID = int(config.get('DANISEN_STATUS_CHANNEL_ID', 0))
-
-        # CHARACTER SETTINGS CONFIG
-        self.characters = config.get('characters', [])
-        self.emoji_mapping = config.get('emoji_mapping', {char: "" for char in self.characters})
-        self.character_aliases = config.get('character_aliases', {})
-        for char in self.characters: # Each character must exist in emoji mapping
-            if char not in self.emoji_mapping:
-                self.emoji_mapping[char] = ""
-
-        # DANISEN SETTINGS CONFIG
-        self.total_dans = config.get('total_dans', MAX_DAN_RANK)
-        self.minimum_derank = config.get('minimum_derank', DEFAULT_DAN)
-        self.rank_gap_for_more_points_1 = config.get('rank_gap_for_more_points_1', 2)
-        self.rank_gap_for_more_points_2 = config.get("rank_gap_for_more_points_2", 4)
-        self.point_rollover = config.get('point_rollover', True)
-        self.point_multiplier = config.get('point_multiplier', 1)
-
-        # MATCHMAKING QUEUE CONFIG
-        self.queue_status = config.get('queue_status', True)
-        self.recent_opponents_limit = config.get('recent_opponents_limit', 3)
-        self.max_active_matches = config.get('max_active_matches', 7)  # New parameter
-        self.special_rank_up_rules = config.get('special_rank_up_rules', False)
-        self.minimum_invite_dan = config.get('minimum_invite_dan', 4)
+            self.logger.warning(f"Failed to load configuration, keeping the current one: {str(e)}")  # Fix logging issue
+            return False
+
+        # Top level values apply to every guild, the "guilds" section overrides them per guild
+        self.raw_config = config
+        self.guild_configs = guild_configs
+        for guild_id, engine in self.engines.items():
+            engine.apply_config(guild_configs[guild_id])
+        self.profiles.clear()  # Profiles show character emojis from the config
+        return True
+
+    def build_config(self, config, guild_id):
+        return LadderConfig.from_dict({**guild_config_dict(config, guild_id), **self.runtime_overrides.get(guild_id, {})})
+
+    def get_config(self, guild_id):
+        # Returns the ladder config for guild_id
+        if guild_id not in self.guild_configs:
+            self.guild_configs[guild_id] = self.build_config(self.raw_config, guild_id)
+        return self.guild_configs[guild_id]
+
+    def set_runtime_config(self, guild_id, **changes):
+        # Changes settings for guild_id until restart without touching the config file. Returns the new config.
+        # Raises ValueError and changes nothing if the result isn't a valid config
+        return self.replace_runtime_overrides(guild_id, {**self.runtime_overrides.get(guild_id, {}), **changes})
+
+    def replace_runtime_overrides(self, guild_id, overrides):
+        # Swaps guild_id's runtime overrides for overrides, so settings left out follow the config file again.
+        # Returns the new config. Raises ValueError and changes nothing if the result isn't a valid config
+        config = LadderConfig.from_dict({**guild_config_dict(self.raw_config, guild_id), **overrides})
+        if overrides:
+            self.runtime_overrides[guild_id] = overrides
+        else:
+            self.runtime_overrides.pop(guild_id, None)
+        self.guild_configs[guild_id] = config
+        if guild_id in self.engines:
+            self.engines[guild_id].apply_config(self.guild_configs[guild_id])
+        return self.guild_configs[guild_id]
+
+    def reload_config(self):
+        # Called by the config watcher when config.json changes on disk
+        if self.update_config():
+            self.logger.info(f"Reloaded configuration from {self.config_path}")
+
+    def cog_unload(self):
+        if self.config_watcher_task:
+            self.config_watcher_task.cancel()
+        if self.stats_task:
+            self.stats_task.cancel()
+
+    def cog_check(self, ctx):
+        # Runs before every command of the cog, refusing users over the command's rate limit
+        name = ctx.command.qualified_name
+        name = self.command_aliases.get(name, name)
+        limit = self.get_config(ctx.guild_id).rate_limit_lookup.get(name)
+        if limit is None:
+            return True
+        retry_after = self.rate_limiter.acquire((ctx.guild_id, ctx.author.id, name), *limit)
+        if retry_after:
+            raise RateLimited(name, retry_after)
+        return True
+
+    async def cog_command_error(self, ctx, error):
+        if isinstance(error, RateLimited):
+            await ctx.respond(f"Slow down! You can use /{error.command} again in {math.ceil(error.retry_after)} seconds.", ephemeral=True)
+            return
+        # py-cord doesn't print errors for cogs with their own handler
+        self.logger.error(f"Error in /{ctx.command.qualified_name}: {error}", exc_info=getattr(error, 'original', error))
+
+    async def cog_before_invoke(self, ctx):
+        budget = self.get_config(ctx.guild_id).interaction_defer_budget
+        await self.interaction_watchdog.start(ctx, budget, ephemeral=ctx.command.qualified_name in self.ephemeral_commands)
+
+    async def cog_after_invoke(self, ctx):
+        self.interaction_watchdog.finish(ctx)
+
+    def structure_sizes(self):
+        # Sizes of the structures that grow with use, summed over guilds, for memory reports
+        sizes = Counter()
+        for engine in self.engines.values():
+            sizes.update(engine.sizes())
+        sizes["cached profiles"] = len(self.profiles.embeds)
+        sizes["fetched members"] = len(self.members)
+        sizes["rate limit buckets"] = len(self.rate_limiter)
+        sizes["cached stats guilds"] = len(self.stats.pages)
+        sizes["live views"] = partial(count_instances, discord.ui.View)  # Walks every object, so it's counted off the loop
+        return dict(sizes)
+
+    def data_changed(self, guild_id, *discord_ids):
+        # Called after writes that change stats or profiles. Without discord_ids every profile in the guild is dropped
+        self.stats.mark_stale(guild_id)
+        if discord_ids:
+            self.profiles.invalidate(guild_id, *discord_ids)
+        else:
+            self.profiles.clear(guild_id)
+
+    def get_engine(self, guild_id):
+        # Returns the matchmaking engine for guild_id, creating it on first use
+        if guild_id not in self.engines:
+            # Players' recent opponents are read back from their matches when they queue, so rematch protection survives restarts
+            history = lambda discord_id: player_history(self.database_con, guild_id, discord_id)
+            engine = MatchmakingEngine(guild_id, self.get_config(guild_id), history=history, store=MatchStore(self.database_con, guild_id))
+            self.engines[guild_id] = engine
+        return self.engines[guild_id]
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Edits to config.json apply without a restart
+        if self.config_watcher_task is None:
+            self.config_watcher_task = asyncio.create_task(ConfigWatcher(self.config_path, self.reload_config).run())
+        if self.stats_task is None:
+            self.stats_task = asyncio.create_task(self.stats.run())
+
+        # Matches left open by the last run can still be reported, and still expire
+        for guild_id in open_match_guilds(self.database_con):
+            self.start_matchmaking_scheduler(guild_id)
+
+        # Rows from before multi guild support belong to the guild the bot was running in
+        if len(self.bot.guilds) == 1:
+            moved = adopt_legacy_rows(self.database_con, self.bot.guilds[0].id)
+            if moved:
+                self.logger.info(f"Moved {moved} legacy row(s) into guild {self.bot.guilds[0].id}")
+        else:
+            res = self.database_cur.execute("SELECT COUNT(*) AS legacy FROM users WHERE guild_id=?", (LEGACY_GUILD_ID,)).fetchone()
+            if res and res['legacy']:
+                self.logger.warning(f"{res['legacy']} user(s) from before multi guild support can't be assigned to a guild automatically")
+
+    @commands.Cog.listener()
+    async def on_raw_member_remove(self, payload):
+        # Dispatched even for members that weren't cached, unlike on_member_remove
+        self.members.forget(payload.guild_id, payload.user.id)
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction):
+        # Report dropdowns and requeue buttons, see custom_views
+        if interaction.type == discord.InteractionType.component:
+            await dispatch_component(self, interaction)
 
     @discord.commands.slash_command(name="setqueue", description="[Admin Command] Open or close the matchmaking queue.")
     @discord.commands.default_permissions(manage_roles=True)
     async def set_queue(self, ctx: discord.ApplicationContext, queue_status: discord.Option(bool, name="enablequeue")):
         # Enable or disable the matchmaking queue
-        self.queue_status = queue_status
+        engine = self.get_engine(ctx.guild_id)
+        self.set_runtime_config(ctx.guild_id, queue_status=queue_status)
         if not queue_status:
-            self.matchmaking_queue.clear()  # Clear the deque
-            self.dans_in_queue = {dan: deque() for dan in range(1, self.total_dans + 1)}  # Reset to empty deques
-            self.in_queue = {}
-            self.in_match = {}
+            engine.clear_queue()
+            engine.clear_matches()
             # try:
-            #     await self.rename_danisen_status_channel(False)
+            #     await self.rename_danisen_status_channel(False, ctx.guild_id)
             # except:
             #     self.logger.warning("Couldn't change channel name")
             await ctx.respond("The matchmaking queue has been disabled.")
         else:
             # try:
-            #     await self.rename_danisen_status_channel(True)
+            #     await self.rename_danisen_status_channel(True, ctx.guild_id)
             # except:
             #     self.logger.warning("Couldn't change channel name")
             await ctx.respond("The matchmaking queue has been enabled.")
 
+    @discord.commands.slash_command(name="resetseason", description="[Admin Command] Archive the current season and reset every player to Dan 1.")
+    @discord.commands.default_permissions(manage_guild=True)
+    async def reset_season(self, ctx: discord.ApplicationContext):
+        if ctx.guild_id in self.season_rollover_running:
+            await ctx.respond("A season rollover is already running.")
+            return
+        await defer_once(ctx)
+
+        # Queued players hold their old dans, so close and clear the queue while ranks change
+        engine = self.get_engine(ctx.guild_id)
+        self.season_rollover_running.add(ctx.guild_id)
+        overrides = dict(self.runtime_overrides.get(ctx.guild_id, {}))  # Restored afterwards, so queue_status follows config.json again if it did before
+        self.set_runtime_config(ctx.guild_id, queue_status=False)
+        engine.clear_queue()
+        # Open matches hold their players' old dans and points, so they're cancelled rather than scored into the new season
+        cancelled = engine.end_all_matches()
+        try:
+            for match in cancelled:
+                await self.delete_match_message(match.report_message)
+                await self.delete_match_message(match.ongoing_message)
+            archive_path, players_reset = await rollover_season(self.database_con, guild_id=ctx.guild_id)
+        except Exception as e:
+            self.logger.error(f"Failed to roll over season: {e}")
+            await ctx.respond(f"Failed to roll over the season: {e}")
+            return
+        finally:
+            self.replace_runtime_overrides(ctx.guild_id, overrides)
+            self.season_rollover_running.discard(ctx.guild_id)
+
+        self.data_changed(ctx.guild_id)
+        await ctx.respond(f"The season has been archived to `{os.path.basename(archive_path)}` and {players_reset} character(s) have been reset to Dan {DEFAULT_DAN}." +
+                          (f" {len(cancelled)} open match(es) were cancelled." if cancelled else ""))
+
     def dead_role(self, ctx, player):
         # Check if a player's dan role should be removed
         role = None
         self.logger.info(f'Checking if dan should be removed as well')
-        res = self.database_cur.execute("SELECT * FROM players WHERE discord_id=? AND dan=?", (player['discord_id'], player['dan']))
+        res = self.database_cur.execute("SELECT * FROM players WHERE guild_id=? AND discord_id=? AND dan=?", (ctx.guild_id, player['discord_id'], player['dan']))
         remaining_daniel = res.fetchone()
         if not remaining_daniel:
             self.logger.info(f"Dan role {player['dan']} will be removed")
@@ -157,74 +290,11 @@ class Danisen(commands.Cog):
 
     async def score_update(self, ctx, winner, loser):
         # Update scores for a match
+        config = self.get_config(ctx.guild_id)
         # Format of [Dan, Points, Rankup?, PointDelta, RankupBlock]
-        winner_rank = [winner['dan'], winner['points'], False, 0.0, False]
-        loser_rank = [loser['dan'], loser['points'], False, 0.0, False]
-        rankdown = False
-        rankup = False
-
-        # Determine rankup points based on rank type
-        rankup_points =  RANKUP_POINTS_SPECIAL if winner_rank[0] >= SPECIAL_RANK_THRESHOLD else RANKUP_POINTS_NORMAL
-
-        # Winning and Losing logic
-        if loser_rank[0] >= winner_rank[0] + self.rank_gap_for_more_points_2: # lower ranked player wins with 4 rank gap
-            winner_rank[1] += 3.0 * self.point_multiplier
-            winner_rank[3] += 3.0 * self.point_multiplier
-            loser_rank[1] -= 1.0
-            loser_rank[3] -= 1.0
-        elif loser_rank[0] >= winner_rank[0] + self.rank_gap_for_more_points_1: # lower ranked player wins with 2 rank gap
-            winner_rank[1] += 2.0 * self.point_multiplier
-            winner_rank[3] += 2.0 * self.point_multiplier
-            loser_rank[1] -= 1.0
-            loser_rank[3] -= 1.0
-        elif winner_rank[0] >= loser_rank[0] + self.rank_gap_for_more_points_2: # higher ranked player wins with 4 rank gap
-            winner_rank[1] += 0.3 * self.point_multiplier
-            winner_rank[3] += 0.3 * self.point_multiplier
-            loser_rank[1] -= 0.3
-            loser_rank[3] -= 0.3
-        elif winner_rank[0] >= loser_rank[0] + self.rank_gap_for_more_points_1: # higher ranked player wins with 2 rank gap
-            winner_rank[1] += 0.5 * self.point_multiplier
-            winner_rank[3] += 0.5 * self.point_multiplier
-            loser_rank[1] -= 0.5
-            loser_rank[3] -= 0.5
-        else:
-            winner_rank[1] += 1.0 * self.point_multiplier
-            winner_rank[3] += 1.0 * self.point_multiplier
-            loser_rank[1] -= 1.0
-            loser_rank[3] -= 1.0
-
-        if loser_rank[0] == self.minimum_derank and loser_rank[1] < 0: # making sure loser can't go lower than minimum rank
-            loser_rank[3] = round(0.0 - (loser_rank[1] - loser_rank[3]), 1)
-            loser_rank[1] = 0.0
-            
-        
-
-        # Rankup logic with special rules
-        if winner_rank[1] >= rankup_points:
-            can_rankup = True
-            
-            # Check special rank rules
-            if self.special_rank_up_rules and winner_rank[0] >= SPECIAL_RANK_THRESHOLD:
-                # Can only rank up by beating another high-ranked player
-                can_rankup = loser_rank[0] >= SPECIAL_RANK_THRESHOLD
-                if not can_rankup:
-                    # Reset points to rankup_points - 1 if can't rank up
-                    winner_rank[3] = round((rankup_points - 0.1) - (winner_rank[1] - winner_rank[3]), 1) # max points before rankup - initial points
-                    winner_rank[1] = rankup_points - 0.1
-                    winner_rank[4] = True
-            
-            if can_rankup:
-                winner_rank[0] += 1
-                winner_rank[2] = True
-                winner_rank[1] = winner_rank[1] % rankup_points if self.point_rollover else 0.0
-                rankup = True
-
-        # Rankdown logic
-        if loser_rank[1] <= RANKDOWN_POINTS:
-            loser_rank[0] -= 1
-            loser_rank[1] = DEFAULT_POINTS
-            loser_rank[2] = True
-            rankdown = True
+        winner_rank, loser_rank = score_match(winner['dan'], winner['points'], loser['dan'], loser['points'], config)
+        rankup = winner_rank[2]
+        rankdown = loser_rank[2]
 
         # Log new scores
         self.logger.info("New Scores")
@@ -232,50 +302,54 @@ class Danisen(commands.Cog):
         self.logger.info(f"Loser : {loser['player_name']} dan {loser_rank[0]}, points {loser_rank[1]}")
 
         # Update database
-        self.database_cur.execute("UPDATE players SET dan = ?, points = ? WHERE discord_id=? AND character=?", (winner_rank[0], winner_rank[1], winner['discord_id'], winner['character']))
-        self.database_cur.execute("UPDATE players SET dan = ?, points = ? WHERE discord_id=? AND character=?", (loser_rank[0], loser_rank[1], loser['discord_id'], loser['character']))
+        self.database_cur.execute("UPDATE players SET dan = ?, points = ? WHERE guild_id=? AND discord_id=? AND character=?", (winner_rank[0], winner_rank[1], ctx.guild_id, winner['discord_id'], winner['character']))
+        self.database_cur.execute("UPDATE players SET dan = ?, points = ? WHERE guild_id=? AND discord_id=? AND character=?", (loser_rank[0], loser_rank[1], ctx.guild_id, loser['discord_id'], loser['character']))
         self.database_con.commit()
 
         # Update roles on rankup/down
         if rankup:
             self.logger.debug(f"Winning player ranked up, attempting to assign roles")
-            dan = self.get_players_highest_dan(winner['player_name'])
+            dan = self.get_players_highest_dan(winner['player_name'], ctx.guild_id)
             self.logger.debug(f"Winning player's highest character dan is {dan}, rankup dan is {winner_rank[0]}")
             if dan and dan == winner_rank[0]: # it's their highest ranked character that just ranked up, since the table is updated first we check for equality
                 role = discord.utils.get(ctx.guild.roles, name=f"Dan {winner_rank[0]}")
-                member = ctx.guild.get_member(winner['discord_id'])
+                member = await self.members.get(ctx.guild, winner['discord_id'])
                 bot_member = ctx.guild.get_member(self.bot.user.id)
-                if role and self.can_manage_role(bot_member, role):
+                if member is None:
+                    self.logger.warning(f"{winner['player_name']} has left the server, not updating their roles")
+                if member and role and self.can_manage_role(bot_member, role):
                     await member.add_roles(role)
                 role = discord.utils.get(ctx.guild.roles, name=f"Dan {winner_rank[0] - 1}") # this could cause issues, but should be fine as long as you can't rank up twice in one game (which cant happen)
-                if role and self.can_manage_role(bot_member, role):
+                if member and role and self.can_manage_role(bot_member, role):
                     await member.remove_roles(role)
 
         if rankdown:
             self.logger.debug(f"Losing player ranked down, attempting to assign roles")
-            dan = self.get_players_highest_dan(loser['player_name'])
+            dan = self.get_players_highest_dan(loser['player_name'], ctx.guild_id)
             self.logger.debug(f"Winning player's highest character dan is {dan}, rankdown dan is {loser_rank[0]}")
             if dan and dan == loser_rank[0]: # same as above, hopefully
                 role = discord.utils.get(ctx.guild.roles, name=f"Dan {loser_rank[0]}")
-                member = ctx.guild.get_member(loser['discord_id'])
+                member = await self.members.get(ctx.guild, loser['discord_id'])
                 bot_member = ctx.guild.get_member(self.bot.user.id)
-                if role and self.can_manage_role(bot_member, role):
+                if member is None:
+                    self.logger.warning(f"{loser['player_name']} has left the server, not updating their roles")
+                if member and role and self.can_manage_role(bot_member, role):
                     await member.add_roles(role)
                 role = discord.utils.get(ctx.guild.roles, name=f"Dan {loser_rank[0] + 1}") # this could cause issues, but should be fine as long as you can't rank up twice in one game (which cant happen)
-                if role and self.can_manage_role(bot_member, role):
+                if member and role and self.can_manage_role(bot_member, role):
                     await member.remove_roles(role)
 
         return winner_rank, loser_rank
 
     # Custom decorator for validation
-    def is_valid_char(self, char):
-        return char in self.characters
+    def is_valid_char(self, char, guild_id):
+        return char in self.get_config(guild_id).character_set
 
     async def character_autocomplete(self, ctx: discord.AutocompleteContext):
-        return [character for character in self.characters if character.lower().startswith(ctx.value.lower())]
+        return list(self.get_config(ctx.interaction.guild_id).prefix_index.get(ctx.value.lower(), ()))
 
     async def player_autocomplete(self, ctx: discord.AutocompleteContext):
-        res = self.database_cur.execute("SELECT player_name FROM users")
+        res = self.database_cur.execute("SELECT player_name FROM users WHERE guild_id=?", (ctx.interaction.guild_id,))
         name_list=res.fetchall()
         names = set([name[0] for name in name_list])
         return [name for name in names if (name.lower()).startswith(ctx.value.lower())]
@@ -288,35 +362,36 @@ class Danisen(commands.Cog):
                         dan :  discord.Option(int),
                         points : discord.Option(float)):
 
-        char = self.convert_character_alias(char)
-        if not self.is_valid_char(char):
+        char = self.convert_character_alias(char, ctx.guild_id)
+        if not self.is_valid_char(char, ctx.guild_id):
             await ctx.respond(f"Invalid char selected {char}. Please choose a valid char.")
             return
 
         # sync role stuff
         role_removed = False
         discord_id = None
-        res = self.database_cur.execute("SELECT dan, users.discord_id AS discord_id FROM users JOIN players ON players.discord_id = users.discord_id WHERE player_name=? AND character=?", (player_name, char)).fetchone()
+        res = self.database_cur.execute("SELECT dan, users.discord_id AS discord_id FROM users JOIN players ON players.guild_id = users.guild_id AND players.discord_id = users.discord_id WHERE users.guild_id=? AND player_name=? AND character=?", (ctx.guild_id, player_name, char)).fetchone()
         if res: 
             discord_id = res['discord_id']
-            if res['dan'] == self.get_players_highest_dan(player_name) or dan > self.get_players_highest_dan(player_name): # if this is the player's highest ranked character being updated, we need to remove the corresponding dan role
-                role = discord.utils.get(ctx.guild.roles, name=f"Dan {self.get_players_highest_dan(player_name)}")
-                member = ctx.guild.get_member(res['discord_id'])
+            if res['dan'] == self.get_players_highest_dan(player_name, ctx.guild_id) or dan > self.get_players_highest_dan(player_name, ctx.guild_id): # if this is the player's highest ranked character being updated, we need to remove the corresponding dan role
+                role = discord.utils.get(ctx.guild.roles, name=f"Dan {self.get_players_highest_dan(player_name, ctx.guild_id)}")
+                member = await self.members.get(ctx.guild, res['discord_id'])
                 bot_member = ctx.guild.get_member(self.bot.user.id)
-                if role and self.can_manage_role(bot_member, role):
+                if member and role and self.can_manage_role(bot_member, role):
                     await member.remove_roles(role)
                     role_removed = True
         else:
             await ctx.respond(f"Database entry for player {player} on character {char} not found.")
         
-        self.database_cur.execute("UPDATE players SET dan = ?, points = ? WHERE discord_id=? AND character=?", (dan, points, discord_id, char))
+        self.database_cur.execute("UPDATE players SET dan = ?, points = ? WHERE guild_id=? AND discord_id=? AND character=?", (dan, points, ctx.guild_id, discord_id, char))
         self.database_con.commit()
+        self.data_changed(ctx.guild_id, discord_id)
 
-        if role_removed and self.get_players_highest_dan(player_name) is not None:
-            role = discord.utils.get(ctx.guild.roles, name=f"Dan {self.get_players_highest_dan(player_name)}")
-            member = ctx.guild.get_member(res['discord_id'])
+        if role_removed and self.get_players_highest_dan(player_name, ctx.guild_id) is not None:
+            role = discord.utils.get(ctx.guild.roles, name=f"Dan {self.get_players_highest_dan(player_name, ctx.guild_id)}")
+            member = await self.members.get(ctx.guild, res['discord_id'])
             bot_member = ctx.guild.get_member(self.bot.user.id)
-            if role and self.can_manage_role(bot_member, role):
+            if member and role and self.can_manage_role(bot_member, role):
                 await member.add_roles(role)
 
         await ctx.respond(f"{player_name}'s {char} rank updated to be Dan {dan}, {round(points, 1):.1f} points.")
@@ -343,7 +418,7 @@ class Danisen(commands.Cog):
                             inline=False) 
                             # fallbacks to the command name incase command description is not defined
 
-        await ctx.send_response(embed=em)
+        await ctx.respond(embed=em)
 
     #registers player+char to db
     @discord.commands.slash_command(description="Register to the Danisen database!")
@@ -358,15 +433,15 @@ class Danisen(commands.Cog):
 
         self.logger.info(f"player nickname is {ctx.author.nick}, player global name is {ctx.author.global_name}")
 
-        char1 = self.convert_character_alias(char1)
-        if not self.is_valid_char(char1):
+        char1 = self.convert_character_alias(char1, ctx.guild_id)
+        if not self.is_valid_char(char1, ctx.guild_id):
             await ctx.respond(f"Invalid char selected {char1}. Please choose a valid char.")
             return
 
         # Check if the player is already registered with the character
         res = self.database_cur.execute(
-            "SELECT * FROM players WHERE discord_id = ? AND character = ?",
-            (player_discord_id, char1)
+            "SELECT * FROM players WHERE guild_id = ? AND discord_id = ? AND character = ?",
+            (ctx.guild_id, player_discord_id, char1)
         ).fetchone()
 
         if res:
@@ -375,8 +450,8 @@ class Danisen(commands.Cog):
 
         # Check if the player has three characters already registered
         res = self.database_cur.execute(
-            "SELECT COUNT(*) AS char_count FROM players WHERE discord_id = ?",
-            (player_discord_id,)
+            "SELECT COUNT(*) AS char_count FROM players WHERE guild_id = ? AND discord_id = ?",
+            (ctx.guild_id, player_discord_id)
         ).fetchone()
 
         self.logger.info(f"Player has {res["char_count"]} characters.")
@@ -390,8 +465,8 @@ class Danisen(commands.Cog):
 
         # If user is not in the users table, insert them into that table first
         res = self.database_cur.execute(
-            "SELECT * FROM users WHERE discord_id = ?",
-            (player_discord_id,)
+            "SELECT * FROM users WHERE guild_id = ? AND discord_id = ?",
+            (ctx.guild_id, player_discord_id)
         ).fetchone()
 
         if res:
@@ -399,19 +474,20 @@ class Danisen(commands.Cog):
         else:
             self.logger.info(f"Adding user {player_name} into users table")
             self.database_cur.execute(
-                "INSERT INTO users (discord_id, player_name, nickname, keyword) VALUES (?, ?, ?, ?)", 
-                (player_discord_id, player_name, player_nickname, None)
+                "INSERT INTO users (guild_id, discord_id, player_name, nickname, keyword) VALUES (?, ?, ?, ?, ?)", 
+                (ctx.guild_id, player_discord_id, player_name, player_nickname, None)
             )
             self.database_con.commit()
 
 
         # Insert the new player record
-        line = (ctx.author.id, char1, DEFAULT_DAN, DEFAULT_POINTS)
+        line = (ctx.guild_id, ctx.author.id, char1, DEFAULT_DAN, DEFAULT_POINTS)
         self.database_cur.execute(
-            "INSERT INTO players (discord_id, character, dan, points) VALUES (?, ?, ?, ?)", 
+            "INSERT INTO players (guild_id, discord_id, character, dan, points) VALUES (?, ?, ?, ?, ?)", 
             line
         )
         self.database_con.commit()
+        self.data_changed(ctx.guild_id, player_discord_id)
 
         # Get Discord roles to add to participant
         role_list = []
@@ -420,7 +496,7 @@ class Danisen(commands.Cog):
             role_list.append(char_role)
         self.logger.info(f"Adding to db {player_name} {char1}")
 
-        highest_dan = self.get_players_highest_dan(player_name)
+        highest_dan = self.get_players_highest_dan(player_name, ctx.guild_id)
         self.logger.info(f"Registering player's highest dan is {highest_dan}")
         if not highest_dan or highest_dan == 1:
             dan_role = discord.utils.get(ctx.guild.roles, name="Dan 1")
@@ -454,22 +530,23 @@ class Danisen(commands.Cog):
     async def unregister(self, ctx : discord.ApplicationContext, 
                     char1 : discord.Option(str, name="character", autocomplete=character_autocomplete)):
 
-        char1 = self.convert_character_alias(char1)
-        if not self.is_valid_char(char1):
+        char1 = self.convert_character_alias(char1, ctx.guild_id)
+        if not self.is_valid_char(char1, ctx.guild_id):
             await ctx.respond(f"Invalid char selected {char1}. Please choose a valid char.")
             return
 
+        engine = self.get_engine(ctx.guild_id)
         # Check if the player is in a match
-        if ctx.author.name in self.in_match and self.in_match[ctx.author.name]:
+        if engine.is_in_match(ctx.author.id):
             await ctx.respond("You cannot unregister while in an active match.")
             return
 
         # Check if the player is in the queue
-        if ctx.author.name in self.in_queue and self.in_queue[ctx.author.name][0]:
+        if engine.is_queued(ctx.author.id, char1):
             await ctx.respond("You cannot unregister while in the queue. Please leave the queue first.")
             return
 
-        res = self.database_cur.execute("SELECT * FROM players WHERE discord_id=? AND character=?", (ctx.author.id, char1))
+        res = self.database_cur.execute("SELECT * FROM players WHERE guild_id=? AND discord_id=? AND character=?", (ctx.guild_id, ctx.author.id, char1))
         daniel = res.fetchone()
 
         if daniel == None:
@@ -477,8 +554,9 @@ class Danisen(commands.Cog):
             return
 
         self.logger.info(f"Removing {ctx.author.name} {ctx.author.id} {char1} from db")
-        self.database_cur.execute("DELETE FROM players WHERE discord_id=? AND character=?", (ctx.author.id, char1))
+        self.database_cur.execute("DELETE FROM players WHERE guild_id=? AND discord_id=? AND character=?", (ctx.guild_id, ctx.author.id, char1))
         self.database_con.commit()
+        self.data_changed(ctx.guild_id, ctx.author.id)
 
         # Get roles to remove from participant, if they have them.
         role_list = []
@@ -491,7 +569,7 @@ class Danisen(commands.Cog):
         if role:
             role_list.append(role)
 
-        res = self.database_cur.execute("SELECT * FROM players WHERE discord_id=?", (ctx.author.id,)).fetchone()
+        res = self.database_cur.execute("SELECT * FROM players WHERE guild_id=? AND discord_id=?", (ctx.guild_id, ctx.author.id)).fetchone()
         if res is None:
             participant_role = discord.utils.get(ctx.guild.roles, name="Danisen Participant")
             if char_role:
@@ -510,8 +588,8 @@ class Danisen(commands.Cog):
                 message_text += f"Could not remove roles due to bot's role being too low\n\n"
                 self.logger.warning(f"Could not remove roles due to bot's role being too low")
         
-        if self.get_players_highest_dan(ctx.author.name):
-            role = discord.utils.get(ctx.guild.roles, name=f"Dan {self.get_players_highest_dan(ctx.author.name)}")
+        if self.get_players_highest_dan(ctx.author.name, ctx.guild_id):
+            role = discord.utils.get(ctx.guild.roles, name=f"Dan {self.get_players_highest_dan(ctx.author.name, ctx.guild_id)}")
             member = ctx.author
             bot_member = ctx.guild.get_member(self.bot.user.id)
             if role and self.can_manage_role(bot_member, role):
@@ -526,20 +604,15 @@ class Danisen(commands.Cog):
                 char : discord.Option(str, name="character", autocomplete=character_autocomplete),
                 discord_name :  discord.Option(str, required=False, autocomplete=player_autocomplete)):
 
-        char = self.convert_character_alias(char)
-        if not self.is_valid_char(char):
+        char = self.convert_character_alias(char, ctx.guild_id)
+        if not self.is_valid_char(char, ctx.guild_id):
             await ctx.respond(f"Invalid char selected {char}. Please choose a valid char.")
             return
     
         if not discord_name:
             discord_name = ctx.author.name
 
-        members = ctx.guild.members
-        member = None
-        for m in members:
-            if discord_name.lower() == m.name.lower():
-                member = m
-                break
+        member = await self.find_member(ctx.guild, discord_name)
         if discord_name:
             if not member:
                 await ctx.respond(f"""{discord_name} isn't a member of this server""")
@@ -548,7 +621,7 @@ class Danisen(commands.Cog):
             member = ctx.author
         id = member.id
 
-        res = self.database_cur.execute("SELECT dan, points, nickname FROM players JOIN users ON players.discord_id = users.discord_id WHERE users.discord_id=? AND character=?", (id, char))
+        res = self.database_cur.execute("SELECT dan, points, nickname FROM players JOIN users ON players.guild_id = users.guild_id AND players.discord_id = users.discord_id WHERE users.guild_id=? AND users.discord_id=? AND character=?", (ctx.guild_id, id, char))
         data = res.fetchone()
         if data:
             await ctx.respond(f"""{data['player_name']}'s rank for {char} is Dan {data['dan']}, {round(data['points'], 1):.1f} points""")
@@ -560,58 +633,39 @@ class Danisen(commands.Cog):
     async def leave_queue(self, ctx : discord.ApplicationContext,
                                 char : discord.Option(str, name="character", required=False, autocomplete=character_autocomplete)):
         discord_id = ctx.author.id
+        engine = self.get_engine(ctx.guild_id)
         self.logger.info(f"{ctx.author.name} requested to leave the queue")
-        daniels = [] 
-
-        self.logger.debug(f"leave_queue for player {ctx.author.name} awaiting lock")
-        async with self.queue_lock:
-            self.logger.debug(f"leave_queue for player {ctx.author.name} acquired lock")
-            self.logger.debug(f"current mmq is {self.matchmaking_queue}")
-            for member in self.matchmaking_queue:
-                self.logger.debug(f"Checking if player {member} should leave queue.")
-                if member and (member['discord_id'] == discord_id) and (char is None or (char is not None and member['character'] == char)):
-                    self.logger.debug(f"Player {member['player_name']} on character {member['character']} should leave queue.")
-                    daniels.append(member)
-
-            if char is not None and daniels != []:
-                for daniel in daniels:
-                    if daniel in self.dans_in_queue[daniel['dan']]:
-                        self.dans_in_queue[daniel['dan']].remove(daniel)
-                        self.matchmaking_queue.remove(daniel)
-
-                    self.in_queue[str(daniel['discord_id'])+"@"+daniel['character']][0] = False
-                await ctx.respond(f"You have been removed from the queue as {char}.")
-            elif daniels != []:
-                for daniel in daniels:
-                    if daniel in self.dans_in_queue[daniel['dan']]:
-                        self.dans_in_queue[daniel['dan']].remove(daniel)
-                        self.matchmaking_queue.remove(daniel)
-
-                    self.in_queue[str(daniel['discord_id'])+"@"+daniel['character']][0] = False
-                await ctx.respond("You have been removed from the queue on all characters.")
-            else:
-                await ctx.respond("You are not in queue.")
+
+        daniels = engine.remove_from_queue(discord_id, char)
+
+        if char is not None and daniels != []:
+            await ctx.respond(f"You have been removed from the queue as {char}.")
+        elif daniels != []:
+            await ctx.respond("You have been removed from the queue on all characters.")
+        else:
+            await ctx.respond("You are not in queue.")
 
     #joins the matchmaking queue
     @discord.commands.slash_command(name="joinqueue", description="queue up for danisen games")
     async def join_queue(self, ctx : discord.ApplicationContext,
                     char: discord.Option(str, autocomplete=character_autocomplete)):
-        await ctx.defer()
+        await defer_once(ctx)
         discord_id = ctx.author.id
+        engine = self.get_engine(ctx.guild_id)
         rejoin_queue = False
 
-        char = self.convert_character_alias(char)
-        if not self.is_valid_char(char):
+        char = self.convert_character_alias(char, ctx.guild_id)
+        if not self.is_valid_char(char, ctx.guild_id):
             await ctx.respond(f"Invalid char selected {char}. Please choose a valid char.")
             return
 
         #check if q open
-        if self.queue_status == False:
+        if engine.config.queue_status == False:
             await ctx.respond(f"The matchmaking queue is currently closed")
             return
 
         #Check if valid character
-        res = self.database_cur.execute("SELECT users.discord_id AS discord_id, player_name, nickname, keyword, character, dan, points FROM players JOIN users ON players.discord_id = users.discord_id WHERE users.discord_id=? AND character=?", (discord_id, char))
+        res = self.database_cur.execute("SELECT users.guild_id AS guild_id, users.discord_id AS discord_id, player_name, nickname, keyword, character, dan, points FROM players JOIN users ON players.guild_id = users.guild_id AND players.discord_id = users.discord_id WHERE users.guild_id=? AND users.discord_id=? AND character=?", (ctx.guild_id, discord_id, char))
         daniel = res.fetchone()
         if daniel == None:
             await ctx.respond(f"You are not registered with that character")
@@ -623,40 +677,25 @@ class Danisen(commands.Cog):
         player_nickname = re.subn(r"(?P<char>[\*\-\_\~])", r"\\\g<char>", player_nickname)[0]
         self.logger.debug(f"player nickname post regex is {player_nickname}")
         if player_nickname != daniel['nickname']:
-            self.database_cur.execute("UPDATE users SET nickname = ? WHERE discord_id=?", (player_nickname, ctx.author.id))
+            self.database_cur.execute("UPDATE users SET nickname = ? WHERE guild_id=? AND discord_id=?", (player_nickname, ctx.guild_id, ctx.author.id))
+            self.profiles.invalidate(ctx.guild_id, ctx.author.id)
 
         daniel = DanisenRow(daniel)
         daniel['requeue'] = rejoin_queue
         daniel['nickname'] = player_nickname
 
-        self.logger.debug(f"join_queue for player {daniel['player_name']} awaiting lock")
-        queue_add_success = False
-        async with self.queue_lock:
-            self.logger.debug(f"join_queue for player {daniel['player_name']} acquired lock")
-            #Check if in Queue already
-            # self.logger.debug(f"checking that {str(discord_id)+"@"+char} is in {self.in_queue}: {str(discord_id)+"@"+char in self.in_queue} and {(str(discord_id)+"@"+char in self.in_queue) and self.in_queue[str(discord_id)+"@"+char][0]}")
-            if str(discord_id)+"@"+char in self.in_queue and self.in_queue[str(discord_id)+"@"+char][0]:
-                await ctx.respond(f"You are already in the queue as that character")
-                return
-
-            #check if in a match already
-            if discord_id in self.in_match and self.in_match[discord_id]:
-                await ctx.respond(f"You are in an active match and cannot queue up")
-                return
+        # Check and add without awaiting in between, so nothing can change the queue underneath us
+        if engine.is_queued(discord_id, char):
+            await ctx.respond(f"You are already in the queue as that character")
+            return
+        if engine.is_in_match(discord_id):
+            await ctx.respond(f"You are in an active match and cannot queue up")
+            return
+        engine.add_to_queue(daniel)
+        queue_length = len(engine.matchmaking_queue)
 
-            if self.in_queue.setdefault(str(discord_id)+"@"+char, [True, deque(maxlen=self.recent_opponents_limit)]):
-                self.in_queue[str(discord_id)+"@"+char][0] = True
-            self.in_match.setdefault(str(discord_id)+"@"+char, False)
-
-            self.dans_in_queue[daniel['dan']].append(daniel)
-            self.matchmaking_queue.append(daniel)
-            queue_add_success = True
-        
-        if queue_add_success:
-            await ctx.respond(f"You've been added to the matchmaking queue with {char}. Current queue length: {len(self.matchmaking_queue)}")
-            await self.begin_matchmaking_timer(ctx.interaction, 30)
-        else:
-            await ctx.respond(f"An error with the queue mutex or code within has occured, please contact and admin.")
+        await ctx.respond(f"You've been added to the matchmaking queue with {char}. Current queue length: {queue_length}")
+        self.start_matchmaking_scheduler(ctx.guild_id)
 
         #matchmake
         # if (self.cur_active_matches < self.max_active_matches and  # Taking out automatic matchmaking
@@ -664,10 +703,11 @@ class Danisen(commands.Cog):
         #     await self.matchmake(ctx.interaction)
 
     async def rejoin_queue(self, interaction, player):
-        if self.queue_status == False:
+        engine = self.get_engine(interaction.guild_id)
+        if engine.config.queue_status == False:
             return
 
-        res = self.database_cur.execute("SELECT users.discord_id AS discord_id, player_name, nickname, keyword, character, dan, points FROM players JOIN users ON players.discord_id = users.discord_id WHERE users.discord_id=? AND character=?", (player['discord_id'], player['character']))
+        res = self.database_cur.execute("SELECT users.guild_id AS guild_id, users.discord_id AS discord_id, player_name, nickname, keyword, character, dan, points FROM players JOIN users ON players.guild_id = users.guild_id AND players.discord_id = users.discord_id WHERE users.guild_id=? AND users.discord_id=? AND character=?", (interaction.guild_id, player['discord_id'], player['character']))
         db_player = res.fetchone()
         if not db_player:
             return  # Exit if the player is not found in the database
@@ -675,162 +715,149 @@ class Danisen(commands.Cog):
         player = DanisenRow(db_player)  # Transform the database row into a DanisenRow
         player['requeue'] = True
 
-        self.logger.debug(f"rejoin_queue for player {player['player_name']} awaiting lock")
-        async with self.queue_lock:
-            self.logger.debug(f"rejoin_queue for player {player['player_name']} acquired lock")
-            # Ensure the player is initialized in self.in_queue
-            if str(player['discord_id'])+"@"+player['character'] not in self.in_queue:
-                self.in_queue[str(player['discord_id'])+"@"+player['character']] = [False, deque(maxlen=self.recent_opponents_limit)]
-
-            self.in_queue[str(player['discord_id'])+"@"+player['character']][0] = True
-            self.dans_in_queue[player['dan']].append(player)  # Append the transformed player
-            self.matchmaking_queue.append(player)
-
-        await self.begin_matchmaking_timer(interaction, 30) # Attempt to restart the timer, if it's stopped
+        if engine.is_queued(player['discord_id'], player['character']):
+            return
+        engine.add_to_queue(player)
+        self.start_matchmaking_scheduler(interaction.guild_id)
 
     @discord.commands.slash_command(name="viewqueue", description="view players in the queue")
     async def view_queue(self, ctx : discord.ApplicationContext):
+        engine = self.get_engine(ctx.guild_id)
         em = discord.Embed(
             title="Current Danisen Queue",
             color=discord.Color.blurple())
 
-        self.logger.debug(f"current queue is {self.matchmaking_queue}")
-        for player in self.matchmaking_queue:
+        self.logger.debug(f"current queue is {engine.matchmaking_queue}")
+        for player in engine.matchmaking_queue:
             if player:
                 em.add_field(name=f"{player['nickname']} ({player['character']})", 
                         value=f"Dan {player['dan']}, {round(player['points'], 1):.1f} points", 
                         inline=False) 
         
-        await ctx.send_response(embed=em)
+        await ctx.respond(embed=em)
 
-    @discord.commands.slash_command(name="startmatchmaking", description="Start matchmaking.")
-    async def start_matchmaking(self, ctx: discord.ApplicationContext):
-        self.logger.debug(f"matchmake command from start_matchmaking awaiting lock")
-        async with self.queue_lock:
-            self.logger.debug(f"matchmake command from start_matchmaking acquired lock")
-            await self.matchmake(ctx.interaction)
-        await ctx.respond("Finished matchmaking")
+    @discord.commands.slash_command(name="queuestats", description="[Admin Command] View matchmaking wait times per dan.")
+    @discord.commands.default_permissions(manage_roles=True)
+    async def queue_stats(self, ctx : discord.ApplicationContext):
+        engine = self.get_engine(ctx.guild_id)
+        em = discord.Embed(
+            title="Matchmaking Wait Times",
+            description=f"Waits of the last {WAIT_SAMPLES_PER_DAN} matched players per dan, {engine.cur_active_matches}/{engine.config.max_active_matches} match slots in use",
+            color=discord.Color.blurple())
 
-    async def matchmake(self, ctx: discord.Interaction):
-        match_attempts = 0
-        #  This is to deal with the case where there is one None in the queue
-        if len(self.matchmaking_queue) == 1 and self.matchmaking_queue[0] is None:
-            self.matchmaking_queue.popleft()
-            return
-            
-        while (self.cur_active_matches < self.max_active_matches and
-               len(self.matchmaking_queue) >= 2):
-            self.logger.debug(f"Starting matchmaking loop. Current matchmaking_queue: {list(self.matchmaking_queue)}")
-            self.logger.debug(f"Current dans_in_queue: { {dan: list(queue) for dan, queue in self.dans_in_queue.items()} }")
+        stats = engine.wait_percentiles()
+        for dan, (p50, p95, p99, samples) in sorted(stats.items()):
+            em.add_field(name=f"Dan {dan} ({samples} matches)",
+                    value=f"p50 {p50:.0f}s, p95 {p95:.0f}s, p99 {p99:.0f}s",
+                    inline=False)
+        if not stats:
+            em.add_field(name="No data", value="Nobody has been matched from the queue yet", inline=False)
 
-            daniel1 = self.matchmaking_queue.popleft()  # Pop from the left of the deque
-            self.logger.debug(f"Dequeued daniel1 from matchmaking_queue: {daniel1}")
+        await ctx.respond(embed=em, ephemeral=True)
 
-            if not daniel1:
-                self.logger.warning("Dequeued daniel1 is None. Skipping iteration.")
-                continue
+    @discord.commands.slash_command(name="responsetimes", description="[Admin Command] View how long commands take to first respond.")
+    @discord.commands.default_permissions(manage_guild=True)
+    async def response_times(self, ctx : discord.ApplicationContext):
+        watchdog = self.interaction_watchdog
+        response_times = watchdog.response_times
+        em = discord.Embed(
+            title="Command Response Times",
+            description=f"Time from each interaction to its first response, since the bot started. Commands still waiting {self.get_config(ctx.guild_id).interaction_defer_budget}s after the interaction are deferred",
+            color=discord.Color.blurple())
 
-            self.in_queue[str(daniel1['discord_id'])+"@"+daniel1['character']][0] = False
+        labels = response_times.labels()
+        for command, counts in sorted(response_times.counts.items()):
+            buckets = ", ".join(f"{label}: {count}" for label, count in zip(labels, counts) if count)
+            em.add_field(name=f"/{command} ({sum(counts)} responses, {watchdog.auto_deferred[command]} deferred, {self.rate_limiter.limited[command]} rate limited)",
+                    value=f"{buckets}, slowest {response_times.slowest[command]:.2f}s",
+                    inline=False)
+        if not response_times.counts:
+            em.add_field(name="No data", value="No commands have responded yet", inline=False)
 
-            same_daniel = self.dans_in_queue[daniel1['dan']].popleft()  # Pop from the left of the deque
-            self.logger.debug(f"Dequeued same_daniel from dans_in_queue[{daniel1['dan']}]: {same_daniel}")
+        await ctx.respond(embed=em, ephemeral=True)
 
-            # Sanity check that this is also the latest daniel in the respective dan queue
-            if daniel1 != same_daniel:
-                self.logger.error(f"Queue desynchronization detected: daniel1={daniel1} same_daniel={same_daniel}")
-                self.logger.debug(f"Remaining matchmaking_queue: {list(self.matchmaking_queue)}")
-                self.logger.debug(f"Remaining dans_in_queue[{daniel1['dan']}]: {list(self.dans_in_queue[daniel1['dan']])}")
-                return
+    @discord.commands.slash_command(name="profilebot", description="[Owner Command] Sample where the bot spends its time.")
+    @discord.commands.default_permissions(manage_guild=True)
+    async def profile_bot(self, ctx : discord.ApplicationContext,
+                          seconds: discord.Option(int, min_value=1, max_value=PROFILE_MAX_SECONDS, default=10)):
+        # Profiles the whole bot process, so it's limited to the bot's owner rather than guild admins
+        if not await self.bot.is_owner(ctx.author):
+            await ctx.respond("Only the bot owner can profile the bot.", ephemeral=True)
+            return
+        await defer_once(ctx, ephemeral=True)
+        stacks = await self.diagnostics.profile(seconds)
+        report = io.BytesIO(self.diagnostics.format_profile(stacks).encode())
+        await ctx.respond(f"Profile of the last {seconds}s", file=discord.File(report, filename="profile.txt"), ephemeral=True)
 
-            check_dan = [daniel1['dan']]
-            for dan_offset in range(1, self.total_dans):
-                cur_dan = check_dan[0] + dan_offset
-                if DEFAULT_DAN <= cur_dan <= self.total_dans:
-                    check_dan.append(cur_dan)
-                cur_dan = check_dan[0] - dan_offset
-                if DEFAULT_DAN <= cur_dan <= self.total_dans:
-                    check_dan.append(cur_dan)
-
-            old_daniels = []  # List to track multiple old_daniel instances
-            matchmade = False
-            for dan in check_dan:
-                self.logger.debug(f"Checking dan queue for dan {dan}: {list(self.dans_in_queue[dan])}")
-                while self.dans_in_queue[dan]:  # Continue checking the same dan queue
-                    daniel2 = self.dans_in_queue[dan].popleft()
-                    self.logger.debug(f"Dequeued daniel2 from dans_in_queue[{dan}]: {daniel2}")
-
-                    self.logger.debug(f"player identifier: {str(daniel2['discord_id'])+"@"+daniel2['character']}, daniel1 recent: {self.in_queue[str(daniel1['discord_id'])+"@"+daniel1['character']][1]}")
-                    if daniel2['discord_id'] in self.in_queue[str(daniel1['discord_id'])+"@"+daniel1['character']][1] or daniel1['discord_id'] in self.in_queue[str(daniel2['discord_id'])+"@"+daniel2['character']][1]:
-                        self.logger.debug(f"Skipping daniel2 {daniel2} as they are in daniel1's recent opponents, or vice versa.")
-                        old_daniels.append(daniel2)
-                        continue
-                    
-                    if daniel2['discord_id'] == daniel1['discord_id']:
-                        self.logger.debug(f"Skipping daniel2 {daniel2} as they are the same user on different characters.")
-                        old_daniels.append(daniel2)
-                        continue
-
-                    if daniel2['discord_id'] in self.in_match and self.in_match[daniel2['discord_id']]:
-                        self.logger.debug(f"Skipping daniel2 {daniel2} as they are currently in a match as a different character.")
-                        old_daniels.append(daniel2)
-                        continue
-
-                    if daniel1['discord_id'] in self.in_match and self.in_match[daniel1['discord_id']]:
-                        self.logger.debug(f"Skipping daniel1 chosen from queue {daniel1} as they are currently in a match as a different character.")
-                        old_daniels.append(daniel2)
-                        continue
-
-                    # This is an old implementation but I'm keeping it here in case the new one breaks
-                    # self.in_queue[str(daniel2['discord_id'])+"@"+daniel2['character']] = [False, deque([str(daniel1['discord_id'])+"@"+daniel1['character']], maxlen=self.recent_opponents_limit)] # why does this do this instead of just mutate
-                    # self.in_queue[str(daniel1['discord_id'])+"@"+daniel1['character']][1].append(str(daniel2['discord_id'])+"@"+daniel2['character'])
-
-                    if str(daniel2['discord_id'])+"@"+daniel2['character'] in self.in_queue:
-                        self.in_queue[str(daniel2['discord_id'])+"@"+daniel2['character']][0] = False
-                        self.in_queue[str(daniel2['discord_id'])+"@"+daniel2['character']][1].append(daniel1['discord_id'])
-                    else:
-                        self.in_queue[str(daniel2['discord_id'])+"@"+daniel2['character']] = [False, deque([daniel1['discord_id']], maxlen=self.recent_opponents_limit)]
-
-                    self.in_queue[str(daniel1['discord_id'])+"@"+daniel1['character']][1].append(daniel2['discord_id'])
-
-                    # Clean up the main queue for players that have already been matched
-                    for idx in reversed(range(len(self.matchmaking_queue))):
-                        player = self.matchmaking_queue[idx]
-                        if player and (player['discord_id'] == daniel2['discord_id']) and (player['character'] == daniel2['character']):
-                            self.logger.debug(f"Removing matched player {player} from matchmaking_queue.")
-                            self.matchmaking_queue[idx] = None
-
-                    self.in_match[daniel1['discord_id']] = True
-                    self.in_match[daniel2['discord_id']] = True
-                    matchmade = True
-                    await self.create_match_interaction(ctx, daniel1, daniel2)
-                    break
+    @discord.commands.slash_command(name="memoryreport", description="[Owner Command] See what memory grew since the last report.")
+    @discord.commands.default_permissions(manage_guild=True)
+    async def memory_report(self, ctx : discord.ApplicationContext,
+                            stop: discord.Option(bool, description="Stop tracing allocations afterwards", default=False)):
+        if not await self.bot.is_owner(ctx.author):
+            await ctx.respond("Only the bot owner can see memory reports.", ephemeral=True)
+            return
+        await defer_once(ctx, ephemeral=True)
+        report = await self.diagnostics.memory_report()
+        if stop:
+            self.diagnostics.stop_tracing()
+        await ctx.respond(file=discord.File(io.BytesIO(report.encode()), filename="memory.txt"), ephemeral=True)
 
-                if matchmade:
-                    break
+    @discord.commands.slash_command(name="startmatchmaking", description="Start matchmaking.")
+    async def start_matchmaking(self, ctx: discord.ApplicationContext):
+        await self.matchmake(ctx.interaction)
+        await ctx.respond("Finished matchmaking")
 
-            # Re-add all skipped old_daniels back into the queue
-            self.logger.debug(f"Current matchmaking round finished, adding old_daniels {old_daniels} back into their dan queues")
-            for old_daniel in reversed(old_daniels):
-                self.logger.debug(f"Re-adding skipped daniel {old_daniel} back to dans_in_queue[{old_daniel['dan']}].")
-                self.dans_in_queue[old_daniel['dan']].appendleft(old_daniel)
-                self.in_queue[str(old_daniel['discord_id'])+"@"+old_daniel['character']][0] = True
-
-            if not matchmade:
-                self.logger.debug(f"No match found for daniel1 {daniel1}. Re-adding to queues.")
-                self.matchmaking_queue.append(daniel1)  # Append back to the deque
-                self.dans_in_queue[daniel1['dan']].append(daniel1)  # Append back to the deque
-                self.in_queue[str(daniel1['discord_id'])+"@"+daniel1['character']][0] = True
-                match_attempts += 1  # Since we can have multiple players on different chars, we have to check at least half(?) the queue
-                if match_attempts > (len(self.in_queue) // 2):
-                    self.logger.debug(f"No possible matches for any player in queue.")
-                    # shuffle(self.matchmaking_queue)
-                    break
+    async def matchmake(self, ctx: discord.Interaction, guild_id=None):
+        # Runs a matchmaking pass over the queue of the guild ctx came from, or guild_id when there is no ctx
+        # Pairing finishes before any match is announced, so queue commands never wait on Discord
+        if ctx is not None:
+            guild_id = ctx.guild_id
+        engine = self.get_engine(guild_id)
+        matches = engine.matchmake()
+        if matches:
+            engine.notify()  # Has the scheduler time the new matches' expiry
+        for daniel1, daniel2 in matches:
+            await self.create_match_interaction(ctx, daniel1, daniel2)
+
+    async def expire_matches(self, guild_id):
+        # Cancels guild_id's matches nobody reported within match_expiry_seconds and lets both players know
+        engine = self.get_engine(guild_id)
+        for match in engine.expire_matches():
+            await self.delete_match_message(match.report_message)
+            await self.delete_match_message(match.ongoing_message)
+
+            channel = self.bot.get_channel(engine.config.ACTIVE_MATCHES_CHANNEL_ID)
+            if channel:
+                await channel.send(
+                    f"The match between <@{match.p1['discord_id']}>'s {match.p1['character']} and <@{match.p2['discord_id']}>'s {match.p2['character']} "
+                    f"wasn't reported within {engine.config.match_expiry_seconds // 60} minutes and has been cancelled. Please rejoin the queue if you wish to keep matching."
+                )
+
+    async def delete_match_message(self, location):
+        # Deletes a message by its (channel_id, message_id), if there is one and it still exists
+        if location is None:
+            return
+        channel = self.bot.get_channel(location[0])
+        if channel:
+            try:
+                await channel.get_partial_message(location[1]).delete()
+            except discord.HTTPException as e:
+                self.logger.warning(f"Couldn't delete match message {location[1]}: {e}")
 
     async def create_match_interaction(self, ctx: discord.Interaction, daniel1, daniel2):
-        self.cur_active_matches += 1
+        # ctx is None when the match was made by the scheduler rather than a command
+        guild_id = ctx.guild_id if ctx is not None else daniel1['guild_id']
+        config = self.get_config(guild_id)
+        engine = self.get_engine(guild_id)
+        match = engine.active.for_player(daniel1['discord_id'])
+        if match is None:
+            return  # Ended before it could be announced
+        # The match can be reported, cancelled, expired or cleared at any await below, so it's looked up again by id
+        # after each message is sent, and a message for a match that has ended is deleted
+        match_id = match.match_id
 
         # Calucalte if a player can rank up or down from this match
-        rankup_potential = await self.check_rankup_potential(daniel1, daniel2)
+        rankup_potential = await self.check_rankup_potential(daniel1, daniel2, config)
         self.logger.debug(f"Player rankup potential is {rankup_potential}")
 
         promotion_alert = " :rotating_light: **PROMOTION MATCH** :rotating_light:"
@@ -849,39 +876,60 @@ class Danisen(commands.Cog):
             room_keyword = (daniel1['keyword'], 0) if daniel1['keyword'] else (daniel2['keyword'], 1)
 
         # Send a message in the #active-matches channel
-        channel = self.bot.get_channel(self.ONGOING_MATCHES_CHANNEL_ID)
+        channel = self.bot.get_channel(config.ONGOING_MATCHES_CHANNEL_ID)
         active_match_msg = None
         if channel:
-            active_match_msg = await channel.send(f"[{datetime.now().time().replace(microsecond=0)}] {daniel1['nickname']}'s {daniel1['character']} {self.emoji_mapping[daniel1['character']]}{p1_alert} (Dan {daniel1['dan']}, {round(daniel1['points'], 1)} points) vs {daniel2['nickname']}'s {daniel2['character']} {self.emoji_mapping[daniel2['character']]}{p2_alert} (Dan {daniel2['dan']}, {round(daniel2['points'], 1)} points).{" Room pw is `" + room_keyword[0] + "`." if room_keyword[0] else ""}")
-        else:
+            active_match_msg = await channel.send(f"[{datetime.now().time().replace(microsecond=0)}] {daniel1['nickname']}'s {daniel1['character']} {config.emoji_mapping[daniel1['character']]}{p1_alert} (Dan {daniel1['dan']}, {round(daniel1['points'], 1)} points) vs {daniel2['nickname']}'s {daniel2['character']} {config.emoji_mapping[daniel2['character']]}{p2_alert} (Dan {daniel2['dan']}, {round(daniel2['points'], 1)} points).{" Room pw is `" + room_keyword[0] + "`." if room_keyword[0] else ""}")
+        elif ctx is not None:
             await ctx.respond(
-                f"Could not find channel to add to current ongoing matches (could be an issue with channel id {self.ONGOING_MATCHES_CHANNEL_ID} or bot permissions)"
+                f"Could not find channel to add to current ongoing matches (could be an issue with channel id {config.ONGOING_MATCHES_CHANNEL_ID} or bot permissions)"
             )
+        else:
+            self.logger.warning(f"Could not find ongoing matches channel {config.ONGOING_MATCHES_CHANNEL_ID}")
+
+        match = engine.active.get(match_id)
+        if match is None:
+            if active_match_msg:
+                await self.delete_match_message((active_match_msg.channel.id, active_match_msg.id))
+            return
+        if active_match_msg:
+            match.ongoing_message = (active_match_msg.channel.id, active_match_msg.id)
 
         # Create view for dropdown reporting
-        view = MatchView(self, daniel1, daniel2, active_match_msg) # Report Match Dropdown
+        view = match_report_view(match) # Report Match Dropdown
         id1 = f"<@{daniel1['discord_id']}>"
         id2 = f"<@{daniel2['discord_id']}>"        
 
         # Send the message with the view in the #dani-matches
-        channel = self.bot.get_channel(self.ACTIVE_MATCHES_CHANNEL_ID)
+        channel = self.bot.get_channel(config.ACTIVE_MATCHES_CHANNEL_ID)
         if channel:
             webhook_msg = await channel.send(
-                content=f"\n## New Match Created\n### Player 1: {id1} {daniel1['character']} (Dan {daniel1['dan']}, {round(daniel1['points'], 1):.1f} points) {self.emoji_mapping[daniel1['character']]}\n\n### Player 2: {id2} {daniel2['character']} (Dan {daniel2['dan']}, {round(daniel2['points'], 1):.1f} points) {self.emoji_mapping[daniel2['character']]}" +\
+                content=f"\n## New Match Created\n### Player 1: {id1} {daniel1['character']} (Dan {daniel1['dan']}, {round(daniel1['points'], 1):.1f} points) {config.emoji_mapping[daniel1['character']]}\n\n### Player 2: {id2} {daniel2['character']} (Dan {daniel2['dan']}, {round(daniel2['points'], 1):.1f} points) {config.emoji_mapping[daniel2['character']]}" +\
                 (f"\n\nThe room host will be {[id1, id2][room_keyword[1]]}, pw `{room_keyword[0]}`." if room_keyword[0] else f"\n\nNeither player has a default room password set, please coordinate the room in <#1433545145554309233>") +\
                 "\n\nAll sets are FT3, do not swap characters off of the character you matched as.\nPlease report the set result in the drop down menu after the set! (only players in the match and admins can report it)",
                 view=view,
             )
+            view.stop()  # Reports are answered by on_interaction, py-cord needn't keep the view
+            match = engine.active.get(match_id)
+            if match is None:
+                await self.delete_match_message((channel.id, webhook_msg.id))  # Whatever ended the match deleted its ongoing message
+                return
+            match.report_message = (channel.id, webhook_msg.id)
             await webhook_msg.pin()
 
             # deleting the pin added system message (checking last 5 messages incase some other stuff was posted in the channel in the meantime)
             async for message in channel.history(limit=5):
                 if message.type == discord.MessageType.pins_add:
                     await message.delete()
-        else:
+        elif ctx is not None:
             await ctx.respond(
-                f"Could not find channel to send match message to (could be an issue with channel id {self.ACTIVE_MATCHES_CHANNEL_ID} or bot permissions)"
+                f"Could not find channel to send match message to (could be an issue with channel id {config.ACTIVE_MATCHES_CHANNEL_ID} or bot permissions)"
             )
+        else:
+            self.logger.warning(f"Could not find active matches channel {config.ACTIVE_MATCHES_CHANNEL_ID}")
+
+        if engine.active.get(match_id) is match:
+            engine.active.update(match)  # Saves the message ids, so the match can still be cleaned up after a restart
 
     #report match score
     @discord.commands.slash_command(name="reportmatch", description="Report a match score")
@@ -892,17 +940,17 @@ class Danisen(commands.Cog):
                            player2_name: discord.Option(str, autocomplete=player_autocomplete),
                            char2: discord.Option(str, autocomplete=character_autocomplete),
                            winner: discord.Option(str, choices=players)):
-        char1 = self.convert_character_alias(char1)
-        char2 = self.convert_character_alias(char2)
-        if not self.is_valid_char(char1):
+        char1 = self.convert_character_alias(char1, ctx.guild_id)
+        char2 = self.convert_character_alias(char2, ctx.guild_id)
+        if not self.is_valid_char(char1, ctx.guild_id):
             await ctx.respond(f"Invalid char1 selected {char1}. Please choose a valid char1.")
             return
-        if not self.is_valid_char(char2):
+        if not self.is_valid_char(char2, ctx.guild_id):
             await ctx.respond(f"Invalid char2 selected {char2}. Please choose a valid char2.")
             return
 
-        player1 = self.get_player(player1_name, char1)
-        player2 = self.get_player(player2_name, char2)
+        player1 = self.get_player(player1_name, char1, ctx.guild_id)
+        player2 = self.get_player(player2_name, char2, ctx.guild_id)
 
         if not player1:
             await ctx.respond(f"No player named {player1_name} with character {char1}")
@@ -939,18 +987,20 @@ class Danisen(commands.Cog):
 
         self.logger.info(f"Adding match of {player1['player_name']} vs {player2['player_name']} into matches table")
         self.database_cur.execute(
-            "INSERT INTO matches (winner_discord_id, winner_character, loser_discord_id, loser_character) VALUES (?, ?, ?, ?)", 
-            (winner_id, winner_char, loser_id, loser_char)
+            "INSERT INTO matches (guild_id, winner_discord_id, winner_character, loser_discord_id, loser_character, played_at) VALUES (?, ?, ?, ?, ?, UNIXEPOCH('now'))", 
+            (ctx.guild_id, winner_id, winner_char, loser_id, loser_char)
         )
         self.database_con.commit()
+        self.data_changed(ctx.guild_id, winner_id, loser_id)
 
         rankup_message = ", Rank up!" if winner_rank[2] else f", Unable to rank up, must beat an opponent Dan {SPECIAL_RANK_THRESHOLD} or higher." if winner_rank[4] else ""
         rankdown_message = ", Rank down..." if loser_rank[2] else ""
+        emoji_mapping = self.get_config(ctx.guild_id).emoji_mapping
 
         await ctx.respond(
             f"### The match has been reported as <@{winner_id}>'s victory over <@{loser_id}>!\n"
-            f"{winner}'s {winner_char} {self.emoji_mapping[winner_char]}: Dan {winner_old_dan}, {round(winner_old_points, 1):.1f} points → **Dan {winner_rank[0]}, {round(winner_rank[1], 1):.1f} points** (+{winner_rank[3]} point(s){rankup_message})\n"
-            f"{loser}'s {loser_char} {self.emoji_mapping[loser_char]}: Dan {loser_old_dan}, {round(loser_old_points, 1):.1f} points → **Dan {loser_rank[0]}, {round(loser_rank[1], 1):.1f} points** ({loser_rank[3]} point(s){rankdown_message})"
+            f"{winner}'s {winner_char} {emoji_mapping[winner_char]}: Dan {winner_old_dan}, {round(winner_old_points, 1):.1f} points → **Dan {winner_rank[0]}, {round(winner_rank[1], 1):.1f} points** (+{winner_rank[3]} point(s){rankup_message})\n"
+            f"{loser}'s {loser_char} {emoji_mapping[loser_char]}: Dan {loser_old_dan}, {round(loser_old_points, 1):.1f} points → **Dan {loser_rank[0]}, {round(loser_rank[1], 1):.1f} points** ({loser_rank[3]} point(s){rankdown_message})"
         )
 
     #report match score for the queue
@@ -982,23 +1032,28 @@ class Danisen(commands.Cog):
 
         self.logger.info(f"Adding match of {player1['player_name']} vs {player2['player_name']} into matches table")
         self.database_cur.execute(
-            "INSERT INTO matches (winner_discord_id, winner_character, loser_discord_id, loser_character) VALUES (?, ?, ?, ?)", 
-            (winner_id, winner_char, loser_id, loser_char)
+            "INSERT INTO matches (guild_id, winner_discord_id, winner_character, loser_discord_id, loser_character, played_at) VALUES (?, ?, ?, ?, ?, UNIXEPOCH('now'))", 
+            (interaction.guild_id, winner_id, winner_char, loser_id, loser_char)
         )
+        report_id = self.database_cur.lastrowid
         self.database_con.commit()
+        self.data_changed(interaction.guild_id, winner_id, loser_id)
 
-        view = RequeueView(self, player1, player2)
+        view = requeue_view(report_id)
         rankup_message = ", Rank up!" if winner_rank[2] else f", Unable to rank up, must beat an opponent Dan {SPECIAL_RANK_THRESHOLD} or higher." if winner_rank[4] else ""
         rankdown_message = ", Rank down..." if loser_rank[2] else ""
 
-        channel = self.bot.get_channel(self.REPORTED_MATCHES_CHANNEL_ID)
+        config = self.get_config(interaction.guild_id)
+        emoji_mapping = config.emoji_mapping
+        channel = self.bot.get_channel(config.REPORTED_MATCHES_CHANNEL_ID)
         if channel:
             await channel.send(
                 content=f"### The match has been reported as <@{winner_id}>'s victory over <@{loser_id}>!\n"
-                f"{winner}'s {winner_char} {self.emoji_mapping[winner_char]}: Dan {winner_old_dan}, {round(winner_old_points, 1):.1f} points → **Dan {winner_rank[0]}, {round(winner_rank[1], 1):.1f} points** (+{winner_rank[3]} point(s){rankup_message})\n"
-                f"{loser}'s {loser_char} {self.emoji_mapping[loser_char]}: Dan {loser_old_dan}, {round(loser_old_points, 1):.1f} points → **Dan {loser_rank[0]}, {round(loser_rank[1], 1):.1f} points** ({loser_rank[3]} point(s){rankdown_message})",
+                f"{winner}'s {winner_char} {emoji_mapping[winner_char]}: Dan {winner_old_dan}, {round(winner_old_points, 1):.1f} points → **Dan {winner_rank[0]}, {round(winner_rank[1], 1):.1f} points** (+{winner_rank[3]} point(s){rankup_message})\n"
+                f"{loser}'s {loser_char} {emoji_mapping[loser_char]}: Dan {loser_old_dan}, {round(loser_old_points, 1):.1f} points → **Dan {loser_rank[0]}, {round(loser_rank[1], 1):.1f} points** ({loser_rank[3]} point(s){rankdown_message})",
                 view=view
                 )
+            view.stop()
         else:
             self.logger.warning("No Report Matches Channel")
 
@@ -1014,50 +1069,17 @@ class Danisen(commands.Cog):
     #         }
     #         for daniel in daniels
     #     ]
-    #     embeds = self.create_paginated_embeds(f"Dan {dan}", data, MAX_FIELDS_PER_EMBED, colour=self.dan_colours[dan - 1])
+    #     embeds = self.create_paginated_embeds(f"Dan {dan}", data, lambda idx, row: (f"#{idx+1}: {row['name']}", f"Current Rank: {row['value']}"), MAX_FIELDS_PER_EMBED, colour=self.dan_colours[dan - 1])
     #     paginator = pages.Paginator(pages=embeds)
 
     #     await paginator.respond(ctx.interaction, ephemeral=False)
 
     # Add a helper function for paginated embeds
-    def create_paginated_embeds(self, title, data, fields_per_page, colour=None):
-        """Helper function to create paginated embeds."""
-        page_list = []
-        fields_per_page += 1 # Includes Title
-        total_pages = (len(data) // fields_per_page) + 1
-        items_per_page = len(data) // total_pages
-        for page in range(total_pages):
-            em = discord.Embed(title=f"{title} ({page + 1}/{total_pages})", colour=colour)
-            page_list.append(em)
-            for idx in range(page * items_per_page, min((page + 1) * items_per_page, len(data))):
-                em.add_field(name=f"#{idx+1}: {data[idx]['name']}", value=f"Current Rank: {data[idx]['value']}", inline=False)
-        return page_list
-
-    def create_paginated_character_embeds(self, title, data, fields_per_page, colour=None):
-        """Helper function to create paginated embeds."""
-        page_list = []
-        fields_per_page += 1 # Includes Title
-        total_pages = (len(data) // fields_per_page) + 1
-        items_per_page = len(data) // total_pages
-        for page in range(total_pages):
-            em = discord.Embed(title=f"{title} ({page + 1}/{total_pages})", colour=colour)
-            page_list.append(em)
-            for idx in range(page * items_per_page, min((page + 1) * items_per_page, len(data))):
-                em.add_field(name=f"{data[idx]['name']}: {data[idx]['character_count']} registered player(s)", value=f"Total Wins: {data[idx]['wins']}, Total Losses: {data[idx]['losses']}, Winrate: {data[idx]['winrate']:.1f}%", inline=False)
-        return page_list
-
-    def create_paginated_dan_embeds(self, title, data, fields_per_page, colour=None):
-        """Helper function to create paginated embeds."""
-        page_list = []
-        fields_per_page += 1 # Includes Title
-        total_pages = (len(data) // fields_per_page) + 1
-        items_per_page = len(data) // total_pages
-        for page in range(total_pages):
-            em = discord.Embed(title=f"{title} ({page + 1}/{total_pages})", colour=colour)
-            page_list.append(em)
-            for idx in range(page * items_per_page, min((page + 1) * items_per_page, len(data))):
-                em.add_field(name=f"{data[idx]['name']}:", value=f"Current Players: {data[idx]['value']}", inline=False)
-        return page_list
+    def create_paginated_embeds(self, title, data, format_field, fields_per_page, count=None, colour=None):
+        """Helper function to create paginated embeds. data is a list of rows, or a row source from cogs.lazy_pages along with its row count."""
+        if isinstance(data, list):
+            data, count = list_source(data), len(data)
+        return LazyPages(title, count, data, format_field, fields_per_page, colour=colour)
 
     def create_danisen_stat_embed(self, title, data, fields_per_page, colour=None):
         """Helper function to create paginated embeds."""
@@ -1070,26 +1092,24 @@ class Danisen(commands.Cog):
 
         return page_list
 
-    # Refactor danisen_stats to use the helper function
-    @discord.commands.slash_command(name="danisenstats", description="See various statistics about the danisen")
-    async def danisen_stats(self, ctx: discord.ApplicationContext):
-        danisen_info = self.database_cur.execute(
-            "SELECT accounts, characters, total_games FROM (SELECT COUNT(*) AS accounts FROM users) AS AccountsTable JOIN (SELECT COUNT(*) AS characters FROM players) AS CharactersTable JOIN (SELECT COUNT(*) AS total_games FROM matches) AS MatchesTable"
-        ).fetchone()
-        char_info = self.database_cur.execute(
-            "SELECT CharCountTable.character AS name, character_count, wins, losses, ROUND(100.0 * wins / (wins + losses), 1) AS winrate FROM (SELECT character, COUNT(*) AS character_count FROM players GROUP BY character) AS CharCountTable JOIN (SELECT winner_character AS character, COUNT(*) AS wins FROM matches GROUP BY winner_character) AS CharWinTable ON CharCountTable.character = CharWinTable.character JOIN (SELECT loser_character AS character, COUNT(*) AS losses FROM matches GROUP BY loser_character) AS CharLossTable ON CharCountTable.character = CharLossTable.character GROUP BY CharCountTable.character ORDER BY character_count DESC"
-        ).fetchall()
-        dan_count = self.database_cur.execute(
-            "SELECT dan AS name, COUNT(*) AS value FROM players GROUP BY dan ORDER BY dan"
-        ).fetchall()
-
+    def render_stats_pages(self, danisen_info, char_info, dan_count):
         # reformat dan count as their names are just numbers
         dan_count = [{"name": f"Dan {dan['name']}", "value": dan['value']} for dan in dan_count]
         danisen_pages = self.create_danisen_stat_embed("General Danisen Stats", danisen_info, MAX_FIELDS_PER_EMBED)
-        char_pages = self.create_paginated_character_embeds("Character Usage Stats", char_info, MAX_FIELDS_PER_EMBED)
-        dan_pages = self.create_paginated_dan_embeds("Dan Stats", dan_count, MAX_FIELDS_PER_EMBED, colour=discord.Color.blurple())
-
-        paginator = pages.Paginator(pages=danisen_pages + char_pages + dan_pages)
+        char_pages = self.create_paginated_embeds("Character Usage Stats", char_info, lambda idx, char: (
+            f"{char['name']}: {char['character_count']} registered player(s)",
+            f"Total Wins: {char['wins']}, Total Losses: {char['losses']}, Winrate: {char['winrate']:.1f}%"
+        ), MAX_FIELDS_PER_EMBED)
+        dan_pages = self.create_paginated_embeds("Dan Stats", dan_count, lambda idx, dan: (f"{dan['name']}:", f"Current Players: {dan['value']}"),
+                                                 MAX_FIELDS_PER_EMBED, colour=discord.Color.blurple())
+        return danisen_pages + list(char_pages) + list(dan_pages)
+
+    # Pages come from the stats snapshot, so the aggregate queries don't run per command
+    @discord.commands.slash_command(name="danisenstats", description="See various statistics about the danisen")
+    async def danisen_stats(self, ctx: discord.ApplicationContext):
+        stats_pages = await self.stats.get(ctx.guild_id)
+        paginator = pages.Paginator(pages=list(stats_pages))
+        await defer_once(ctx)  # Paginator only checks is_done(), so a watchdog defer mid flight would make it fail
         await paginator.respond(ctx.interaction, ephemeral=False)
 
     # I've currently commented this out, I intend to reimplement it using a different sqlite table and more extensive stats tracking
@@ -1097,20 +1117,27 @@ class Danisen(commands.Cog):
     # Refactor leaderboard to use the helper function
     @discord.commands.slash_command(description="See the top players")
     async def leaderboard(self, ctx: discord.ApplicationContext):
-        daniels = self.database_cur.execute(
-            "SELECT nickname || '''s ' || character AS name, 'Dan ' || dan || ', ' || ROUND(points, 1) || ' points' AS value "
-            "FROM players JOIN users ON players.discord_id = users.discord_id ORDER BY dan DESC, points DESC"
-        ).fetchall()
-
-        leaderboard_pages = self.create_paginated_embeds("Top Danisen Characters", daniels, MAX_FIELDS_PER_EMBED)
+        # Only the rows of pages that get shown are read, ties broken by id so pages don't overlap
+        query = ("SELECT nickname || '''s ' || character AS name, 'Dan ' || dan || ', ' || ROUND(points, 1) || ' points' AS value "
+                 "FROM players JOIN users ON players.guild_id = users.guild_id AND players.discord_id = users.discord_id WHERE players.guild_id=? ORDER BY dan DESC, points DESC, players.discord_id, character")
+        count = self.database_cur.execute("SELECT COUNT(*) AS total FROM players WHERE guild_id=?", (ctx.guild_id,)).fetchone()['total']
+
+        leaderboard_pages = self.create_paginated_embeds("Top Danisen Characters", query_source(self.database_cur, query, (ctx.guild_id,)), lambda idx, daniel: (
+            f"#{idx+1}: {daniel['name']}", f"Current Rank: {daniel['value']}"
+        ), MAX_FIELDS_PER_EMBED, count=count)
         paginator = pages.Paginator(pages=leaderboard_pages)
+        await defer_once(ctx, ephemeral=True)  # See danisen_stats
         await paginator.respond(ctx.interaction, ephemeral=True)
 
     @discord.commands.slash_command(name="updatemaxmatches", description="[Admin Command] Update max matches for the queue system")
     @discord.commands.default_permissions(manage_messages=True)
     async def update_max_matches(self, ctx : discord.ApplicationContext,
                                  max : discord.Option(int, min_value=1)):
-        self.max_active_matches = max
+        try:
+            self.set_runtime_config(ctx.guild_id, max_active_matches=max)
+        except ValueError as e:
+            await ctx.respond(f"Invalid value: {e}")
+            return
         await ctx.respond(f"Max matches updated to {max}")
         # if (self.cur_active_matches < self.max_active_matches and  # Taking out automatic matchmaking
         # len(self.matchmaking_queue) >= 2):
@@ -1131,11 +1158,12 @@ class Danisen(commands.Cog):
 
         # Fallback to runtime attributes if some keys are missing
         merged = dict(DEFAULT_CONFIG)
-        merged.update(config)
+        merged.update(guild_config_dict(config, ctx.guild_id))
         # Also include some runtime-derived values
-        merged['max_active_matches'] = self.max_active_matches
-        merged['queue_status'] = self.queue_status
-        merged['total_dans'] = self.total_dans
+        runtime_config = self.get_config(ctx.guild_id)
+        merged['max_active_matches'] = runtime_config.max_active_matches
+        merged['queue_status'] = runtime_config.queue_status
+        merged['total_dans'] = runtime_config.total_dans
 
         em = discord.Embed(title="Current Configuration", color=discord.Color.blurple())
         for k, v in merged.items():
@@ -1149,8 +1177,10 @@ class Danisen(commands.Cog):
                          key: discord.Option(str, choices=[
                              "ACTIVE_MATCHES_CHANNEL_ID", "REPORTED_MATCHES_CHANNEL_ID", "ONGOING_MATCHES_CHANNEL_ID",
                              "total_dans", "minimum_derank", "maximum_rank_difference",
-                             "rank_gap_for_more_points_1", "rank_gap_for_more_points_2" "point_rollover", "queue_status",
-                             "recent_opponents_limit", "max_active_matches", "special_rank_up_rules"
+                             "rank_gap_for_more_points_1", "rank_gap_for_more_points_2", "point_rollover", "queue_status",
+                             "recent_opponents_limit", "max_active_matches", "special_rank_up_rules",
+                             "matchmaking_debounce", "matchmaking_max_wait", "rank_window_relax_seconds",
+                             "recent_opponents_expiry_seconds", "match_expiry_seconds", "interaction_defer_budget"
                          ]),
                          value: discord.Option(str)):
         """Update a single configuration key and persist it to disk."""
@@ -1164,78 +1194,31 @@ class Danisen(commands.Cog):
         except Exception as e:
             self.logger.warning(f"Failed to load existing config while setting key: {e}")
 
-        # Determine expected type from DEFAULT_CONFIG when possible
-        expected = DEFAULT_CONFIG.get(key, None)
-
-        def parse_to_expected(val_str, expected_default):
-            # If DEFAULT_CONFIG provides a default, use its type
-            if expected_default is not None:
-                target_type = type(expected_default)
-            else:
-                # Fallback heuristics
-                if key.upper().endswith('CHANNEL_ID') or 'CHANNEL' in key.upper():
-                    target_type = str
-                elif key in ('point_rollover', 'queue_status', 'special_rank_up_rules'):
-                    target_type = bool
-                else:
-                    # default to int for most numeric-like config options
-                    target_type = int
-
-            s = val_str.strip()
-            # Booleans
-            if target_type is bool:
-                low = s.lower()
-                if low in ('true', '1', 'yes', 'on'):
-                    return True
-                if low in ('false', '0', 'no', 'off'):
-                    return False
-                # try JSON parse
-                try:
-                    parsed = json.loads(s)
-                    if isinstance(parsed, bool):
-                        return parsed
-                except Exception:
-                    pass
-                # fallback: non-empty string => True
-                return bool(s)
-
-            # Integers
-            if target_type is int:
-                try:
-                    return int(s)
-                except Exception:
-                    try:
-                        parsed = json.loads(s)
-                        if isinstance(parsed, (int, float)):
-                            return int(parsed)
-                    except Exception:
-                        pass
-                    # final fallback: 0
-                    return 0
-
-            # Strings
-            if target_type is str:
-                return s
-
-            # Fallback: try json then return raw string
-            try:
-                return json.loads(s)
-            except Exception:
-                return s
+        # Parse the value to the setting's type, then check the guild's config is still valid with it
+        try:
+            parsed_value = parse_config_value(key, value)
+            LadderConfig.from_dict({**guild_config_dict(cfg, ctx.guild_id), key: parsed_value})
+        except ValueError as e:
+            await ctx.respond(f"Invalid value for `{key}`: {e}", ephemeral=True)
+            return
+        if isinstance(DEFAULT_CONFIG.get(key), str):
+            parsed_value = str(parsed_value)  # Channel ids are kept as strings in the file
 
-        parsed_value = parse_to_expected(value, expected)
+        # Store the parsed value in this guild's section, so other guilds keep their own settings
+        cfg.setdefault('guilds', {}).setdefault(str(ctx.guild_id), {})[key] = parsed_value
 
-        # Store the parsed value
-        cfg[key] = parsed_value
+        # The file value replaces any runtime change made to this key by an admin command
+        self.runtime_overrides.get(ctx.guild_id, {}).pop(key, None)
 
-        # Ensure the config dir exists and write back
+        # Ensure the config dir exists and write back. Written to a temp file first so the config watcher never reads half a file
         try:
             os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
-            with open(self.config_path, 'w') as f:
+            with open(self.config_path + ".tmp", 'w') as f:
                 json.dump(cfg, f, indent=4)
+            os.replace(self.config_path + ".tmp", self.config_path)
         except Exception as e:
             self.logger.error(f"Failed to persist configuration: {e}")
-            await ctx.respond(f"Failed to persist configuration: {e}")
+            await ctx.respond(f"Failed to persist configuration: {e}", ephemeral=True)
             return
 
         # Reload runtime config
@@ -1246,17 +1229,17 @@ class Danisen(commands.Cog):
 
         await ctx.respond(f"Configuration key `{key}` updated to `{parsed_value}`", ephemeral=True)
 
-    def get_player(self, player_name, character):
+    def get_player(self, player_name, character, guild_id):
         res = self.database_cur.execute(
-            "SELECT users.discord_id AS discord_id, player_name, nickname, keyword, character, dan, points FROM players JOIN users ON players.discord_id = users.discord_id WHERE player_name=? AND character=?", 
-            (player_name, character)
+            "SELECT users.guild_id AS guild_id, users.discord_id AS discord_id, player_name, nickname, keyword, character, dan, points FROM players JOIN users ON players.guild_id = users.guild_id AND players.discord_id = users.discord_id WHERE users.guild_id=? AND player_name=? AND character=?", 
+            (guild_id, player_name, character)
         )
         return res.fetchone()
 
-    def get_players_by_dan(self, dan):
+    def get_players_by_dan(self, dan, guild_id):
         res = self.database_cur.execute(
-            "SELECT users.discord_id AS discord_id, player_name, nickname, keyword, character, dan, points FROM players JOIN users ON players.discord_id = users.discord_id WHERE dan=?", 
-            (dan,)
+            "SELECT users.guild_id AS guild_id, users.discord_id AS discord_id, player_name, nickname, keyword, character, dan, points FROM players JOIN users ON players.guild_id = users.guild_id AND players.discord_id = users.discord_id WHERE users.guild_id=? AND dan=?", 
+            (guild_id, dan)
         )
         return res.fetchall()
 
@@ -1268,36 +1251,36 @@ class Danisen(commands.Cog):
         # await ctx.response.defer()
 
         if discord_name:
-            members = ctx.guild.members
-            member = next((m for m in members if discord_name.lower() == m.name.lower()), None)
+            member = await self.find_member(ctx.guild, discord_name)
             if not member:
                 await ctx.respond(f"{discord_name} isn't a member of this server.")
                 return
         else:
             member = ctx.author
 
-        # Fetch all characters for the player
-        res = self.database_cur.execute(
-            "SELECT character, dan, points FROM players WHERE discord_id = ?", 
-            (member.id,)
-        ).fetchall()
+        em = self.profiles.get(ctx.guild_id, member.id)
+        if em is None:
+            em = self.render_profile(ctx, member)
+            if em is None:
+                await ctx.respond(f"{member.name} has no registered characters.")
+                return
+            self.profiles.put(ctx.guild_id, member.id, em)
 
-        if not res:
-            await ctx.respond(f"{member.name} has no registered characters.")
-            return
+        await ctx.respond(embed=em)
 
-        user_res = self.database_cur.execute( # implicitly required to exist based on registered characters
-            "SELECT * FROM users WHERE discord_id = ?",
-            (member.id,)
-        ).fetchone()
+    def render_profile(self, ctx, member):
+        # Builds member's profile embed, or returns None if they have no registered characters
+        profile = query_profile(self.database_con, ctx.guild_id, member.id)
+        if not profile:
+            return None
 
-        player_highest_dan = self.get_players_highest_dan(member.name)
-        dan_colour = discord.utils.get(ctx.guild.roles, name=f"Dan {player_highest_dan}").color
+        player_highest_dan = max(char['dan'] for char in profile['characters'])
+        dan_role = discord.utils.get(ctx.guild.roles, name=f"Dan {player_highest_dan}")
 
         # Create an embed to display the profile
         em = discord.Embed(
-            title=f"{user_res['nickname']}'s Profile",
-            color=dan_colour
+            title=f"{profile['nickname']}'s Profile",
+            color=dan_role.color if dan_role else None
         )
         if member.avatar:
             em.set_thumbnail(url=member.avatar.url)
@@ -1308,18 +1291,18 @@ class Danisen(commands.Cog):
             inline=False
         )
 
-        winrate_info = self.get_winrate_by_id(user_res['discord_id'])
+        winrate = 100 * profile['wins'] / (profile['wins'] + profile['losses']) if profile['wins'] or profile['losses'] else 0
 
         em.add_field(
             name=f"Set Winrate:",
-            value=f"{winrate_info[0]:.2f}%, ({winrate_info[1]}W, {winrate_info[2]}L)",
+            value=f"{winrate:.2f}%, ({profile['wins']}W, {profile['losses']}L)",
             inline=False
         )
 
-        if user_res["keyword"]:
+        if profile["keyword"]:
             em.add_field(
                 name=f"Room Password:",
-                value=f"`{user_res["keyword"]}`",
+                value=f"`{profile["keyword"]}`",
                 inline=True
             )
         else:
@@ -1335,28 +1318,33 @@ class Danisen(commands.Cog):
             inline=False
         )
 
-        char_winrates = self.get_all_char_winrate_by_id(user_res['discord_id'])
+        emoji_mapping = self.get_config(ctx.guild_id).emoji_mapping
 
-        for row in res:
-            if row['character'] in char_winrates:
-                em.add_field(
-                    name=f"{row["character"]} {self.emoji_mapping[row['character']]}", 
-                    value=f"Dan {row['dan']}, {round(row['points'], 1):.1f} points. {char_winrates[row['character']][2]:.2f}% Winrate ({char_winrates[row['character']][0]}W, {char_winrates[row['character']][1]}L)", 
-                    inline=False
-                )
-            else:
-                em.add_field(
-                    name=f"{row["character"]} {self.emoji_mapping[row['character']]}", 
-                    value=f"Dan {row['dan']}, {round(row['points'], 1):.1f} points. 0.00% Winrate (0W, 0L)", 
-                    inline=False
-                )
+        for char in profile['characters']:
+            char_winrate = 100 * char['wins'] / (char['wins'] + char['losses']) if char['wins'] or char['losses'] else 0.0
+            em.add_field(
+                name=f"{char["character"]} {emoji_mapping.get(char['character'], '')}",
+                value=f"Dan {char['dan']}, {round(char['points'], 1):.1f} points. {char_winrate:.2f}% Winrate ({char['wins']}W, {char['losses']}L)",
+                inline=False
+            )
 
-        await ctx.respond(embed=em)
+        return em
+
+    # Helper function
+    # Returns the member whose discord name is name, or None. Registered players are found by their id, so this works
+    # without the guild's member list cached. Anyone else has to be in the member cache
+    async def find_member(self, guild, name):
+        res = self.database_cur.execute("SELECT discord_id FROM users WHERE guild_id=? AND player_name=? COLLATE NOCASE", (guild.id, name)).fetchone()
+        if res:
+            member = await self.members.get(guild, res['discord_id'])
+            if member is not None and member.name.lower() == name.lower():
+                return member
+        return next((m for m in guild.members if name.lower() == m.name.lower()), None)
 
     # Helper function
     # Returns the highest Dan rank on any character registered by this player. If the player has no characters registered, return None
-    def get_players_highest_dan(self, player_name: str):
-        res = self.database_cur.execute("SELECT MAX(dan) as max_dan FROM players JOIN users ON players.discord_id = users.discord_id WHERE player_name=?", (player_name,)).fetchone()
+    def get_players_highest_dan(self, player_name: str, guild_id: int):
+        res = self.database_cur.execute("SELECT MAX(dan) as max_dan FROM players JOIN users ON players.guild_id = users.guild_id AND players.discord_id = users.discord_id WHERE users.guild_id=? AND player_name=?", (guild_id, player_name)).fetchone()
         if res:
             return res['max_dan']
         else:
@@ -1377,48 +1365,71 @@ class Danisen(commands.Cog):
     async def view_queue_alias(self, ctx : discord.ApplicationContext):
         await self.view_queue(ctx)
 
-    # This function is used to create an asynchronous task for the matchmaking timer if there is not one running
-    async def begin_matchmaking_timer(self, interaction: discord.Interaction, delay: int):
-        self.logger.debug(f"Attempting to start matchmaking timer")
-        if self.matchmaking_coro is None or self.matchmaking_coro.done():
-            self.matchmaking_coro = asyncio.create_task(self.matchmaking_timer(interaction, delay))
-            self.logger.debug(f"Matchmaking timer started with {delay} seconds")
-
-    async def matchmaking_timer(self, interaction: discord.Interaction, delay: int):
-        await asyncio.sleep(delay)
-        self.logger.debug(f"Timer ended, attempting matchmaking")
-        self.logger.debug(f"matchmake command from matchmaking_timer awaiting lock")
-        async with self.queue_lock:
-            self.logger.debug(f"matchmake command from matchmaking_timer acquired lock")
-            await self.matchmake(interaction)
-
-        while len(self.matchmaking_queue) > 0:
-            self.logger.debug(f"players still detected in queue, restarting timer")
-            await asyncio.sleep(delay)
-            self.logger.debug(f"Timer ended, attempting matchmaking")
-            self.logger.debug(f"matchmake command from matchmaking_timer awaiting lock")
-            async with self.queue_lock:
-                self.logger.debug(f"matchmake command from matchmaking_timer acquired lock")
-                await self.matchmake(interaction)
-
-        self.logger.debug(f"Not restarting timer, no players in queue")
+    # This function is used to create the matchmaking scheduler task for a guild if there is not one running
+    def start_matchmaking_scheduler(self, guild_id):
+        engine = self.get_engine(guild_id)
+        if engine.matchmaking_coro is None or engine.matchmaking_coro.done():
+            engine.matchmaking_coro = asyncio.create_task(self.matchmaking_scheduler(guild_id))
+            self.logger.debug(f"Matchmaking scheduler started for guild {guild_id}")
+
+    async def matchmaking_scheduler(self, guild_id):
+        # Runs a matchmaking pass after joins, requeues and finished matches, and sleeps while nobody can be paired
+        engine = self.get_engine(guild_id)
+        loop = asyncio.get_running_loop()
+        while True:
+            # A pair can become legal just by time passing, so also wake up when a dan window widens, a rematch expires
+            # or an unreported match expires and frees its slot
+            delays = [delay for delay in (engine.seconds_until_pair_change(), engine.seconds_until_match_expires()) if delay is not None]
+            try:
+                await asyncio.wait_for(engine.wakeup.wait(), min(delays) if delays else None)
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                await self.expire_matches(guild_id)
+            except Exception as e:
+                self.logger.exception(f"Expiring matches failed for guild {guild_id}: {e}")
+
+            # Debounce so a burst of joins is paired in one pass, but never hold the first change past the max wait
+            deadline = loop.time() + engine.config.matchmaking_max_wait
+            while True:
+                engine.wakeup.clear()
+                timeout = min(engine.config.matchmaking_debounce, deadline - loop.time())
+                if timeout <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(engine.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            if not engine.has_legal_pair():
+                self.logger.debug(f"No legal pair in guild {guild_id}'s queue, scheduler sleeping")
+                continue
+
+            self.logger.debug(f"Scheduler attempting matchmaking for guild {guild_id}")
+            try:
+                await self.matchmake(None, guild_id)
+            except Exception as e:
+                self.logger.exception(f"Scheduled matchmaking failed for guild {guild_id}: {e}")
 
     @discord.commands.slash_command(name="setroompassword", description="Assign a default room password to your profile")
     async def set_room_password(self, ctx: discord.ApplicationContext, pw: discord.Option(str, name="password", required=True)):
         if not pw.isalnum() or len(pw) > 8:
             await ctx.respond(f"Invalid room password `{pw}`. Please assure the password is alphanumeric, is 8 or less characters, and has no spaces (so that it works in GBVSR).")
             return
-        self.database_cur.execute("UPDATE users SET keyword = ? WHERE discord_id=?", (pw, ctx.author.id))
+        self.database_cur.execute("UPDATE users SET keyword = ? WHERE guild_id=? AND discord_id=?", (pw, ctx.guild_id, ctx.author.id))
         self.database_con.commit()
+        self.profiles.invalidate(ctx.guild_id, ctx.author.id)
         await ctx.respond(f"Default room password updated.")
 
     @discord.commands.slash_command(name="removeroompassword", description="Remove the room password from your profile, if one is assigned")
     async def remove_room_password(self, ctx: discord.ApplicationContext):
-        self.database_cur.execute("UPDATE users SET keyword = NULL WHERE discord_id=?", (ctx.author.id,))
+        self.database_cur.execute("UPDATE users SET keyword = NULL WHERE guild_id=? AND discord_id=?", (ctx.guild_id, ctx.author.id))
         self.database_con.commit()
+        self.profiles.invalidate(ctx.guild_id, ctx.author.id)
         await ctx.respond(f"Default room password removed.")
 
-    async def check_rankup_potential(self, player1, player2):
+    async def check_rankup_potential(self, player1, player2, config):
         # Determine rankup points based on rank type
         rankup_points_p1 = RANKUP_POINTS_SPECIAL if player1['dan'] >= SPECIAL_RANK_THRESHOLD else RANKUP_POINTS_NORMAL
         rankup_points_p2 = RANKUP_POINTS_SPECIAL if player2['dan'] >= SPECIAL_RANK_THRESHOLD else RANKUP_POINTS_NORMAL
@@ -1429,85 +1440,40 @@ class Danisen(commands.Cog):
         p1_current_points = player1['points']
         p2_current_points = player2['points']
 
-        p1_point_potential = [1.0 * self.point_multiplier, -1.0] #default
-        p2_point_potential = [1.0 * self.point_multiplier, -1.0]
-
-        if player1['dan'] >= player2['dan'] + self.rank_gap_for_more_points_2: # player1 four or more above player2
-            p1_point_potential = [0.3 * self.point_multiplier, -1]
-            p2_point_potential = [3 * self.point_multiplier, -0.3]
-        elif player1['dan'] >= player2['dan'] + self.rank_gap_for_more_points_1: # player1 two or three above player2
-            p1_point_potential = [0.5 * self.point_multiplier, -1]
-            p2_point_potential = [2 * self.point_multiplier, -0.5]
-        elif player2['dan'] >= player1['dan']  + self.rank_gap_for_more_points_2: # player2 four or more above player1
-            p1_point_potential = [3 * self.point_multiplier, -0.3]
-            p2_point_potential = [0.3 * self.point_multiplier, -1]
-        elif player2['dan'] >= player1['dan'] + self.rank_gap_for_more_points_1: # player2 two or three above player1
-            p1_point_potential = [2 * self.point_multiplier, -0.5]
-            p2_point_potential = [0.5 * self.point_multiplier, -1]
+        p1_point_potential = [1.0 * config.point_multiplier, -1.0] #default
+        p2_point_potential = [1.0 * config.point_multiplier, -1.0]
+
+        if player1['dan'] >= player2['dan'] + config.rank_gap_for_more_points_2: # player1 four or more above player2
+            p1_point_potential = [0.3 * config.point_multiplier, -1]
+            p2_point_potential = [3 * config.point_multiplier, -0.3]
+        elif player1['dan'] >= player2['dan'] + config.rank_gap_for_more_points_1: # player1 two or three above player2
+            p1_point_potential = [0.5 * config.point_multiplier, -1]
+            p2_point_potential = [2 * config.point_multiplier, -0.5]
+        elif player2['dan'] >= player1['dan']  + config.rank_gap_for_more_points_2: # player2 four or more above player1
+            p1_point_potential = [3 * config.point_multiplier, -0.3]
+            p2_point_potential = [0.3 * config.point_multiplier, -1]
+        elif player2['dan'] >= player1['dan'] + config.rank_gap_for_more_points_1: # player2 two or three above player1
+            p1_point_potential = [2 * config.point_multiplier, -0.5]
+            p2_point_potential = [0.5 * config.point_multiplier, -1]
         
         self.logger.debug(f"current match point potential is {p1_point_potential}, {p2_point_potential}")
         self.logger.debug(f"rankup vals: {p1_current_points}, {p1_point_potential}, {rankup_points_p1}, sum of first two is {p1_current_points + p1_point_potential[0]}")
 
         # Rankup logic with special rules and Rankdown logic
-        if p1_current_points + p1_point_potential[0] >= rankup_points_p1 and (not self.special_rank_up_rules or (self.special_rank_up_rules and ((player1['dan'] >= SPECIAL_RANK_THRESHOLD and player2['dan'] >= SPECIAL_RANK_THRESHOLD) or player1['dan'] < SPECIAL_RANK_THRESHOLD))):
+        if p1_current_points + p1_point_potential[0] >= rankup_points_p1 and (not config.special_rank_up_rules or (config.special_rank_up_rules and ((player1['dan'] >= SPECIAL_RANK_THRESHOLD and player2['dan'] >= SPECIAL_RANK_THRESHOLD) or player1['dan'] < SPECIAL_RANK_THRESHOLD))):
             ret[0] = 1
         elif p1_current_points + p1_point_potential[1] <= RANKDOWN_POINTS: # adds negative value
             ret[0] = -1
-        if p2_current_points + p2_point_potential[0] >= rankup_points_p2 and (not self.special_rank_up_rules or (self.special_rank_up_rules and ((player1['dan'] >= SPECIAL_RANK_THRESHOLD and player2['dan'] >= SPECIAL_RANK_THRESHOLD) or player2['dan'] < SPECIAL_RANK_THRESHOLD))):
+        if p2_current_points + p2_point_potential[0] >= rankup_points_p2 and (not config.special_rank_up_rules or (config.special_rank_up_rules and ((player1['dan'] >= SPECIAL_RANK_THRESHOLD and player2['dan'] >= SPECIAL_RANK_THRESHOLD) or player2['dan'] < SPECIAL_RANK_THRESHOLD))):
             ret[1] = 1
         elif p2_current_points + p2_point_potential[1] <= RANKDOWN_POINTS: # adds negative value
             ret[1] = -1
 
         return ret 
 
-    # Returns in format (percentage, wins, losses)
-    def get_winrate_by_id(self, discord_id: int):
-        winning_sets = 0
-        losing_sets = 0
-
-        res = self.database_cur.execute("SELECT COUNT(*) AS wins FROM matches WHERE winner_discord_id=?", (discord_id,)).fetchone()
-        if res:
-            winning_sets = res['wins']
-
-        res = self.database_cur.execute("SELECT COUNT(*) AS losses FROM matches WHERE loser_discord_id=?", (discord_id,)).fetchone()
-        if res:
-            losing_sets = res['losses']
-
-        if winning_sets == 0 and losing_sets == 0:
-            return (0,0,0)
-        else:
-            return (100 * (winning_sets / (winning_sets + losing_sets)), winning_sets, losing_sets)
-
-    def get_all_char_winrate_by_id(self, discord_id: int):
-        ret = {} # in the form {character: [wins, losses, winrate]}
-        res = self.database_cur.execute("SELECT winner_character AS character, COUNT(*) AS wins FROM matches WHERE winner_discord_id=? GROUP BY winner_character", (discord_id,)).fetchall()
-        for char_res in res:
-            if char_res['character'] not in ret:
-                ret[char_res['character']] = [char_res['wins'], 0, 100.0]
-            else:
-                ret[char_res['character']][0] = char_res['wins']
-
-        res = self.database_cur.execute("SELECT loser_character AS character, COUNT(*) AS losses FROM matches WHERE loser_discord_id=? GROUP BY loser_character", (discord_id,)).fetchall()
-        for char_res in res:
-            if char_res['character'] not in ret:
-                ret[char_res['character']] = [0, char_res['losses'], 0.0]
-            else:
-                ret[char_res['character']][1] = char_res['losses']
-
-        self.logger.debug(f"all_char_winrate is {ret}")
-        for char in ret:
-            if ret[char][0] > 0 or ret[char][1] > 0:
-                ret[char][2] = 100 * ret[char][0] / (ret[char][0] + ret[char][1])
-            else:
-                ret[char][2] = 0.0
-
-        self.logger.debug(f"all_char_winrate after winrate calc is {ret}")
-        return ret
-
-
-    def get_total_matches_by_id(self, discord_id: int):
+    def get_total_matches_by_id(self, discord_id: int, guild_id: int):
         total_sets = 0
-        res = self.database_cur.execute("SELECT COUNT(*) AS sets FROM matches WHERE winner_discord_id=? OR loser_discord_id=?", (discord_id, discord_id)).fetchone()
+        res = self.database_cur.execute("SELECT COUNT(*) AS sets FROM matches WHERE guild_id=? AND (winner_discord_id=? OR loser_discord_id=?)", (guild_id, discord_id, discord_id)).fetchone()
         if res:
             total_sets = res['sets']
         
@@ -1523,25 +1489,26 @@ class Danisen(commands.Cog):
         p2_id = 0
 
         self.logger.debug(f"Attempting to find match to remove between {player1}" and {player2})
-        res = self.database_cur.execute("SELECT discord_id FROM users WHERE player_name=?", (player1,)).fetchone()
+        res = self.database_cur.execute("SELECT discord_id FROM users WHERE guild_id=? AND player_name=?", (ctx.guild_id, player1)).fetchone()
         if res:
             p1_id = res['discord_id']
         else:
             await ctx.respond(f"Player 1 ({player1}) is not registered to the Danisen database.")
             return
 
-        res = self.database_cur.execute("SELECT discord_id FROM users WHERE player_name=?", (player2,)).fetchone()
+        res = self.database_cur.execute("SELECT discord_id FROM users WHERE guild_id=? AND player_name=?", (ctx.guild_id, player2)).fetchone()
         if res:
             p2_id = res['discord_id']
         else:
             await ctx.respond(f"Player 2 ({player2}) is not registered to the Danisen database.")
             return
 
-        res = self.database_cur.execute("SELECT MAX(id) AS id FROM matches WHERE (winner_discord_id=? AND loser_discord_id=?) OR (winner_discord_id=? AND loser_discord_id=?)", (p1_id, p2_id, p2_id, p1_id)).fetchone()
+        res = self.database_cur.execute("SELECT MAX(id) AS id FROM matches WHERE guild_id=? AND ((winner_discord_id=? AND loser_discord_id=?) OR (winner_discord_id=? AND loser_discord_id=?))", (ctx.guild_id, p1_id, p2_id, p2_id, p1_id)).fetchone()
         if res and res['id']:
             self.logger.debug(f"Match between players found, removing from db")
             self.database_cur.execute("DELETE FROM matches WHERE id=?", (res['id'],))
             self.database_con.commit()
+            self.data_changed(ctx.guild_id, p1_id, p2_id)
             await ctx.respond(f"Latest match successfully removed (id = {res['id']})")
             return
         else:
@@ -1553,25 +1520,26 @@ class Danisen(commands.Cog):
     async def get_invite_link(self, ctx: discord.ApplicationContext):
         bot_member = ctx.guild.get_member(self.bot.user.id)
         if not bot_member.guild_permissions.create_instant_invite:
-            await ctx.respond("The bot does not have the permissions to create invites")
+            await ctx.respond("The bot does not have the permissions to create invites", ephemeral=True)
             return
 
-        max_dan = self.get_players_highest_dan(ctx.author.name)
-        res = self.database_cur.execute("SELECT (UNIXEPOCH('now') - timestamp) AS timediff, UNIXEPOCH('now') AS timenow, invite_link FROM invites WHERE discord_id=?", (ctx.author.id,)).fetchone()
-        if max_dan and max_dan >= self.minimum_invite_dan:
+        config = self.get_config(ctx.guild_id)
+        max_dan = self.get_players_highest_dan(ctx.author.name, ctx.guild_id)
+        res = self.database_cur.execute("SELECT (UNIXEPOCH('now') - timestamp) AS timediff, UNIXEPOCH('now') AS timenow, invite_link FROM invites WHERE guild_id=? AND discord_id=?", (ctx.guild_id, ctx.author.id)).fetchone()
+        if max_dan and max_dan >= config.minimum_invite_dan:
             if not res:
                 self.logger.debug(f"User {ctx.author.name} not in invites table, generating link and adding")
-                welcome_channel = self.bot.get_channel(self.WELCOME_CHANNEL_ID)
+                welcome_channel = self.bot.get_channel(config.WELCOME_CHANNEL_ID)
                 created_invite = await welcome_channel.create_invite(max_age=604800, max_uses=1, unique=True, reason=f"Created by user {ctx.author.name} with /getinvite")
-                self.database_cur.execute("INSERT INTO invites (discord_id, invite_link, timestamp) VALUES (?, ?, UNIXEPOCH('now'))", (ctx.author.id, created_invite.url))
+                self.database_cur.execute("INSERT INTO invites (guild_id, discord_id, invite_link, timestamp) VALUES (?, ?, ?, UNIXEPOCH('now'))", (ctx.guild_id, ctx.author.id, created_invite.url))
                 self.database_con.commit()
                 await ctx.respond(f"New invite link generated: {created_invite.url}. You will be able to recieve another link <t:{int(time()) + 604800}:R>, the original link will also expire at that time. You can use this command at any time to check the generated link.", ephemeral=True)
                 return
             elif (res and res['timediff'] >= 604800): 
                 self.logger.debug(f"User {ctx.author.name} found in invites table, generating link and updating.")
-                welcome_channel = self.bot.get_channel(self.WELCOME_CHANNEL_ID)
+                welcome_channel = self.bot.get_channel(config.WELCOME_CHANNEL_ID)
                 created_invite = await welcome_channel.create_invite(max_age=604800, max_uses=1, unique=True, reason=f"Created by user {ctx.author.name} with /getinvite")
-                self.database_cur.execute("UPDATE invites SET invite_link=?, timestamp=UNIXEPOCH('now') WHERE discord_id=?", (created_invite.url, ctx.author.name))
+                self.database_cur.execute("UPDATE invites SET invite_link=?, timestamp=UNIXEPOCH('now') WHERE guild_id=? AND discord_id=?", (created_invite.url, ctx.guild_id, ctx.author.name))
                 self.database_con.commit()
                 await ctx.respond(f"New invite link generated: {created_invite.url}. You will be able to recieve another link <t:{(604800 - res['timediff']) + res['timenow']}:R>, the original link will also expire at that time. You can use this command at any time to check the generated link.", ephemeral=True)
                 return
@@ -1582,33 +1550,31 @@ class Danisen(commands.Cog):
             await ctx.respond(f"You will be able to recieve another link <t:{(604800 - res['timediff']) + res['timenow']}:R>. Your last invite link was: {res['invite_link']}.", ephemeral=True)
             return
         elif res:
-            await ctx.respond(f"Your last invite link has expired, and you are no longer a high enough Dan (Dan {self.minimum_invite_dan}+) to generate a new invite link.", ephemeral=True)
+            await ctx.respond(f"Your last invite link has expired, and you are no longer a high enough Dan (Dan {config.minimum_invite_dan}+) to generate a new invite link.", ephemeral=True)
             return
         else:
-            await ctx.respond(f"This command is only available for players Dan {self.minimum_invite_dan} and above.", ephemeral=True)
+            await ctx.respond(f"This command is only available for players Dan {config.minimum_invite_dan} and above.", ephemeral=True)
             return
 
     # Returns the character if an alias is found, otherwise returns the input
-    def convert_character_alias(self, character: str):
-        lower_char = character.lower()
-        ret = character
-        if lower_char in self.character_aliases:
-            ret = self.character_aliases[lower_char]
-        return ret
+    def convert_character_alias(self, character: str, guild_id: int):
+        return self.get_config(guild_id).alias_lookup.get(character.lower(), character)
 
     @discord.commands.slash_command(name="updaterecentmatchlimit", description=f"[Admin Command]")
     @discord.commands.default_permissions(manage_guild=True)
     async def update_recent_opponents_limit(self, ctx: discord.ApplicationContext,
-                                                  limit: discord.Option(int)):
-        self.recent_opponents_limit = limit
-        for player in self.in_queue.keys():
-            self.in_queue[player][1].maxlen = limit
+                                                  limit: discord.Option(int, min_value=0)):
+        try:
+            self.set_runtime_config(ctx.guild_id, recent_opponents_limit=limit)  # Resizes the engine's recent opponents too
+        except ValueError as e:
+            await ctx.respond(f"Invalid value: {e}")
+            return
 
         await ctx.respond(f"recent_opponents_limit updated to {limit}!")
         return
 
-    async def rename_danisen_status_channel(self, danisen_status: bool):
-        channel = self.bot.get_channel(self.DANISEN_STATUS_CHANNEL_ID)
+    async def rename_danisen_status_channel(self, danisen_status: bool, guild_id: int):
+        channel = self.bot.get_channel(self.get_config(guild_id).DANISEN_STATUS_CHANNEL_ID)
         status_message = "✅OPEN✅" if danisen_status else "❌CLOSED❌"
         if channel:
             try:
@@ -1620,8 +1586,12 @@ class Danisen(commands.Cog):
 
     @discord.commands.slash_command(name="setpointmultiplier", description="[Admin Command] Sets the point multiplier for the winning player")
     @discord.commands.default_permissions(manage_guild=True)
-    async def set_point_multiplier(self, ctx: discord.ApplicationContext, multiplier: discord.Option(float, name="multiplier", required=True)):
-        self.point_multiplier = multiplier
+    async def set_point_multiplier(self, ctx: discord.ApplicationContext, multiplier: discord.Option(float, name="multiplier", required=True, min_value=0)):
+        try:
+            self.set_runtime_config(ctx.guild_id, point_multiplier=multiplier)
+        except ValueError as e:
+            await ctx.respond(f"Invalid value: {e}")
+            return
         await ctx.respond(f"Point multiplier updated to be {multiplier}x")
 
     
@@ -1,4 +1,5 @@
 import sqlite3
+import logging
 
 class DanisenRow(dict):
     def __repr__(self):
@@ -13,4 +14,134 @@ def insert_new_player(player_tuple, db):
     except sqlite3.IntegrityError:
         res = sqlite3.IntegrityError
         print("Attempted inserting duplicate data (discord_id, character) pair already exists")
-    return res
\ No newline at end of file
+    return res
+
+def database_path(con):
+    """Returns the file path backing the main database of con, or None if it is an in-memory database"""
+    for row in con.execute("PRAGMA database_list").fetchall():
+        if row[1] == "main":
+            return row[2] or None
+    return None
+
+def enable_wal(con):
+    """Switches the database to write-ahead logging, so readers on other connections don't block commits. Returns the journal mode"""
+    return con.execute("PRAGMA journal_mode=WAL").fetchone()[0]  # In-memory databases stay "memory"
+
+LEGACY_GUILD_ID = 0 # guild_id given to rows created before the bot supported multiple guilds
+
+# Column definitions for every guild scoped table, keyed by table name
+TABLE_SCHEMAS = {
+    # Table for a discord user and profile config
+    "users": (f"guild_id INT NOT NULL DEFAULT {LEGACY_GUILD_ID},"
+              f"discord_id INT NOT NULL,"
+              f"player_name TEXT NOT NULL,"
+              f"nickname TEXT,"
+              f"keyword TEXT,"
+              f"PRIMARY KEY (guild_id, discord_id)"),
+
+    # Table for characters registered by a discord user
+    "players": (f"guild_id INT NOT NULL DEFAULT {LEGACY_GUILD_ID},"
+                f"discord_id INT NOT NULL,"
+                f"character TEXT NOT NULL,"
+                f"dan INT NOT NULL,"
+                f"points FLOAT NOT NULL,"
+                f"FOREIGN KEY (guild_id, discord_id) REFERENCES users (guild_id, discord_id) ON UPDATE CASCADE ON DELETE CASCADE,"
+                f"PRIMARY KEY (guild_id, discord_id, character)"),
+
+    # Table for match history
+    "matches": (f"id INTEGER PRIMARY KEY,"
+                f"guild_id INT NOT NULL DEFAULT {LEGACY_GUILD_ID},"
+                f"winner_discord_id INT,"
+                f"winner_character TEXT,"
+                f"loser_discord_id INT,"
+                f"loser_character TEXT,"
+                f"played_at INTEGER," # uses unix time
+                f"FOREIGN KEY (guild_id, winner_discord_id, winner_character) REFERENCES players(guild_id, discord_id, character) ON UPDATE CASCADE ON DELETE SET NULL,"
+                f"FOREIGN KEY (guild_id, loser_discord_id, loser_character) REFERENCES players(guild_id, discord_id, character) ON UPDATE CASCADE ON DELETE SET NULL"),
+
+    # Table for queue matches that haven't been reported yet, so they survive restarts
+    "active_matches": (f"id INTEGER PRIMARY KEY AUTOINCREMENT," # never reused, old messages can't reach a newer match
+                       f"guild_id INT NOT NULL DEFAULT {LEGACY_GUILD_ID},"
+                       f"p1_discord_id INT NOT NULL,"
+                       f"p1_character TEXT NOT NULL,"
+                       f"p2_discord_id INT NOT NULL,"
+                       f"p2_character TEXT NOT NULL,"
+                       f"started_at REAL NOT NULL," # uses unix time
+                       f"report_channel_id INT,"
+                       f"report_message_id INT,"
+                       f"ongoing_channel_id INT,"
+                       f"ongoing_message_id INT"),
+
+    "invites": (f"guild_id INT NOT NULL DEFAULT {LEGACY_GUILD_ID},"
+                f"discord_id INT NOT NULL,"
+                f"invite_link TEXT,"
+                f"timestamp INTEGER," # uses unix time
+                f"FOREIGN KEY (guild_id, discord_id) REFERENCES users (guild_id, discord_id) ON UPDATE CASCADE ON DELETE CASCADE,"
+                f"PRIMARY KEY (guild_id, discord_id)"),
+}
+
+# Indexes on the tables above, keyed by index name
+INDEXES = {
+    # Latest matches of a guild, in the order they were reported
+    "matches_guild_recent": "matches (guild_id, id)",
+    # A player's wins and losses, for /profile
+    "matches_guild_winner": "matches (guild_id, winner_discord_id)",
+    "matches_guild_loser": "matches (guild_id, loser_discord_id)",
+    # Leaderboard order, so a page is read straight off the index instead of sorting the whole guild
+    "players_guild_rank": "players (guild_id, dan DESC, points DESC, discord_id, character)",
+}
+
+def create_tables(cur):
+    for table, columns in TABLE_SCHEMAS.items():
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {table}({columns})")
+
+def create_indexes(cur):
+    for index, columns in INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {columns}")
+
+def add_match_timestamps(cur):
+    # Matches reported before timestamps were stored keep played_at NULL
+    if "played_at" not in table_columns(cur, "matches"):
+        cur.execute("ALTER TABLE matches ADD COLUMN played_at INTEGER")
+
+def table_columns(cur, table):
+    return [row[1] for row in cur.execute(f"PRAGMA table_info({table})").fetchall()]
+
+def migrate_guild_columns(con):
+    """Rebuilds tables created before multi guild support so guild_id is part of their keys.
+
+    Existing rows are given LEGACY_GUILD_ID until a guild adopts them with adopt_legacy_rows.
+    """
+    legacy_tables = [table for table in TABLE_SCHEMAS if "guild_id" not in table_columns(con, table)]
+    if not legacy_tables:
+        return []
+
+    logging.getLogger(__name__).info(f"Migrating tables {legacy_tables} to guild scoped keys")
+    con.execute("BEGIN")
+    try:
+        for table in legacy_tables:
+            columns = ", ".join(table_columns(con, table))
+            con.execute(f"CREATE TABLE {table}_new({TABLE_SCHEMAS[table]})")
+            con.execute(f"INSERT INTO {table}_new (guild_id, {columns}) SELECT ?, {columns} FROM {table}", (LEGACY_GUILD_ID,))
+            con.execute(f"DROP TABLE {table}")
+            con.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    return legacy_tables
+
+def setup_database(con):
+    """Creates and migrates every guild scoped table and its indexes. Safe to run on an up to date database"""
+    create_tables(con)
+    migrate_guild_columns(con)
+    add_match_timestamps(con)
+    create_indexes(con)
+
+def adopt_legacy_rows(con, guild_id):
+    """Moves rows created before multi guild support into guild_id. Returns the number of rows moved"""
+    moved = 0
+    with con:
+        for table in list(TABLE_SCHEMAS) + ["seasons"]:
+            moved += con.execute(f"UPDATE {table} SET guild_id = ? WHERE guild_id = ?", (guild_id, LEGACY_GUILD_ID)).rowcount
+    return moved
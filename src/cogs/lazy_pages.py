@@ -0,0 +1,56 @@
+import math
+from collections import OrderedDict
+from collections.abc import Sequence
+import discord
+from constants import MAX_FIELDS_PER_EMBED, PAGE_CACHE_SIZE
+
+def list_source(rows):
+    """Row source over an in-memory list"""
+    return lambda offset, limit: rows[offset:offset + limit]
+
+def query_source(cur, query, params=()):
+    """Row source running query with LIMIT/OFFSET appended, so only the rows of the page being shown are read"""
+    return lambda offset, limit: cur.execute(f"{query} LIMIT ? OFFSET ?", (*params, limit, offset)).fetchall()
+
+class LazyPages(Sequence):
+    """Embed pages for a paginator, built only when a page is shown.
+
+    fetch(offset, limit) returns the rows of a page and format_field(idx, row) turns one row into an
+    embed field's (name, value). The last `cache_size` built pages are kept, so flipping back and forth
+    doesn't fetch again. Pass it to pages.Paginator in place of a list of embeds.
+    """
+    def __init__(self, title, count, fetch, format_field, fields_per_page=MAX_FIELDS_PER_EMBED, colour=None, cache_size=PAGE_CACHE_SIZE):
+        self.title = title
+        self.count = count
+        self.fetch = fetch
+        self.format_field = format_field
+        self.fields_per_page = fields_per_page
+        self.colour = colour
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # Format: page number: discord.Embed, least recently shown first
+
+    def __len__(self):
+        return max(1, math.ceil(self.count / self.fields_per_page))  # An empty source still gets a page with its title
+
+    def __getitem__(self, page):
+        if isinstance(page, slice):
+            return [self[idx] for idx in range(*page.indices(len(self)))]
+        if page < 0:
+            page += len(self)
+        if not 0 <= page < len(self):
+            raise IndexError(page)
+
+        if page in self.cache:
+            self.cache.move_to_end(page)
+            return self.cache[page]
+
+        offset = page * self.fields_per_page
+        em = discord.Embed(title=f"{self.title} ({page + 1}/{len(self)})", colour=self.colour)
+        for idx, row in enumerate(self.fetch(offset, self.fields_per_page), start=offset):
+            name, value = self.format_field(idx, row)
+            em.add_field(name=name, value=value, inline=False)
+
+        self.cache[page] = em
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return em
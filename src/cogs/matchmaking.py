@@ -0,0 +1,339 @@
+import asyncio
+import itertools
+import logging
+import math
+import time
+from collections import deque
+from constants import DEFAULT_DAN, WAIT_SAMPLES_PER_DAN, MATRIX_QUEUE_THRESHOLD
+from cogs.pair_matrix import np, eligibility_mask, pick_pairs
+from cogs.recent_opponents import RecentOpponents
+from cogs.sessions import SessionTable
+from cogs.active_matches import ActiveMatches
+
+_enqueue_seq = itertools.count()  # Breaks ties between entries stamped at the same instant
+
+def wait_priority(daniel):
+    # Sort key putting the longest waiting queue entry first
+    return (daniel['enqueued_at'], daniel['enqueue_seq'])
+
+def percentile(ordered, pct):
+    # Nearest rank percentile of an already sorted, non-empty list
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+class MatchmakingEngine:
+    """Queue state and matchmaking for a single guild's ladder.
+
+    Every method is synchronous, so each call is a critical section on its own: nothing else can
+    run on the event loop until it returns, and no lock is needed. Callers make their state change
+    first and only then await Discord, so queue commands never wait behind network I/O.
+
+    Changes that could make a new pair possible set `wakeup`, which the cog's matchmaking scheduler waits on.
+    Who is queued or in a match lives in `sessions`, see SessionTable for `history`, and open matches in `active`,
+    which are read back from `store` (a MatchStore) if one is given.
+    """
+    def __init__(self, guild_id, config, clock=None, history=None, store=None):
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+
+        self.guild_id = guild_id
+        self.config = config
+        self.clock = clock or time.monotonic  # Queue waits are timed with this, the simulator passes a virtual clock
+
+        self.dans_in_queue = {dan: deque() for dan in range(1, self.config.total_dans + 1)}
+        self.occupied_dans = 0  # Bit n is set while dans_in_queue[n] is non-empty
+        self.matchmaking_queue = deque()
+        wall_clock = clock or time.time  # Match start times and recent opponents are unix times
+        self.active = ActiveMatches(wall_clock, store)
+        self.recent = RecentOpponents(self.config.recent_opponents_limit, self.config.recent_opponents_expiry_seconds, wall_clock)
+        self.sessions = SessionTable(self.recent, self.clock, history=history)
+        self.matchmaking_coro = None  # Scheduler task that runs matchmaking passes for this guild
+        self.wakeup = asyncio.Event()  # Set when the queue changed in a way that could create a pair
+        self.wait_samples = {dan: deque(maxlen=WAIT_SAMPLES_PER_DAN) for dan in range(1, self.config.total_dans + 1)}  # Recent matched waits in seconds
+
+        # Players in a match left open by the last run stay out of the queue until it's reported or expires
+        for match in self.active.restore():
+            for discord_id in match.players():
+                self.sessions.set_in_match(discord_id, True)
+
+    def sizes(self):
+        # Entry counts of the engine's structures, for memory reports
+        return {
+            "sessions": len(self.sessions),
+            "active_matches": len(self.active),
+            "matchmaking_queue": len(self.matchmaking_queue),
+            "dans_in_queue": sum(len(bucket) for bucket in self.dans_in_queue.values()),
+            "recent_opponents": len(self.recent.rings),
+        }
+
+    def apply_config(self, config):
+        # Swaps in a new config. Passes are synchronous, so a pass only ever sees one config
+        old_total_dans = self.config.total_dans
+        self.config = config
+        if config.total_dans != old_total_dans:
+            self.resize_dans(old_total_dans, config.total_dans)
+        self.recent.configure(config.recent_opponents_limit, config.recent_opponents_expiry_seconds)
+        self.notify()  # Any setting could make a new pair legal
+
+    def resize_dans(self, old_total_dans, total_dans):
+        # Adds or drops dan buckets. Players queued in a dan that no longer exists are taken out of the queue
+        for dan in range(total_dans + 1, old_total_dans + 1):
+            for daniel in self.dans_in_queue.pop(dan):
+                self.logger.warning(f"Removing {daniel} from the queue, dan {dan} no longer exists")
+                self.matchmaking_queue.remove(daniel)
+                self.sessions.set_queued(daniel['discord_id'], daniel['character'], False)
+            self.occupied_dans &= ~(1 << dan)
+            self.wait_samples.pop(dan, None)
+        for dan in range(old_total_dans + 1, total_dans + 1):
+            self.dans_in_queue[dan] = deque()
+            self.wait_samples[dan] = deque(maxlen=WAIT_SAMPLES_PER_DAN)
+
+    def clear_queue(self):
+        # Empties every queue structure, used when the queue is closed or ranks change underneath it
+        self.matchmaking_queue.clear()  # Clear the deque
+        self.dans_in_queue = {dan: deque() for dan in range(1, self.config.total_dans + 1)}  # Reset to empty deques
+        self.occupied_dans = 0
+        self.sessions.clear_queued()
+
+    def is_queued(self, discord_id, character):
+        return self.sessions.is_queued(discord_id, character)
+
+    def is_in_match(self, discord_id):
+        return self.sessions.is_in_match(discord_id)
+
+    @property
+    def cur_active_matches(self):
+        return len(self.active)
+
+    def clear_matches(self):
+        # Frees every player in a match and every match slot, used when the queue is closed
+        self.sessions.clear_matches()
+        self.active.clear()
+
+    def notify(self):
+        # Asks the scheduler for a matchmaking pass
+        self.wakeup.set()
+
+    def waiting(self):
+        return [daniel for daniel in self.matchmaking_queue if daniel]
+
+    def recent_opponents(self, daniel):
+        # discord_ids daniel's character has played recently
+        return self.recent.opponents(daniel['discord_id'], daniel['character'])
+
+    def use_matrix(self, waiting):
+        # Large queues check every pair at once with numpy instead of one pair at a time
+        return np is not None and len(waiting) >= MATRIX_QUEUE_THRESHOLD
+
+    def dan_window(self, wait):
+        # Largest dan gap allowed for a player who has waited `wait` seconds
+        relax = self.config.rank_window_relax_seconds
+        if not relax:
+            return self.config.maximum_rank_difference
+        return self.config.maximum_rank_difference + int(wait // relax)
+
+    def bucket_append(self, daniel):
+        self.dans_in_queue[daniel['dan']].append(daniel)
+        self.occupied_dans |= 1 << daniel['dan']
+
+    def bucket_remove(self, daniel):
+        bucket = self.dans_in_queue[daniel['dan']]
+        bucket.remove(daniel)
+        if not bucket:
+            self.occupied_dans &= ~(1 << daniel['dan'])
+
+    def occupied_dans_near(self, dan, window):
+        # Yields the non-empty dan buckets within window of dan, nearest first and the higher dan first on ties
+        # Empty buckets are skipped with bit tricks rather than walked
+        low = max(DEFAULT_DAN, dan - window)
+        high = min(self.config.total_dans, dan + window)
+        if low > high:
+            return
+        in_window = self.occupied_dans & ((1 << (high + 1)) - (1 << low))
+        above = in_window >> dan << dan  # dan and up
+        below = in_window & ((1 << dan) - 1)
+        while above or below:
+            next_above = (above & -above).bit_length() - 1 if above else None
+            next_below = below.bit_length() - 1 if below else None
+            if next_below is None or (next_above is not None and next_above - dan <= dan - next_below):
+                above &= above - 1
+                yield next_above
+            else:
+                below &= ~(1 << next_below)
+                yield next_below
+
+    def nearest_dan_outside(self, dan, window):
+        # Dan gap from dan to the nearest non-empty bucket outside window, or None if every non-empty bucket is inside it
+        gaps = []
+        below = self.occupied_dans & ((1 << max(dan - window, 0)) - 1)
+        if below:
+            gaps.append(dan - (below.bit_length() - 1))
+        above = self.occupied_dans >> (dan + window + 1)
+        if above:
+            gaps.append(window + (above & -above).bit_length())
+        return min(gaps) if gaps else None
+
+    def seconds_until_pair_change(self):
+        # Time until waiting alone could make a new pair legal, through a dan window widening or a recent opponent
+        # expiring. None if only a queue change can
+        waiting = self.waiting()
+        if len(waiting) < 2:
+            return None
+        delays = []
+        relax = self.config.rank_window_relax_seconds
+        if relax:
+            # Only widening far enough to reach another occupied dan can make a new pair, and once a player's window
+            # covers every occupied dan it can't help any more
+            now = self.clock()
+            for daniel in waiting:
+                gap = self.nearest_dan_outside(daniel['dan'], self.dan_window(now - daniel['enqueued_at']))
+                if gap is not None:
+                    delays.append(max(0, daniel['enqueued_at'] + (gap - self.config.maximum_rank_difference) * relax - now))
+        now = self.recent.clock()
+        for daniel in waiting:
+            expires_at = self.recent.expires_at(daniel['discord_id'], daniel['character'])
+            if expires_at is not None:
+                delays.append(max(0, expires_at - now))
+        return min(delays) if delays else None
+
+    def seconds_until_match_expires(self):
+        # Time until the oldest open match expires, or None if none will
+        expires_at = self.active.expires_at(self.config.match_expiry_seconds)
+        return None if expires_at is None else max(0, expires_at - self.active.clock())
+
+    def can_pair(self, daniel1, daniel2, now=None):
+        # True if the two queue entries are allowed to play each other right now
+        if daniel1['discord_id'] == daniel2['discord_id']:
+            return False
+        now = self.clock() if now is None else now
+        if abs(daniel1['dan'] - daniel2['dan']) > self.dan_window(now - min(daniel1['enqueued_at'], daniel2['enqueued_at'])):
+            return False
+        if self.is_in_match(daniel1['discord_id']) or self.is_in_match(daniel2['discord_id']):
+            return False
+        return (not self.recent.has_played(daniel1['discord_id'], daniel1['character'], daniel2['discord_id']) and
+                not self.recent.has_played(daniel2['discord_id'], daniel2['character'], daniel1['discord_id']))
+
+    def has_legal_pair(self):
+        # True if a matchmaking pass could create at least one match
+        if self.cur_active_matches >= self.config.max_active_matches:
+            return False
+        # A pair's window comes from its longer waiting player, so searching from each player's own window finds every pair
+        now = self.clock()
+        waiting = self.waiting()
+        if self.use_matrix(waiting):
+            return bool(eligibility_mask(self, waiting, now).any())
+        return any(self.find_opponent(daniel1, now) is not None for daniel1 in waiting)
+
+    def add_to_queue(self, daniel):
+        self.sessions.evict_idle()
+        self.sessions.set_queued(daniel['discord_id'], daniel['character'], True)
+        daniel['enqueued_at'] = self.clock()
+        daniel['enqueue_seq'] = next(_enqueue_seq)
+
+        self.bucket_append(daniel)
+        self.matchmaking_queue.append(daniel)
+        self.notify()
+
+    def remove_from_queue(self, discord_id, character=None):
+        # Removes discord_id's entries from the queue, either for one character or all of them. Returns the removed entries
+        daniels = []
+        self.logger.debug(f"current mmq is {self.matchmaking_queue}")
+        for member in self.matchmaking_queue:
+            self.logger.debug(f"Checking if player {member} should leave queue.")
+            if member and (member['discord_id'] == discord_id) and (character is None or member['character'] == character):
+                self.logger.debug(f"Player {member['player_name']} on character {member['character']} should leave queue.")
+                daniels.append(member)
+
+        for daniel in daniels:
+            if daniel in self.dans_in_queue[daniel['dan']]:
+                self.bucket_remove(daniel)
+                self.matchmaking_queue.remove(daniel)
+
+            self.sessions.set_queued(daniel['discord_id'], daniel['character'], False)
+        return daniels
+
+    def end_match(self, match_id):
+        # Frees the match slot and lets both players queue again. Returns the match, or None if it had already ended
+        match = self.active.end(match_id)
+        if match is None:
+            return None
+        self.logger.info(f"Match {match_id} ended, {self.cur_active_matches} match slots in use")
+        for discord_id in match.players():
+            self.sessions.set_in_match(discord_id, False)
+        self.notify()
+        return match
+
+    def end_all_matches(self):
+        # Ends every open match, returns them
+        return [self.end_match(match.match_id) for match in list(self.active)]
+
+    def expire_matches(self):
+        # Ends the matches nobody reported within match_expiry_seconds. Returns them
+        expired = [self.end_match(match.match_id) for match in self.active.expired(self.config.match_expiry_seconds)]
+        for match in expired:
+            self.logger.info(f"Match {match.match_id} between {match.p1['discord_id']} and {match.p2['discord_id']} expired")
+        return expired
+
+    def matchmake(self):
+        # Pairs players from the queue and marks them as in a match. Returns the list of (daniel1, daniel2) pairs made
+        # Players are tried longest wait first, and anyone left unmatched keeps their place for the next pass
+        matches = []
+        waiting = self.waiting()
+        if len(waiting) < 2:
+            return matches
+
+        now = self.clock()
+        ordered = sorted(waiting, key=wait_priority)
+        if self.use_matrix(ordered):
+            for i, j in pick_pairs(self, ordered, eligibility_mask(self, ordered, now)):
+                self.start_match(ordered[i], ordered[j], now)
+                matches.append((ordered[i], ordered[j]))
+            return matches
+
+        for daniel1 in ordered:
+            if self.cur_active_matches >= self.config.max_active_matches:
+                self.logger.debug(f"No free match slots, stopping matchmaking pass")
+                break
+            if not self.is_queued(daniel1['discord_id'], daniel1['character']):
+                continue  # Already matched earlier in this pass
+
+            daniel2 = self.find_opponent(daniel1, now)
+            if daniel2 is None:
+                self.logger.debug(f"No match found for daniel1 {daniel1}, keeping their place in the queue.")
+                continue
+
+            self.start_match(daniel1, daniel2, now)
+            matches.append((daniel1, daniel2))
+        return matches
+
+    def find_opponent(self, daniel1, now):
+        # Searches the non-empty dan queues within daniel1's window, closest dan first and oldest entry first within each dan
+        window = self.dan_window(now - daniel1['enqueued_at'])
+        for dan in self.occupied_dans_near(daniel1['dan'], window):
+            self.logger.debug(f"Checking dan queue for dan {dan}: {list(self.dans_in_queue[dan])}")
+            for daniel2 in self.dans_in_queue[dan]:
+                if daniel2 is not daniel1 and self.can_pair(daniel1, daniel2, now):
+                    return daniel2
+        return None
+
+    def start_match(self, daniel1, daniel2, now):
+        # Takes both players out of the queue and records how long they waited
+        for daniel in (daniel1, daniel2):
+            self.bucket_remove(daniel)
+            self.matchmaking_queue.remove(daniel)
+            self.sessions.set_queued(daniel['discord_id'], daniel['character'], False)
+            self.sessions.set_in_match(daniel['discord_id'], True)
+            self.wait_samples[daniel['dan']].append(now - daniel['enqueued_at'])
+
+        self.recent.record(daniel1['discord_id'], daniel1['character'], daniel2['discord_id'])
+        self.recent.record(daniel2['discord_id'], daniel2['character'], daniel1['discord_id'])
+        self.active.start(daniel1, daniel2)
+        self.logger.debug(f"Matched {daniel1} with {daniel2}")
+
+    def wait_percentiles(self):
+        # Returns {dan: (p50, p95, p99, samples)} of recent matched wait times in seconds, for dans with samples
+        stats = {}
+        for dan, samples in self.wait_samples.items():
+            if samples:
+                ordered = sorted(samples)
+                stats[dan] = (percentile(ordered, 50), percentile(ordered, 95), percentile(ordered, 99), len(ordered))
+        return stats
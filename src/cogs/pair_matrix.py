@@ -0,0 +1,64 @@
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the engine falls back to checking pairs one at a time
+    np = None
+
+def eligibility_mask(engine, ordered, now):
+    """Returns an N x N boolean array where [i, j] is True if ordered[i] and ordered[j] may play each other.
+
+    Gives the same answers as MatchmakingEngine.can_pair, computed for every pair at once.
+    """
+    # Encode the entries as integer arrays, with users numbered in order of first appearance
+    user_index = {}
+    users = np.array([user_index.setdefault(daniel['discord_id'], len(user_index)) for daniel in ordered], dtype=np.int64)
+    dans = np.array([daniel['dan'] for daniel in ordered], dtype=np.int64)
+    enqueued_at = np.array([daniel['enqueued_at'] for daniel in ordered], dtype=np.float64)
+    in_match = np.array([engine.is_in_match(daniel['discord_id']) for daniel in ordered], dtype=bool)
+
+    # Recent opponents as one row per entry, with a column per user
+    recent = np.zeros((len(ordered), len(user_index)), dtype=bool)
+    for row, daniel in enumerate(ordered):
+        cols = [user_index[opponent] for opponent in engine.recent_opponents(daniel) if opponent in user_index]
+        recent[row, cols] = True
+    played = recent[:, users]  # played[i, j]: ordered[i] recently played ordered[j]'s user
+
+    longest_wait = now - np.minimum.outer(enqueued_at, enqueued_at)
+    window = engine.config.maximum_rank_difference
+    if engine.config.rank_window_relax_seconds:
+        window = window + np.floor_divide(longest_wait, engine.config.rank_window_relax_seconds).astype(np.int64)
+
+    mask = users[:, None] != users[None, :]
+    mask &= ~(in_match[:, None] | in_match[None, :])
+    mask &= np.abs(dans[:, None] - dans[None, :]) <= window
+    mask &= ~(played | played.T)
+    return mask
+
+def pick_pairs(engine, ordered, mask):
+    """Greedily pairs entries from an eligibility mask the way MatchmakingEngine.matchmake does.
+
+    ordered must be sorted longest wait first. Each entry takes the eligible opponent in the closest
+    dan, the higher dan on ties, then the longest waiting. Returns a list of (i, j) index pairs.
+
+    Each pick depends on who the earlier picks took, so the entries are still walked one at a time
+    in a Python loop, O(N) iterations. Only the search for each entry's opponent is vectorised.
+    """
+    users = np.array([daniel['discord_id'] for daniel in ordered])
+    dans = np.array([daniel['dan'] for daniel in ordered], dtype=np.int64)
+    available = np.ones(len(ordered), dtype=bool)
+    free_slots = engine.config.max_active_matches - engine.cur_active_matches
+
+    pairs = []
+    for i in range(len(ordered)):
+        if len(pairs) >= free_slots:
+            break
+        if not available[i]:
+            continue
+        candidates = np.flatnonzero(mask[i] & available)
+        if len(candidates) == 0:
+            continue
+        offsets = dans[candidates] - dans[i]
+        j = candidates[np.lexsort((candidates, offsets < 0, np.abs(offsets)))[0]]
+        pairs.append((i, int(j)))
+        # Both players are now in a match, which rules out their other characters too
+        available &= (users != users[i]) & (users != users[j])
+    return pairs
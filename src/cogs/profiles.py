@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from constants import PROFILE_CACHE_SIZE
+
+def query_profile(con, guild_id, discord_id):
+    """Reads everything /profile shows for one user in a single query.
+
+    Returns None if they have no registered characters, otherwise a dict with the user's nickname and
+    keyword, their set wins and losses over every match, and `characters`: one dict per registered
+    character with its dan, points, wins and losses.
+    """
+    rows = con.execute(
+        "WITH results AS ("
+        "SELECT winner_character AS character, 1 AS win FROM matches WHERE guild_id=:guild_id AND winner_discord_id=:discord_id "
+        "UNION ALL SELECT loser_character AS character, 0 AS win FROM matches WHERE guild_id=:guild_id AND loser_discord_id=:discord_id), "
+        "char_results AS (SELECT character, SUM(win) AS wins, COUNT(*) - SUM(win) AS losses FROM results GROUP BY character), "
+        "totals AS (SELECT COALESCE(SUM(win), 0) AS total_wins, COUNT(*) - COALESCE(SUM(win), 0) AS total_losses FROM results) "
+        "SELECT nickname, keyword, players.character AS character, dan, points, COALESCE(wins, 0) AS wins, COALESCE(losses, 0) AS losses, total_wins, total_losses "
+        "FROM players JOIN users ON players.guild_id = users.guild_id AND players.discord_id = users.discord_id "
+        "LEFT JOIN char_results ON char_results.character = players.character JOIN totals "
+        "WHERE players.guild_id=:guild_id AND players.discord_id=:discord_id",
+        {"guild_id": guild_id, "discord_id": discord_id}
+    ).fetchall()
+    if not rows:
+        return None
+    return {
+        "nickname": rows[0]['nickname'],
+        "keyword": rows[0]['keyword'],
+        "wins": rows[0]['total_wins'],
+        "losses": rows[0]['total_losses'],
+        "characters": [{key: row[key] for key in ("character", "dan", "points", "wins", "losses")} for row in rows],
+    }
+
+class ProfileCache:
+    """Rendered /profile embeds for the most recently viewed users.
+
+    Anything that changes what a profile shows (reports, rank changes, registrations, room
+    passwords) invalidates that user, and season resets or config reloads clear a guild or everything.
+    """
+    def __init__(self, size=PROFILE_CACHE_SIZE):
+        self.size = size
+        self.embeds = OrderedDict()  # Format: (guild_id, discord_id): discord.Embed, least recently viewed first
+
+    def get(self, guild_id, discord_id):
+        key = (guild_id, discord_id)
+        if key not in self.embeds:
+            return None
+        self.embeds.move_to_end(key)
+        return self.embeds[key]
+
+    def put(self, guild_id, discord_id, embed):
+        self.embeds[(guild_id, discord_id)] = embed
+        self.embeds.move_to_end((guild_id, discord_id))
+        if len(self.embeds) > self.size:
+            self.embeds.popitem(last=False)
+
+    def invalidate(self, guild_id, *discord_ids):
+        for discord_id in discord_ids:
+            self.embeds.pop((guild_id, discord_id), None)
+
+    def clear(self, guild_id=None):
+        # Drops every cached profile, or only those of guild_id
+        if guild_id is None:
+            self.embeds.clear()
+        else:
+            for key in [key for key in self.embeds if key[0] == guild_id]:
+                del self.embeds[key]
@@ -0,0 +1,118 @@
+import time
+from array import array
+from constants import RECENT_MATCHES_PER_PLAYER
+
+class _Ring:
+    """Fixed size ring of one player's last opponents, oldest first from `start`"""
+    __slots__ = ("opponents", "played_at", "start", "size", "counts")
+
+    def __init__(self, limit):
+        self.opponents = array('q', [0]) * limit  # discord_ids
+        self.played_at = array('d', [0.0]) * limit  # unix time of each match
+        self.start = 0
+        self.size = 0
+        self.counts = {}  # Format: opponent discord_id: times in the ring
+
+    def entries(self):
+        limit = len(self.opponents)
+        for offset in range(self.size):
+            idx = (self.start + offset) % limit
+            yield self.opponents[idx], self.played_at[idx]
+
+    def drop_oldest(self):
+        opponent = self.opponents[self.start]
+        self.counts[opponent] -= 1
+        if not self.counts[opponent]:
+            del self.counts[opponent]
+        self.start = (self.start + 1) % len(self.opponents)
+        self.size -= 1
+
+    def append(self, opponent, played_at):
+        limit = len(self.opponents)
+        if not limit:
+            return
+        if self.size == limit:
+            self.drop_oldest()
+        idx = (self.start + self.size) % limit
+        self.opponents[idx] = opponent
+        self.played_at[idx] = played_at
+        self.size += 1
+        self.counts[opponent] = self.counts.get(opponent, 0) + 1
+
+class RecentOpponents:
+    """Who each player (a discord_id on one character) has played recently, for the rule against rematches.
+
+    Opponents drop out once `limit` newer matches have been played or, if expiry_seconds is set, once
+    that long has passed since the match. Lookups are O(1) through each ring's opponent counts.
+    """
+    def __init__(self, limit, expiry_seconds=0, clock=time.time):
+        self.limit = limit
+        self.expiry_seconds = expiry_seconds
+        self.clock = clock  # Returns unix time, swapped for a virtual clock by the simulator
+        self.rings = {}  # Format: discord_id: {character: _Ring}
+
+    def _ring(self, discord_id, character, now=None):
+        # Returns the player's ring with expired matches dropped, or None if they have no recent matches
+        ring = self.rings.get(discord_id, {}).get(character)
+        if ring is not None and self.expiry_seconds:
+            cutoff = (self.clock() if now is None else now) - self.expiry_seconds
+            while ring.size and ring.played_at[ring.start] <= cutoff:
+                ring.drop_oldest()
+        return ring
+
+    def record(self, discord_id, character, opponent, played_at=None):
+        rings = self.rings.setdefault(discord_id, {})
+        if character not in rings:
+            rings[character] = _Ring(self.limit)
+        rings[character].append(opponent, self.clock() if played_at is None else played_at)
+
+    def has_played(self, discord_id, character, opponent, now=None):
+        ring = self._ring(discord_id, character, now)
+        return ring is not None and opponent in ring.counts
+
+    def opponents(self, discord_id, character, now=None):
+        ring = self._ring(discord_id, character, now)
+        return list(ring.counts) if ring is not None else []
+
+    def expires_at(self, discord_id, character, now=None):
+        # Unix time the player's oldest recent opponent expires, or None if nothing expires by time
+        ring = self._ring(discord_id, character, now)
+        if not self.expiry_seconds or ring is None or not ring.size:
+            return None
+        return ring.played_at[ring.start] + self.expiry_seconds
+
+    def configure(self, limit, expiry_seconds):
+        # Applies new settings, keeping each player's newest matches when the limit shrinks
+        self.expiry_seconds = expiry_seconds
+        if limit == self.limit:
+            return
+        self.limit = limit
+        for rings in self.rings.values():
+            for character, ring in rings.items():
+                resized = _Ring(limit)
+                for opponent, played_at in list(ring.entries())[max(0, ring.size - limit):]:
+                    resized.append(opponent, played_at)
+                rings[character] = resized
+
+    def restore(self, discord_id, matches):
+        # Replaces discord_id's rings with matches, an oldest first iterable of (character, opponent, played_at)
+        self.rings.pop(discord_id, None)
+        for character, opponent, played_at in matches:
+            if opponent is None:
+                continue  # The opponent was deleted since
+            self.record(discord_id, character, opponent, played_at or 0)
+
+    def forget(self, discord_id):
+        self.rings.pop(discord_id, None)
+
+def player_history(con, guild_id, discord_id, rows=RECENT_MATCHES_PER_PLAYER):
+    """discord_id's last `rows` reported matches in guild_id as (character, opponent, played_at), oldest first"""
+    res = con.execute(
+        "SELECT id, winner_character AS character, loser_discord_id AS opponent, played_at FROM matches WHERE guild_id=:guild_id AND winner_discord_id=:discord_id "
+        "UNION ALL SELECT id, loser_character, winner_discord_id, played_at FROM matches WHERE guild_id=:guild_id AND loser_discord_id=:discord_id "
+        "ORDER BY id DESC LIMIT :rows",
+        {"guild_id": guild_id, "discord_id": discord_id, "rows": rows}
+    )
+    matches = [(row[1], row[2], row[3]) for row in res.fetchall()]
+    matches.reverse()
+    return matches
@@ -0,0 +1,71 @@
+from constants import RANKUP_POINTS_NORMAL, RANKUP_POINTS_SPECIAL, RANKDOWN_POINTS, SPECIAL_RANK_THRESHOLD, DEFAULT_POINTS
+
+def score_match(winner_dan, winner_points, loser_dan, loser_points, config):
+    """Applies the ladder's point and rank rules to one match result.
+
+    Returns (winner_rank, loser_rank), each in the format [Dan, Points, Rankup?, PointDelta, RankupBlock].
+    Rankup? is set on the winner when they rank up and on the loser when they rank down.
+    """
+    winner_rank = [winner_dan, winner_points, False, 0.0, False]
+    loser_rank = [loser_dan, loser_points, False, 0.0, False]
+
+    # Determine rankup points based on rank type
+    rankup_points =  RANKUP_POINTS_SPECIAL if winner_rank[0] >= SPECIAL_RANK_THRESHOLD else RANKUP_POINTS_NORMAL
+
+    # Winning and Losing logic
+    if loser_rank[0] >= winner_rank[0] + config.rank_gap_for_more_points_2: # lower ranked player wins with 4 rank gap
+        winner_rank[1] += 3.0 * config.point_multiplier
+        winner_rank[3] += 3.0 * config.point_multiplier
+        loser_rank[1] -= 1.0
+        loser_rank[3] -= 1.0
+    elif loser_rank[0] >= winner_rank[0] + config.rank_gap_for_more_points_1: # lower ranked player wins with 2 rank gap
+        winner_rank[1] += 2.0 * config.point_multiplier
+        winner_rank[3] += 2.0 * config.point_multiplier
+        loser_rank[1] -= 1.0
+        loser_rank[3] -= 1.0
+    elif winner_rank[0] >= loser_rank[0] + config.rank_gap_for_more_points_2: # higher ranked player wins with 4 rank gap
+        winner_rank[1] += 0.3 * config.point_multiplier
+        winner_rank[3] += 0.3 * config.point_multiplier
+        loser_rank[1] -= 0.3
+        loser_rank[3] -= 0.3
+    elif winner_rank[0] >= loser_rank[0] + config.rank_gap_for_more_points_1: # higher ranked player wins with 2 rank gap
+        winner_rank[1] += 0.5 * config.point_multiplier
+        winner_rank[3] += 0.5 * config.point_multiplier
+        loser_rank[1] -= 0.5
+        loser_rank[3] -= 0.5
+    else:
+        winner_rank[1] += 1.0 * config.point_multiplier
+        winner_rank[3] += 1.0 * config.point_multiplier
+        loser_rank[1] -= 1.0
+        loser_rank[3] -= 1.0
+
+    if loser_rank[0] == config.minimum_derank and loser_rank[1] < 0: # making sure loser can't go lower than minimum rank
+        loser_rank[3] = round(0.0 - (loser_rank[1] - loser_rank[3]), 1)
+        loser_rank[1] = 0.0
+
+    # Rankup logic with special rules
+    if winner_rank[1] >= rankup_points:
+        can_rankup = True
+
+        # Check special rank rules
+        if config.special_rank_up_rules and winner_rank[0] >= SPECIAL_RANK_THRESHOLD:
+            # Can only rank up by beating another high-ranked player
+            can_rankup = loser_rank[0] >= SPECIAL_RANK_THRESHOLD
+            if not can_rankup:
+                # Reset points to rankup_points - 1 if can't rank up
+                winner_rank[3] = round((rankup_points - 0.1) - (winner_rank[1] - winner_rank[3]), 1) # max points before rankup - initial points
+                winner_rank[1] = rankup_points - 0.1
+                winner_rank[4] = True
+
+        if can_rankup:
+            winner_rank[0] += 1
+            winner_rank[2] = True
+            winner_rank[1] = winner_rank[1] % rankup_points if config.point_rollover else 0.0
+
+    # Rankdown logic
+    if loser_rank[1] <= RANKDOWN_POINTS:
+        loser_rank[0] -= 1
+        loser_rank[1] = DEFAULT_POINTS
+        loser_rank[2] = True
+
+    return winner_rank, loser_rank
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import os
+import sqlite3
+from datetime import datetime
+from cogs.database import database_path, table_columns, LEGACY_GUILD_ID
+from constants import SEASONS_DIR, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP, DEFAULT_DAN, DEFAULT_POINTS
+
+logger = logging.getLogger(__name__)
+
+def create_seasons_table(cur):
+    # Table recording every finished season and where its archive lives
+    cur.execute(f"CREATE TABLE IF NOT EXISTS seasons("
+                                                    f"id INTEGER PRIMARY KEY,"
+                                                    f"guild_id INT NOT NULL DEFAULT {LEGACY_GUILD_ID},"
+                                                    f"ended_at INTEGER," # uses unix time
+                                                    f"archive_path TEXT,"
+                                                    f"players_reset INTEGER"
+                                                    f")")
+    if "guild_id" not in table_columns(cur, "seasons"):
+        cur.execute(f"ALTER TABLE seasons ADD COLUMN guild_id INT NOT NULL DEFAULT {LEGACY_GUILD_ID}")
+
+def next_archive_path(con, guild_id=None):
+    """Returns the default archive file for the season that is currently running"""
+    if guild_id is None:
+        res = con.execute("SELECT COUNT(*) + 1 FROM seasons").fetchone()
+        return os.path.join(SEASONS_DIR, f"danisen_season_{res[0]}_{datetime.now().strftime('%Y%m%d')}.db")
+    res = con.execute("SELECT COUNT(*) + 1 FROM seasons WHERE guild_id=?", (guild_id,)).fetchone()
+    return os.path.join(SEASONS_DIR, f"danisen_{guild_id}_season_{res[0]}_{datetime.now().strftime('%Y%m%d')}.db")
+
+def _backup_file(src_path, dest_path, pages, sleep):
+    # Runs in a worker thread with its own connections, sqlite connections can't be shared across threads
+    src = sqlite3.connect(src_path)
+    dest = sqlite3.connect(dest_path)
+    try:
+        def progress(status, remaining, total):
+            logger.debug(f"Season backup copied {total - remaining}/{total} pages")
+        src.backup(dest, pages=pages, progress=progress, sleep=sleep)
+    finally:
+        dest.close()
+        src.close()
+
+async def backup_database(con, dest_path, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP):
+    """Takes a consistent online copy of con's database using the sqlite backup API.
+
+    The copy runs `pages` pages at a time in a worker thread, so the event loop keeps serving
+    commands (and writing to the database) between steps. sqlite restarts the copy itself if the
+    source is written to mid-backup, so the result is never torn.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+    src_path = database_path(con)
+    if src_path:
+        await asyncio.to_thread(_backup_file, src_path, dest_path, pages, sleep)
+    else:
+        # In-memory databases only exist on this connection, so copy on the loop
+        dest = sqlite3.connect(dest_path)
+        try:
+            con.backup(dest, pages=pages)
+        finally:
+            dest.close()
+
+def reset_ranks(con, archive_path, guild_id=None):
+    """Records the finished season and resets player ranks in one transaction, for one guild or every guild if guild_id is None.
+
+    Returns the number of players reset.
+    """
+    with con: # commits on success, rolls back if anything fails
+        if guild_id is None:
+            players_reset = con.execute("UPDATE players SET dan = ?, points = ?", (DEFAULT_DAN, DEFAULT_POINTS)).rowcount
+        else:
+            players_reset = con.execute("UPDATE players SET dan = ?, points = ? WHERE guild_id=?", (DEFAULT_DAN, DEFAULT_POINTS, guild_id)).rowcount
+        con.execute(
+            "INSERT INTO seasons (guild_id, ended_at, archive_path, players_reset) VALUES (?, UNIXEPOCH('now'), ?, ?)",
+            (LEGACY_GUILD_ID if guild_id is None else guild_id, archive_path, players_reset)
+        )
+    return players_reset
+
+async def rollover_season(con, archive_path=None, guild_id=None):
+    """Archives the current season to a file and resets ranks for the next one.
+
+    Only guild_id's ladder is reset when it is given. Returns a tuple of (archive_path, players_reset).
+    """
+    create_seasons_table(con)
+    if not archive_path:
+        archive_path = next_archive_path(con, guild_id)
+
+    logger.info(f"Archiving season to {archive_path}")
+    await backup_database(con, archive_path)
+    players_reset = reset_ranks(con, archive_path, guild_id)
+    logger.info(f"Season archived to {archive_path}, {players_reset} player(s) reset")
+    return archive_path, players_reset
@@ -0,0 +1,92 @@
+import time
+from collections import OrderedDict
+from constants import SESSION_IDLE_SECONDS
+
+class PlayerSession:
+    """What the engine knows about one player between commands"""
+    __slots__ = ("queued", "in_match", "last_active")
+
+    def __init__(self, now):
+        self.queued = set()  # Characters the player has in the queue
+        self.in_match = False
+        self.last_active = now
+
+    def idle(self):
+        return not self.queued and not self.in_match
+
+class SessionTable:
+    """Player sessions keyed by int discord_id, holding their queue and match state.
+
+    A session is made when a player queues and evicted once they've been idle (out of the queue and
+    out of a match) for idle_seconds, along with their recent opponent rings, so memory follows how
+    many players are active rather than how many ever played. `history(discord_id)` returns a
+    player's recent matches as (character, opponent, played_at) tuples, oldest first, and refills
+    their rings when they come back. Without it evicted players' rings are kept, as there would be no
+    way to get them back.
+    """
+    def __init__(self, recent, clock=time.monotonic, idle_seconds=SESSION_IDLE_SECONDS, history=None):
+        self.recent = recent
+        self.clock = clock
+        self.idle_seconds = idle_seconds
+        self.history = history
+        self.sessions = OrderedDict()  # Format: discord_id: PlayerSession, least recently active first
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def get(self, discord_id):
+        return self.sessions.get(discord_id)
+
+    def touch(self, discord_id):
+        # Returns discord_id's session, creating it if needed, and marks it active
+        now = self.clock()
+        session = self.sessions.get(discord_id)
+        if session is None:
+            session = self.sessions[discord_id] = PlayerSession(now)
+            if self.history is not None:
+                self.recent.restore(discord_id, self.history(discord_id))
+        else:
+            session.last_active = now
+            self.sessions.move_to_end(discord_id)
+        return session
+
+    def is_queued(self, discord_id, character):
+        session = self.sessions.get(discord_id)
+        return session is not None and character in session.queued
+
+    def is_in_match(self, discord_id):
+        session = self.sessions.get(discord_id)
+        return session is not None and session.in_match
+
+    def set_queued(self, discord_id, character, queued):
+        session = self.touch(discord_id)
+        if queued:
+            session.queued.add(character)
+        else:
+            session.queued.discard(character)
+
+    def set_in_match(self, discord_id, in_match):
+        self.touch(discord_id).in_match = in_match
+
+    def clear_queued(self):
+        for session in self.sessions.values():
+            session.queued.clear()
+
+    def clear_matches(self):
+        for session in self.sessions.values():
+            session.in_match = False
+
+    def evict_idle(self):
+        # Drops sessions idle for longer than idle_seconds. Returns how many were dropped
+        cutoff = self.clock() - self.idle_seconds
+        stale = []
+        for discord_id, session in self.sessions.items():
+            if session.last_active > cutoff:
+                break  # Everything after this was active more recently
+            if session.idle():
+                stale.append(discord_id)
+        for discord_id in stale:
+            del self.sessions[discord_id]
+            if self.history is not None:
+                self.recent.forget(discord_id)
+        return len(stale)
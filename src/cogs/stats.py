@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import sqlite3
+from cogs.database import database_path
+from constants import STATS_REFRESH_SECONDS
+
+def query_stats(con, guild_id):
+    """Runs the /danisenstats aggregates for guild_id. Returns (general, characters, dans) as plain dicts"""
+    general = con.execute(
+        "SELECT accounts, characters, total_games FROM (SELECT COUNT(*) AS accounts FROM users WHERE guild_id=:guild_id) AS AccountsTable JOIN (SELECT COUNT(*) AS characters FROM players WHERE guild_id=:guild_id) AS CharactersTable JOIN (SELECT COUNT(*) AS total_games FROM matches WHERE guild_id=:guild_id) AS MatchesTable",
+        {"guild_id": guild_id}
+    ).fetchone()
+    characters = con.execute(
+        "SELECT CharCountTable.character AS name, character_count, wins, losses, ROUND(100.0 * wins / (wins + losses), 1) AS winrate FROM (SELECT character, COUNT(*) AS character_count FROM players WHERE guild_id=:guild_id GROUP BY character) AS CharCountTable JOIN (SELECT winner_character AS character, COUNT(*) AS wins FROM matches WHERE guild_id=:guild_id GROUP BY winner_character) AS CharWinTable ON CharCountTable.character = CharWinTable.character JOIN (SELECT loser_character AS character, COUNT(*) AS losses FROM matches WHERE guild_id=:guild_id GROUP BY loser_character) AS CharLossTable ON CharCountTable.character = CharLossTable.character GROUP BY CharCountTable.character ORDER BY character_count DESC",
+        {"guild_id": guild_id}
+    ).fetchall()
+    dans = con.execute(
+        "SELECT dan AS name, COUNT(*) AS value FROM players WHERE guild_id=? GROUP BY dan ORDER BY dan", (guild_id,)
+    ).fetchall()
+    return dict(general), [dict(row) for row in characters], [dict(row) for row in dans]
+
+def _query_stats_file(path, guild_id):
+    # Runs in a worker thread on its own read only connection, so the bot's connection stays free for reports.
+    # The database is in WAL mode (see enable_wal), so this read doesn't hold up their commits either
+    con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    con.row_factory = sqlite3.Row
+    try:
+        return query_stats(con, guild_id)
+    finally:
+        con.close()
+
+class StatsSnapshots:
+    """Rendered /danisenstats pages per guild, kept up to date in the background.
+
+    Reports mark their guild stale and a background task recomputes stale guilds every `interval`
+    seconds, so the command only reads memory. render(general, characters, dans) turns a guild's
+    aggregates into the list of pages to show.
+    """
+    def __init__(self, con, render, interval=STATS_REFRESH_SECONDS):
+        self.logger = logging.getLogger(__name__)
+        self.con = con
+        self.render = render
+        self.interval = interval
+        self.pages = {}  # Format: guild_id: rendered pages
+        self.stale = set()  # guild_ids with reports since their pages were rendered
+
+    async def refresh(self, guild_id):
+        # Recomputes guild_id's pages and returns them
+        self.stale.discard(guild_id)  # Reports landing during the query mark it stale again
+        path = database_path(self.con)
+        if path:
+            stats = await asyncio.to_thread(_query_stats_file, path, guild_id)
+        else:
+            stats = query_stats(self.con, guild_id)  # In-memory databases only exist on this connection
+        self.pages[guild_id] = self.render(*stats)
+        return self.pages[guild_id]
+
+    async def get(self, guild_id):
+        # Returns guild_id's pages, computing them now only if it has none yet
+        if guild_id in self.pages:
+            return self.pages[guild_id]
+        return await self.refresh(guild_id)
+
+    def mark_stale(self, guild_id):
+        if guild_id in self.pages:
+            self.stale.add(guild_id)
+
+    async def run(self):
+        # Refreshes stale guilds until cancelled
+        while True:
+            await asyncio.sleep(self.interval)
+            for guild_id in list(self.stale):
+                try:
+                    await self.refresh(guild_id)
+                except Exception as e:
+                    self.stale.add(guild_id)
+                    self.logger.error(f"Failed to refresh stats for guild {guild_id}: {e}")
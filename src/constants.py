@@ -12,6 +12,7 @@ else:  # Running from source
 DB_PATH = os.path.join(CONFIG_DIR, 'danisen.db')
 CONFIG_PATH = os.path.join(CONFIG_DIR, 'config.json')
 LOG_FILE = os.path.join(PROJECT_ROOT, 'bot.log')
+SEASONS_DIR = os.path.join(CONFIG_DIR, 'seasons')
 
 # Default configuration
 DEFAULT_CONFIG = {
@@ -31,11 +32,22 @@ DEFAULT_CONFIG = {
     "queue_status": True,
     "special_rank_up_rules": False,
     "max_active_matches": 5,
+    "matchmaking_debounce": 3,
+    "matchmaking_max_wait": 30,
+    "rank_window_relax_seconds": 0,
+    "recent_opponents_expiry_seconds": 0,
+    "match_expiry_seconds": 7200,
+    "interaction_defer_budget": 2.0,
+    "rate_limits": {"joinqueue": "5/30", "leavequeue": "5/30", "leaderboard": "3/30", "danisenstats": "3/30"},
     "minimum_invite_dan": 4,
     "characters": [],
     "emoji_mapping": {},
     "character_aliases": {} 
 }
+# Logging
+LOG_BUFFER_SIZE = 10000 # log records waiting to be written before the least important are dropped
+LOG_MAX_BYTES = 10 * 1024 * 1024 # size at which the log file rotates, unless it rotates by time
+LOG_BACKUPS = 5 # rotated log files kept
 # Logging colors
 LOG_COLORS = {
     'DEBUG': 'black',
@@ -49,10 +61,14 @@ LOG_COLORS = {
 GUI_WINDOW_TITLE = "Danisen Bot"
 GUI_MIN_WIDTH = 600
 GUI_MIN_HEIGHT = 400
+GUI_LOG_LINES = 5000 # log lines kept and shown in the log tab
+GUI_LOG_FLUSH_MS = 250 # how often new log lines are added to the log tab
 
 
 #Danisen Constants
 MAX_FIELDS_PER_EMBED = 10
+PAGE_CACHE_SIZE = 8 # built embed pages kept per paginated message
+PROFILE_CACHE_SIZE = 1000 # rendered /profile embeds kept across all guilds
 MAX_DAN_RANK = 10
 SPECIAL_RANK_THRESHOLD = 7
 RANKUP_POINTS_NORMAL = 3
@@ -60,6 +76,31 @@ RANKUP_POINTS_SPECIAL = 5
 RANKDOWN_POINTS = -3
 DEFAULT_DAN = 1
 DEFAULT_POINTS = 0.0
+WAIT_SAMPLES_PER_DAN = 200 # matched queue waits kept per dan for /queuestats
+RECENT_MATCHES_PER_PLAYER = 100 # latest matches read to refill a returning player's recent opponents
+SESSION_IDLE_SECONDS = 6 * 60 * 60 # idle time after which a player's queue session and recent opponents are dropped from memory
+MATRIX_QUEUE_THRESHOLD = 64 # queue length from which pairs are checked with numpy arrays, when numpy is installed
+CUSTOM_ID_PREFIX = "danisen" # start of the custom_id of every component on match messages
+REQUEUE_BUTTON_SECONDS = 120 # how long after a report its requeue button works
+MEMBER_CACHE_MODE = "lazy" # "lazy" caches members on demand, "full" chunks every guild at startup. Overridden by the MEMBER_CACHE environment variable
+MEMBER_CACHE_SIZE = 5000 # fetched members kept across all guilds when they aren't in the member cache
+MEMBER_CACHE_SECONDS = 15 * 60 # how long a fetched member is used before it's fetched again
+RATE_LIMIT_BUCKETS = 10000 # per user command rate limit buckets kept across all guilds, least recently used dropped first
+
+CONFIG_POLL_SECONDS = 2 # how often config.json is checked for edits
+PROFILE_SAMPLE_INTERVAL = 0.005 # seconds between stack samples of the sampling profiler
+PROFILE_MAX_SECONDS = 60 # longest a single profile may run
+PROFILE_TOP = 25 # rows shown per section of profile and memory reports
+TRACEMALLOC_FRAMES = 10 # stack frames kept per allocation while memory tracing is on
+LOOP_LAG_INTERVAL = 0.25 # seconds between event loop lag measurements
+LOOP_LAG_THRESHOLD = 0.5 # lag in seconds counted as the loop being blocked
+LOOP_STALLS_KEPT = 50 # latest loop stalls shown by the health server
+RESPONSE_TIME_BUCKETS = (0.25, 0.5, 1, 2, 3) # upper bounds in seconds of the /responsetimes histogram buckets
+STATS_REFRESH_SECONDS = 60 # how often /danisenstats pages are recomputed for guilds with changes
+
+# Season rollover constants
+BACKUP_PAGES_PER_STEP = 64 # pages copied per sqlite backup step
+BACKUP_STEP_SLEEP = 0.005 # seconds the backup thread sleeps between steps so writers can get in
 
 # Ensure config directory exists
 os.makedirs(CONFIG_DIR, exist_ok=True)
\ No newline at end of file
@@ -1,4 +1,6 @@
 from bot import *
+import asyncio
+import sqlite3
 from PyQt6.QtGui import *
 from PyQt6.QtWidgets import *
 from PyQt6.QtCore import *
@@ -8,13 +10,16 @@ import os
 import qasync
 from io import StringIO
 import logging
-import shutil
+from collections import deque
+from html import escape
 from constants import (
     DB_PATH, CONFIG_PATH, LOG_FILE, DEFAULT_CONFIG, 
-    LOG_COLORS, GUI_WINDOW_TITLE, GUI_MIN_WIDTH, GUI_MIN_HEIGHT
+    LOG_COLORS, GUI_WINDOW_TITLE, GUI_MIN_WIDTH, GUI_MIN_HEIGHT, GUI_LOG_LINES, GUI_LOG_FLUSH_MS
 )
 
 from utils.config import save_config, load_config
+from utils import logs
+from cogs.season import rollover_season
 
 # Create our custom stderr that redirects to logging
 class LoggedStderr:
@@ -27,12 +32,7 @@ class LoggedStderr:
 
 # Centralized logging setup
 def setup_logging():
-    logging.basicConfig(
-        filename=LOG_FILE,
-        filemode='w',
-        level=logging.DEBUG,
-        format='%(asctime)s - %(levelname)s - %(message)s'
-    )
+    logs.setup_logging(LOG_FILE, level=logging.DEBUG, console=False)
     sys.excepthook = lambda exc_type, exc_value, exc_traceback: logging.error(
         "Uncaught exception", exc_info=(exc_type, exc_value, exc_traceback)
     )
@@ -242,21 +242,38 @@ class ConfigTab(QWidget):
         except Exception as e:
             QMessageBox.warning(self, "Warning", f"Failed to load configuration: {str(e)}")
 
-class ColoredQTextEditLogger(logging.Handler):
-    COLORS = LOG_COLORS
+class LogRingHandler(logging.Handler):
+    """Keeps the last GUI_LOG_LINES formatted records for the log tab.
 
-    def __init__(self, text_widget):
+    emit() runs on whichever thread logged, so it only appends to deques and never touches Qt. The
+    log tab takes the new records on the Qt thread with take_pending().
+    """
+    def __init__(self, size=GUI_LOG_LINES):
         super().__init__()
-        self.text_widget = text_widget
-        self.text_widget.setReadOnly(True)
-        format_string = '%(asctime)s - %(levelname)s - %(message)s'
-        self.setFormatter(logging.Formatter(format_string))
+        self.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        self.records = deque(maxlen=size)  # (levelno, levelname, line), oldest first
+        self.pending = deque(maxlen=size)  # Records the tab hasn't shown yet
 
     def emit(self, record):
-        color = self.COLORS.get(record.levelno, 'black')
-        msg = self.format(record)
-        html = f'<span style="color: {color};">{msg}</span>'
-        self.text_widget.append(html)
+        try:
+            entry = (record.levelno, record.levelname, self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+        self.records.append(entry)
+        self.pending.append(entry)
+
+    def take_pending(self):
+        with self.lock:
+            entries = list(self.pending)
+            self.pending.clear()
+        return entries
+
+    def snapshot(self):
+        # Every kept record, for redrawing after the filter changes
+        with self.lock:
+            self.pending.clear()
+            return list(self.records)
 
 class LogTab(QWidget):
     def __init__(self):
@@ -268,24 +285,71 @@ class LogTab(QWidget):
         # Create and configure logger
         self.logger = logging.getLogger(__name__)
 
-        # Create text display
-        self.text_display = QTextEdit()
+        # Level filter and search
+        filter_layout = QHBoxLayout()
+        self.level_filter = QComboBox()
+        self.level_filter.addItems(["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"])
+        self.level_filter.setCurrentText("INFO")
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search logs")
+        self.level_filter.currentTextChanged.connect(self.redraw)
+        self.search_box.textChanged.connect(self.redraw)
+        filter_layout.addWidget(QLabel("Level:"))
+        filter_layout.addWidget(self.level_filter)
+        filter_layout.addWidget(self.search_box)
+        layout.addLayout(filter_layout)
+
+        # Create text display, it keeps no more lines than the handler does
+        self.text_display = QPlainTextEdit()
         self.text_display.setReadOnly(True)
+        self.text_display.setMaximumBlockCount(GUI_LOG_LINES)
         layout.addWidget(self.text_display)
 
         # Configure the root logger instead of creating a new one
         root_logger = logging.getLogger()  # Get the root logger
         root_logger.setLevel(logging.INFO)
 
-        self.logs_handler = ColoredQTextEditLogger(self.text_display)
+        self.logs_handler = LogRingHandler()
         root_logger.addHandler(self.logs_handler)
 
+        # New records are shown in batches on the Qt thread
+        self.flush_timer = QTimer(self)
+        self.flush_timer.timeout.connect(self.flush)
+        self.flush_timer.start(GUI_LOG_FLUSH_MS)
+
         #Add Main Content
         self.save_logs_button = QPushButton(text="Save Logs")
         self.save_logs_button.clicked.connect(self.save_logs)
 
         layout.addWidget(self.save_logs_button)
-    
+
+    def append(self, entries):
+        # Adds the entries that pass the filters, keeping the view at the bottom if it was already there
+        min_level = logging.getLevelName(self.level_filter.currentText())
+        search = self.search_box.text().lower()
+        lines = []
+        for levelno, levelname, line in entries:
+            if levelno >= min_level and search in line.lower():
+                text = escape(line).replace("\n", "<br>")
+                lines.append(f'<span style="color: {LOG_COLORS.get(levelname, "black")};">{text}</span>')
+        if not lines:
+            return
+        scrollbar = self.text_display.verticalScrollBar()
+        at_bottom = scrollbar.value() == scrollbar.maximum()
+        self.text_display.setUpdatesEnabled(False)
+        for line in lines:
+            self.text_display.appendHtml(line)
+        self.text_display.setUpdatesEnabled(True)
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+
+    def flush(self):
+        self.append(self.logs_handler.take_pending())
+
+    def redraw(self):
+        self.text_display.clear()
+        self.append(self.logs_handler.snapshot())
+
     def save_logs(self):
         text = self.text_display.toPlainText()
 
@@ -326,21 +390,18 @@ class AdminTab(QWidget):
             "Database Files (*.db);;All Files (*)"
         )
         if file_path:
-            try:
-                shutil.copy(DB_PATH, file_path)
-                self.logger.info(f"danisen.db file copied to {file_path}")
-                self._reset_player_data()
-            except Exception as e:
-                self.logger.error(f"Failed to reset season: {str(e)}")
-
-    def _reset_player_data(self):
-        cursor = self.con.cursor()
-        cursor.execute("""
-            UPDATE players
-            SET dan = ?, points = ?
-        """, (1, 0))
-        self.con.commit()
-        self.logger.info("Player data reset successfully.")
+            # Runs on the qasync loop so the bot keeps serving commands during the backup
+            self.reset_season_button.setEnabled(False)
+            asyncio.create_task(self._rollover_season(file_path))
+
+    async def _rollover_season(self, file_path):
+        try:
+            archive_path, players_reset = await rollover_season(self.con, file_path)
+            self.logger.info(f"danisen.db archived to {archive_path}, {players_reset} player(s) reset successfully.")
+        except Exception as e:
+            self.logger.error(f"Failed to reset season: {str(e)}")
+        finally:
+            self.reset_season_button.setEnabled(True)
 
 class DanisenWindow(QMainWindow):
     def __init__(self):
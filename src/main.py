@@ -1,18 +1,21 @@
 import argparse
 import asyncio
+import hmac
 import sys
 import os
-from aiohttp import web
-from bot import create_bot
 import sqlite3
-from constants import DB_PATH, CONFIG_PATH, DEFAULT_CONFIG
+from constants import DB_PATH, CONFIG_PATH, DEFAULT_CONFIG, LOG_MAX_BYTES, LOG_BACKUPS
 from utils.config import save_config, load_config
-import logging
-from dotenv import load_dotenv
+from utils.startup import StartupProfiler
+from utils.loop_monitor import LoopLagMonitor
+from utils.logs import setup_logging
+
+# The bot, aiohttp and dotenv are imported where they're used, so startup can load them alongside other work
 
 
 #listen for health checks (for Cloud Run)
-async def health_check():
+async def health_check(loop_monitor=None, get_diagnostics=lambda: None):
+    from aiohttp import web
     app = web.Application()
     
     # Rate limiting middleware
@@ -35,6 +38,47 @@ async def health_check():
     host = '127.0.0.1' if os.getenv('ENVIRONMENT') == 'development' else '0.0.0.0'
     
     app.router.add_get("/health", handle)
+
+    # Event loop lag and what caused recent stalls
+    async def handle_loop(request):
+        return web.json_response(loop_monitor.snapshot())
+
+    if loop_monitor:
+        app.router.add_get("/health/loop", handle_loop)
+
+    # Profiling endpoints, only served when DIAGNOSTICS_TOKEN is set and only to requests bearing it
+    token = os.getenv('DIAGNOSTICS_TOKEN')
+
+    def authorized(request):
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")
+
+    async def handle_profile(request):
+        diagnostics = get_diagnostics()
+        if not authorized(request):
+            return web.Response(status=401)
+        if diagnostics is None:
+            return web.Response(status=503, text="Bot not started yet")
+        try:
+            seconds = float(request.query.get('seconds', 10))
+        except ValueError:
+            return web.Response(status=400, text="seconds must be a number")
+        stacks = await diagnostics.profile(seconds)
+        return web.Response(text=diagnostics.format_profile(stacks, folded=request.query.get('format') == 'folded'))
+
+    async def handle_memory(request):
+        diagnostics = get_diagnostics()
+        if not authorized(request):
+            return web.Response(status=401)
+        if diagnostics is None:
+            return web.Response(status=503, text="Bot not started yet")
+        report = await diagnostics.memory_report()
+        if request.query.get('stop'):
+            diagnostics.stop_tracing()
+        return web.Response(text=report)
+
+    if token:
+        app.router.add_get("/debug/profile", handle_profile)
+        app.router.add_get("/debug/memory", handle_memory)
     
     runner = web.AppRunner(app)
     await runner.setup()
@@ -46,46 +90,95 @@ async def health_check():
         await asyncio.sleep(60)
         app.ip_count.clear()
 
-async def run_headless():
-    
-    # Set up logging for headless mode
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[logging.FileHandler('bot.log'), logging.StreamHandler()]
-    )
-    logger = logging.getLogger(__name__)
+def import_bot():
+    from bot import create_bot
+    return create_bot
+
+def load_settings():
+    # Returns the config with bot_token set, creating config.json if it doesn't exist
+    from dotenv import load_dotenv
+
+    # Load config
+    config = DEFAULT_CONFIG.copy()
+    if not os.path.exists(CONFIG_PATH):
+        save_config(CONFIG_PATH, DEFAULT_CONFIG)
+    else:
+        config = load_config(CONFIG_PATH)
+
+    # Load token from dotenv, if exists
+    load_dotenv()
+
+    # Get token from environment or config
+    bot_token = os.getenv('BOT_TOKEN') or config.get('bot_token')
+    if not bot_token:
+        raise ValueError("Bot token not found. Set BOT_TOKEN environment variable or configure in config.json")
+    else:
+        config.setdefault('bot_token', bot_token)
+    return config
+
+def prepare_database(path):
+    # Creates and migrates the tables on a connection of its own, so the cog's setup later finds nothing left to do
+    from cogs.database import setup_database
+    from cogs.season import create_seasons_table
+    con = sqlite3.connect(path)
+    try:
+        setup_database(con)
+        create_seasons_table(con)
+        con.commit()
+    finally:
+        con.close()
+
+async def run_headless(profile_startup=False):
     """Run the bot in headless mode without GUI"""
+    # Set up logging for headless mode, written from a background thread
+    setup_logging(
+        'bot.log',
+        json_lines=os.getenv('LOG_JSON') == '1',
+        rotate_when=os.getenv('LOG_ROTATE_WHEN'),
+        max_bytes=int(os.getenv('LOG_MAX_BYTES', LOG_MAX_BYTES)),
+        backups=int(os.getenv('LOG_BACKUPS', LOG_BACKUPS)),
+    )
+    profiler = StartupProfiler(profile_startup)
+
+    async def in_thread(name, func, *args):
+        with profiler.phase(name):
+            return await asyncio.to_thread(func, *args)
 
     try:
-        # Initialize database connection
-        con = sqlite3.connect(DB_PATH)
-        
+        bot = None
+
+        # Watch for blocking calls on the event loop
+        loop_monitor = LoopLagMonitor()
+        asyncio.create_task(loop_monitor.run())
+
+        # Start health check server for Cloud Run first, it waits for the port before routing to the instance
+        asyncio.create_task(health_check(loop_monitor, lambda: bot.get_cog("Danisen").diagnostics if bot else None))
+
+        # Importing the bot, loading config and preparing the database don't depend on each other
+        create_bot, config, _ = await asyncio.gather(
+            in_thread("import bot", import_bot),
+            in_thread("load config", load_settings),
+            in_thread("prepare database", prepare_database, DB_PATH),
+        )
+
         # Create bot instance
-        bot = create_bot(con)
-        
-        # Load config
-        config = DEFAULT_CONFIG.copy()
-        if not os.path.exists(CONFIG_PATH):
-            save_config(CONFIG_PATH, DEFAULT_CONFIG)
-        else:
-            config = load_config(CONFIG_PATH)
-
-        # Load token from dotenv, if exists
-        load_dotenv()
-
-        # Get token from environment or config
-        bot_token = os.getenv('BOT_TOKEN') or config.get('bot_token')
-        if not bot_token:
-            raise ValueError("Bot token not found. Set BOT_TOKEN environment variable or configure in config.json")
-        else:
-            config.setdefault('bot_token', bot_token)
-
-        # Start health check server for Cloud Run
-        asyncio.create_task(health_check())
+        with profiler.phase("create bot"):
+            con = sqlite3.connect(DB_PATH)
+            bot = create_bot(con)
+
+        # on_ready fires again after reconnects, only the first one is part of startup
+        ready = asyncio.Event()
+        async def report_ready():
+            if not ready.is_set():
+                ready.set()
+                profiler.report("ready")
+        bot.add_listener(report_ready, "on_ready")
 
         # Start the bot
-        await bot.start(bot_token)
+        with profiler.phase("login"):
+            await bot.login(config['bot_token'])
+        profiler.report("login")
+        await bot.connect()
         
     except Exception as e:
         print(f"Error in headless mode: {e}")
@@ -94,10 +187,11 @@ async def run_headless():
 def main():
     parser = argparse.ArgumentParser(description='Danisen Bot')
     parser.add_argument('--headless', action='store_true', help='Run in headless mode without GUI')
+    parser.add_argument('--profile-startup', action='store_true', help='Log how long each part of startup takes')
     args = parser.parse_args()
 
     # if args.headless:
-    asyncio.run(run_headless())
+    asyncio.run(run_headless(args.profile_startup))
     
     # I'm commenting out the option of running with a gui, feel free to put it back
     # else:
@@ -0,0 +1,182 @@
+"""Offline simulator for tuning ladder settings.
+
+Drives the real MatchmakingEngine and scoring rules with synthetic players in virtual time, without
+connecting to Discord. Every combination of the --grid values is simulated in parallel, e.g.
+
+    python src/simulate.py --players 200 --hours 48 --grid point_multiplier=1,1.5 recent_opponents_limit=1,3
+"""
+import argparse
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+import statistics
+from collections import Counter
+from multiprocessing import Pool
+from constants import DEFAULT_CONFIG, DEFAULT_DAN, DEFAULT_POINTS
+from cogs.matchmaking import MatchmakingEngine
+from cogs.scoring import score_match
+from utils.config import LadderConfig
+
+class VirtualClock:
+    """Clock the engine reads instead of real time, advanced by the simulation"""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def average_ranks(values):
+    # Rank of each value, with ties sharing the average of their ranks
+    order = sorted(range(len(values)), key=values.__getitem__)
+    ranks = [0.0] * len(values)
+    start = 0
+    while start < len(order):
+        end = start
+        while end + 1 < len(order) and values[order[end + 1]] == values[order[start]]:
+            end += 1
+        for idx in order[start:end + 1]:
+            ranks[idx] = (start + end) / 2
+        start = end + 1
+    return ranks
+
+def spearman(xs, ys):
+    """Rank correlation between xs and ys, 0.0 when either doesn't vary"""
+    rx, ry = average_ranks(xs), average_ranks(ys)
+    mx, my = statistics.fmean(rx), statistics.fmean(ry)
+    cov = sum((a - mx) * (b - my) for a, b in zip(rx, ry))
+    var = math.sqrt(sum((a - mx) ** 2 for a in rx) * sum((b - my) ** 2 for b in ry))
+    return cov / var if var else 0.0
+
+def simulate(overrides, players=100, hours=24.0, seed=0, step=10.0, arrival_rate=1 / 1800, requeue_chance=0.8,
+             patience=900.0, match_length=(300.0, 900.0), skill_scale=1.0, rematch_window=3600.0):
+    """Runs one ladder with the given config overrides and returns its summary as a dict.
+
+    Players have a hidden skill drawn from a standard normal distribution and win with a logistic
+    probability of their skill difference over skill_scale. Offline players come online at
+    arrival_rate per second, queued players give up after an exponential wait averaging `patience`
+    seconds, and after each match a player queues again with requeue_chance.
+    """
+    rng = random.Random(seed)
+    clock = VirtualClock()
+    config = LadderConfig.from_dict({**DEFAULT_CONFIG, **overrides})
+    engine = MatchmakingEngine(0, config, clock=clock)
+
+    skills = [rng.gauss(0, 1) for _ in range(players)]
+    ranks = [[DEFAULT_DAN, DEFAULT_POINTS] for _ in range(players)]
+    online = [False] * players
+    gives_up_at = {}  # Format: discord_id: virtual time they leave the queue
+    ongoing = []  # Heap of (end time, match_id, discord_id, discord_id)
+    last_met = {}  # Format: (discord_id, discord_id): virtual time of their last match
+    waits = []
+    matches = rematches = abandoned = 0
+    convergence = []
+
+    def join(pid):
+        engine.add_to_queue({"player_name": f"sim{pid}", "discord_id": pid, "character": "Sim",
+                             "dan": ranks[pid][0], "points": ranks[pid][1]})
+        gives_up_at[pid] = clock.now + rng.expovariate(1 / patience)
+
+    for tick in range(1, int(hours * 3600 / step) + 1):
+        clock.now = tick * step
+
+        # Finish matches and score them
+        while ongoing and ongoing[0][0] <= clock.now:
+            _, match_id, p1, p2 = heapq.heappop(ongoing)
+            p1_wins = rng.random() < 1 / (1 + math.exp((skills[p2] - skills[p1]) / skill_scale))
+            winner, loser = (p1, p2) if p1_wins else (p2, p1)
+            winner_rank, loser_rank = score_match(ranks[winner][0], ranks[winner][1], ranks[loser][0], ranks[loser][1], config)
+            ranks[winner] = winner_rank[:2]
+            ranks[loser] = loser_rank[:2]
+            engine.end_match(match_id)
+            for pid in (p1, p2):
+                if rng.random() < requeue_chance:
+                    join(pid)
+                else:
+                    online[pid] = False
+
+        # Arrivals
+        for pid in range(players):
+            if not online[pid] and rng.random() < arrival_rate * step:
+                online[pid] = True
+                join(pid)
+
+        # Players who got tired of waiting
+        for daniel in engine.waiting():
+            if clock.now >= gives_up_at[daniel['discord_id']]:
+                engine.remove_from_queue(daniel['discord_id'])
+                online[daniel['discord_id']] = False
+                abandoned += 1
+
+        for daniel1, daniel2 in engine.matchmake():
+            matches += 1
+            waits += [clock.now - daniel1['enqueued_at'], clock.now - daniel2['enqueued_at']]
+            pair = tuple(sorted((daniel1['discord_id'], daniel2['discord_id'])))
+            if pair in last_met and clock.now - last_met[pair] <= rematch_window:
+                rematches += 1
+            last_met[pair] = clock.now
+            match_id = engine.active.for_player(daniel1['discord_id']).match_id
+            heapq.heappush(ongoing, (clock.now + rng.uniform(*match_length), match_id, daniel1['discord_id'], daniel2['discord_id']))
+
+        if clock.now % 3600 < step:
+            convergence.append(round(spearman(skills, [dan for dan, _ in ranks]), 3))
+
+    ordered_waits = sorted(waits)
+    return {
+        "config": overrides,
+        "seed": seed,
+        "matches": matches,
+        "abandoned": abandoned,
+        "avg_wait": round(statistics.fmean(waits), 1) if waits else None,
+        "p95_wait": round(ordered_waits[max(0, math.ceil(0.95 * len(ordered_waits)) - 1)], 1) if waits else None,
+        "rematch_rate": round(rematches / matches, 3) if matches else 0.0,
+        "skill_dan_correlation": convergence,  # Spearman correlation of hidden skill and dan, once per virtual hour
+        "dan_distribution": dict(sorted(Counter(dan for dan, _ in ranks).items())),
+    }
+
+def run_job(job):
+    return simulate(**job)
+
+def parse_grid(grid):
+    # Turns ["key=v1,v2", ...] into every combination of overrides
+    axes = []
+    for item in grid:
+        key, _, values = item.partition("=")
+        parsed = []
+        for value in values.split(","):
+            try:
+                parsed.append(json.loads(value))
+            except json.JSONDecodeError:
+                parsed.append(value)
+        axes.append([(key, value) for value in parsed])
+    return [dict(combo) for combo in itertools.product(*axes)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the danisen ladder offline to compare settings.")
+    parser.add_argument("--grid", nargs="*", default=[], help="config values to sweep, as key=value1,value2")
+    parser.add_argument("--players", type=int, default=100)
+    parser.add_argument("--hours", type=float, default=24.0, help="virtual hours to simulate")
+    parser.add_argument("--seeds", type=int, default=1, help="runs per config, each with a different seed")
+    parser.add_argument("--step", type=float, default=10.0, help="virtual seconds per simulation step")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--json", action="store_true", help="print one JSON object per run")
+    args = parser.parse_args()
+
+    jobs = [{"overrides": overrides, "players": args.players, "hours": args.hours, "seed": seed, "step": args.step}
+            for overrides in parse_grid(args.grid) for seed in range(args.seeds)]
+    with Pool(args.processes) as pool:
+        results = pool.map(run_job, jobs)
+
+    for result in results:
+        if args.json:
+            print(json.dumps(result))
+        else:
+            final = result["skill_dan_correlation"][-1] if result["skill_dan_correlation"] else None
+            print(f"{result['config']} seed {result['seed']}: {result['matches']} matches, avg wait {result['avg_wait']}s, "
+                  f"p95 wait {result['p95_wait']}s, rematch rate {result['rematch_rate']}, abandoned {result['abandoned']}, "
+                  f"skill/dan correlation {final}, dans {result['dan_distribution']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
+import asyncio
 import json
 import os
 import logging
+from collections.abc import Mapping
+from dataclasses import dataclass, field, fields, replace
+from types import MappingProxyType
+from constants import DEFAULT_CONFIG, DEFAULT_DAN, CONFIG_POLL_SECONDS
 
 def save_config(file_path, config):
     """Save configuration to file"""
@@ -21,4 +26,200 @@ def load_config(file_path, default_config=None):
             logging.warning(f"Config file {file_path} does not exist. Using default config.")
     except Exception as e:
         logging.error(f"Failed to load config: {e}")
-    return default_config if default_config is not None else {}
\ No newline at end of file
+    return default_config if default_config is not None else {}
+
+def guild_config_dict(config, guild_id):
+    """Returns config with the overrides for guild_id from its "guilds" section applied"""
+    merged = {key: value for key, value in config.items() if key != 'guilds'}
+    merged.update(config.get('guilds', {}).get(str(guild_id), {}))
+    return merged
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in _BOOL_WORDS:
+        return _BOOL_WORDS[value.strip().lower()]
+    raise ValueError(f"expected true or false, got {value!r}")
+
+def _parse_int(value):
+    if isinstance(value, bool):
+        raise ValueError(f"expected a whole number, got {value!r}")
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, (int, str)):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise ValueError(f"expected a whole number, got {value!r}")
+
+def _parse_float(value):
+    if isinstance(value, bool):
+        raise ValueError(f"expected a number, got {value!r}")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"expected a number, got {value!r}")
+
+def _parse_names(value):
+    if isinstance(value, str):
+        value = json.loads(value)
+    if not isinstance(value, (list, tuple)) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"expected a list of names, got {value!r}")
+    return tuple(value)
+
+def _parse_mapping(value):
+    if isinstance(value, str):
+        value = json.loads(value)
+    if not isinstance(value, Mapping) or not all(isinstance(k, str) and isinstance(v, str) for k, v in value.items()):
+        raise ValueError(f"expected a mapping of names to text, got {value!r}")
+    return MappingProxyType(dict(value))
+
+def _parse_rate(value):
+    # "uses/seconds", like "5/30" for 5 uses every 30 seconds
+    uses, _, seconds = value.partition("/")
+    try:
+        uses, seconds = int(uses), float(seconds)
+    except ValueError:
+        raise ValueError(f"expected uses/seconds, got {value!r}") from None
+    if uses < 1 or seconds <= 0:
+        raise ValueError(f"expected at least 1 use over more than 0 seconds, got {value!r}")
+    return (uses, seconds)
+
+_BOOL_WORDS = {'true': True, '1': True, 'yes': True, 'on': True, 'false': False, '0': False, 'no': False, 'off': False}
+_PARSERS = {int: _parse_int, float: _parse_float, bool: _parse_bool, tuple: _parse_names, Mapping: _parse_mapping}
+
+@dataclass(frozen=True)
+class LadderConfig:
+    """Validated settings for one guild's danisen ladder, with defaults from DEFAULT_CONFIG.
+
+    Frozen: changing a setting means building a new LadderConfig and swapping it in, so code holding
+    the old one never sees a half applied change. Build from a config dict with from_dict().
+    """
+    # DISCORD CHANNEL ID CONFIG
+    ACTIVE_MATCHES_CHANNEL_ID: int = 0
+    REPORTED_MATCHES_CHANNEL_ID: int = 0
+    ONGOING_MATCHES_CHANNEL_ID: int = 0
+    WELCOME_CHANNEL_ID: int = 0
+    DANISEN_STATUS_CHANNEL_ID: int = 0
+
+    # CHARACTER SETTINGS CONFIG
+    characters: tuple = ()
+    emoji_mapping: Mapping = field(default_factory=lambda: MappingProxyType({}))
+    character_aliases: Mapping = field(default_factory=lambda: MappingProxyType({}))
+
+    # DANISEN SETTINGS CONFIG
+    total_dans: int = DEFAULT_CONFIG['total_dans']
+    minimum_derank: int = DEFAULT_CONFIG['minimum_derank']
+    maximum_rank_difference: int = DEFAULT_CONFIG['maximum_rank_difference']
+    rank_gap_for_more_points_1: int = DEFAULT_CONFIG['rank_gap_for_more_points_1']
+    rank_gap_for_more_points_2: int = DEFAULT_CONFIG['rank_gap_for_more_points_2']
+    point_rollover: bool = DEFAULT_CONFIG['point_rollover']
+    point_multiplier: float = DEFAULT_CONFIG['point_multiplier']
+    special_rank_up_rules: bool = DEFAULT_CONFIG['special_rank_up_rules']
+    minimum_invite_dan: int = DEFAULT_CONFIG['minimum_invite_dan']
+
+    # MATCHMAKING QUEUE CONFIG
+    queue_status: bool = DEFAULT_CONFIG['queue_status']
+    recent_opponents_limit: int = DEFAULT_CONFIG['recent_opponents_limit']
+    recent_opponents_expiry_seconds: int = DEFAULT_CONFIG['recent_opponents_expiry_seconds']  # Rematches allowed again after this many seconds, 0 to only expire by count
+    max_active_matches: int = DEFAULT_CONFIG['max_active_matches']
+    match_expiry_seconds: int = DEFAULT_CONFIG['match_expiry_seconds']  # Unreported matches are cancelled after this many seconds, 0 to keep them open
+    matchmaking_debounce: float = DEFAULT_CONFIG['matchmaking_debounce']  # Seconds of quiet to wait for before a pass
+    matchmaking_max_wait: float = DEFAULT_CONFIG['matchmaking_max_wait']  # Longest a pass is held back by debouncing
+    rank_window_relax_seconds: float = DEFAULT_CONFIG['rank_window_relax_seconds']  # Widen the dan window by 1 per this many seconds waited, 0 to disable
+
+    # INTERACTION CONFIG
+    interaction_defer_budget: float = DEFAULT_CONFIG['interaction_defer_budget']  # Commands that haven't responded this many seconds after the interaction are deferred
+    rate_limits: Mapping = field(default_factory=lambda: MappingProxyType(dict(DEFAULT_CONFIG['rate_limits'])))  # Format: command name: "uses/seconds" allowed per user
+
+    # Lookups built once from the values above
+    character_set: frozenset = field(init=False, repr=False, compare=False)
+    sorted_characters: tuple = field(init=False, repr=False, compare=False)
+    prefix_index: Mapping = field(init=False, repr=False, compare=False)  # Format: lowercase prefix: characters starting with it
+    alias_lookup: Mapping = field(init=False, repr=False, compare=False)  # Format: lowercase alias: character
+    rate_limit_lookup: Mapping = field(init=False, repr=False, compare=False)  # Format: command name: (uses, seconds)
+
+    def __post_init__(self):
+        # Check value types and ranges
+        for config_field in fields(self):
+            if config_field.init:
+                try:
+                    object.__setattr__(self, config_field.name, _PARSERS[config_field.type](getattr(self, config_field.name)))
+                except ValueError as e:
+                    raise ValueError(f"{config_field.name}: {e}") from None
+
+        for name in ('total_dans', 'max_active_matches', 'rank_gap_for_more_points_1', 'rank_gap_for_more_points_2'):
+            if getattr(self, name) < 1:
+                raise ValueError(f"{name}: must be at least 1")
+        for name in ('maximum_rank_difference', 'recent_opponents_limit', 'recent_opponents_expiry_seconds', 'match_expiry_seconds', 'point_multiplier',
+                     'matchmaking_debounce', 'matchmaking_max_wait', 'rank_window_relax_seconds'):
+            if getattr(self, name) < 0:
+                raise ValueError(f"{name}: can't be negative")
+        if not 0 <= self.interaction_defer_budget < 3:
+            raise ValueError("interaction_defer_budget: must be under Discord's 3 second deadline")
+        if not DEFAULT_DAN <= self.minimum_derank <= self.total_dans:
+            raise ValueError(f"minimum_derank: must be between {DEFAULT_DAN} and total_dans ({self.total_dans})")
+        try:
+            rate_limit_lookup = {command: _parse_rate(limit) for command, limit in self.rate_limits.items()}
+        except ValueError as e:
+            raise ValueError(f"rate_limits: {e}") from None
+
+        # Each character must exist in emoji mapping
+        object.__setattr__(self, 'emoji_mapping', MappingProxyType({**{char: "" for char in self.characters}, **self.emoji_mapping}))
+
+        prefix_index = {}
+        sorted_characters = tuple(sorted(self.characters, key=str.lower))
+        for char in sorted_characters:
+            for end in range(len(char) + 1):
+                prefix_index.setdefault(char[:end].lower(), []).append(char)
+        object.__setattr__(self, 'character_set', frozenset(self.characters))
+        object.__setattr__(self, 'sorted_characters', sorted_characters)
+        object.__setattr__(self, 'prefix_index', MappingProxyType({prefix: tuple(chars) for prefix, chars in prefix_index.items()}))
+        object.__setattr__(self, 'alias_lookup', MappingProxyType({alias.lower(): char for alias, char in self.character_aliases.items()}))
+        object.__setattr__(self, 'rate_limit_lookup', MappingProxyType(rate_limit_lookup))
+
+    @classmethod
+    def from_dict(cls, config):
+        """Builds a config from a loaded config dict, ignoring keys that aren't settings. Raises ValueError on bad values"""
+        names = {config_field.name for config_field in fields(cls) if config_field.init}
+        return cls(**{key: value for key, value in config.items() if key in names})
+
+    def replace(self, **changes):
+        """Returns a new config with changes applied"""
+        return replace(self, **changes)
+
+def parse_config_value(key, text):
+    """Parses text typed into /setconfig into the type of setting key. Raises ValueError if it doesn't fit"""
+    for config_field in fields(LadderConfig):
+        if config_field.init and config_field.name == key:
+            return _PARSERS[config_field.type](text)
+    raise ValueError(f"unknown setting {key}")
+
+class ConfigWatcher:
+    """Polls a config file and calls on_change whenever its modification time or size changes"""
+    def __init__(self, file_path, on_change, interval=CONFIG_POLL_SECONDS):
+        self.file_path = file_path
+        self.on_change = on_change
+        self.interval = interval
+
+    def stat(self):
+        try:
+            result = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return (result.st_mtime_ns, result.st_size)
+
+    async def run(self):
+        last_seen = self.stat()
+        while True:
+            await asyncio.sleep(self.interval)
+            current = self.stat()
+            if current != last_seen:
+                last_seen = current
+                try:
+                    self.on_change()
+                except Exception as e:
+                    logging.error(f"Failed to reload {self.file_path}: {e}")
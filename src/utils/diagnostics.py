@@ -0,0 +1,111 @@
+import asyncio
+import gc
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from constants import PROFILE_SAMPLE_INTERVAL, PROFILE_MAX_SECONDS, PROFILE_TOP, TRACEMALLOC_FRAMES
+
+def frame_name(frame):
+    return f"{frame.f_globals.get('__name__')}.{frame.f_code.co_qualname}"
+
+def sample_stacks(thread_id, seconds, interval=PROFILE_SAMPLE_INTERVAL):
+    """Samples thread_id's stack every `interval` seconds for `seconds`. Returns a Counter of stacks, each a tuple of frame names outermost first"""
+    stacks = Counter()
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            stacks[tuple(reversed(stack))] += 1
+        time.sleep(interval)
+    return stacks
+
+def count_instances(cls):
+    """Number of live objects that are instances of cls. Walks every tracked object, so only call it on demand"""
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, cls))
+
+class Diagnostics:
+    """On demand CPU and memory profiling of the running bot, for admins.
+
+    profile() samples the event loop thread's stack from another thread, so it costs the loop nothing
+    while it runs. memory_report() diffs tracemalloc snapshots between calls, along with the sizes
+    from sizes(), a callable returning a dict of name: size for structures worth watching. A size
+    can also be a callable, for counts too slow to take on the event loop.
+    """
+    def __init__(self, sizes=dict):
+        self.sizes = sizes
+        self.last_snapshot = None
+        self.last_sizes = {}
+        self.lock = asyncio.Lock()  # One profile at a time, overlapping ones would sample each other
+        self.memory_lock = asyncio.Lock()  # One memory report at a time, they share the last snapshot
+
+    async def profile(self, seconds):
+        """Samples the event loop for up to PROFILE_MAX_SECONDS. Returns the samples as a Counter of stacks"""
+        seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+        async with self.lock:
+            return await asyncio.to_thread(sample_stacks, threading.get_ident(), seconds)
+
+    def format_profile(self, stacks, folded=False):
+        """Renders samples as folded stacks (for flame graph tools) or as a summary of the hottest functions"""
+        if folded:
+            return "\n".join(f"{';'.join(stack)} {count}" for stack, count in stacks.most_common())
+
+        total = sum(stacks.values())
+        own, inclusive = Counter(), Counter()
+        for stack, count in stacks.items():
+            own[stack[-1]] += count
+            for name in set(stack):
+                inclusive[name] += count
+        lines = [f"{total} samples"]
+        lines.append("\nTop functions by own time:")
+        lines += [f"{100 * count / total:6.1f}%  {name}" for name, count in own.most_common(PROFILE_TOP)]
+        lines.append("\nTop functions including callees:")
+        lines += [f"{100 * count / total:6.1f}%  {name}" for name, count in inclusive.most_common(PROFILE_TOP)]
+        lines.append("\nTop stacks:")
+        lines += [f"{count:6d}  {' > '.join(stack[-6:])}" for stack, count in stacks.most_common(PROFILE_TOP)]
+        return "\n".join(lines)
+
+    async def memory_report(self):
+        """Takes a tracemalloc snapshot and reports what grew since the previous call.
+
+        The first call starts tracing and only takes the baseline. Snapshotting and comparing take
+        seconds on a large heap, so they run in a thread and the event loop keeps going meanwhile.
+        """
+        sizes = self.sizes()  # Read on the loop, the structures aren't safe to walk from another thread
+        async with self.memory_lock:
+            return await asyncio.to_thread(self.build_memory_report, sizes)
+
+    def build_memory_report(self, sizes):
+        sizes = {name: size() if callable(size) else size for name, size in sizes.items()}
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+
+        lines = [f"Traced memory: {current / 1024:.0f} KiB (peak {peak / 1024:.0f} KiB)"]
+        if self.last_snapshot is None:
+            lines.append("Baseline taken, call again to see what grew")
+        else:
+            lines.append("\nLargest growth since the last snapshot:")
+            for stat in snapshot.compare_to(self.last_snapshot, "lineno")[:PROFILE_TOP]:
+                lines.append(f"{stat.size_diff / 1024:+9.1f} KiB {stat.count_diff:+7d} blocks  {stat.traceback}")
+
+        lines.append("\nStructure sizes:")
+        for name, size in sizes.items():
+            change = f" ({size - self.last_sizes[name]:+d})" if name in self.last_sizes else ""
+            lines.append(f"{name}: {size}{change}")
+
+        self.last_snapshot, self.last_sizes = snapshot, sizes
+        return "\n".join(lines)
+
+    def stop_tracing(self):
+        tracemalloc.stop()
+        self.last_snapshot = None
@@ -0,0 +1,125 @@
+import asyncio
+import bisect
+import logging
+from collections import Counter
+import discord
+from constants import RESPONSE_TIME_BUCKETS
+
+def interaction_age(interaction):
+    """Seconds since Discord created the interaction, which is what its 3 second deadline counts from"""
+    return (discord.utils.utcnow() - created_at(interaction)).total_seconds()
+
+def created_at(interaction):
+    # py-cord's Interaction has no created_at, but its id is a snowflake holding the creation time
+    return discord.utils.snowflake_time(interaction.id)
+
+class ResponseTimes:
+    """Histogram of time to first response per command, bucketed by RESPONSE_TIME_BUCKETS"""
+    def __init__(self, buckets=RESPONSE_TIME_BUCKETS):
+        self.buckets = buckets
+        self.counts = {}  # Format: command name: [count per bucket, then count over the last bucket]
+        self.slowest = {}  # Format: command name: slowest response in seconds
+
+    def record(self, command, seconds):
+        if command not in self.counts:
+            self.counts[command] = [0] * (len(self.buckets) + 1)
+        self.counts[command][bisect.bisect_left(self.buckets, seconds)] += 1
+        self.slowest[command] = max(seconds, self.slowest.get(command, 0.0))
+
+    def labels(self):
+        return [f"<={bound}s" for bound in self.buckets] + [f">{self.buckets[-1]}s"]
+
+class WatchedResponse(discord.InteractionResponse):
+    """An interaction's response that sets `sent` and notes the time as soon as anything responds to it.
+
+    py-cord sends every response (defer, send_message, edit_message, send_modal) through
+    _locked_response, which holds the interaction's response lock and refuses a second response. So
+    the watchdog's defer and the command's own first response can't both go out, and the watchdog
+    can wait on `sent` instead of checking is_done().
+    """
+    __slots__ = ("sent", "sent_at")
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.sent = asyncio.Event()
+        self.sent_at = None
+
+    async def _locked_response(self, coro):
+        await super()._locked_response(coro)
+        self.sent_at = discord.utils.utcnow()
+        self.sent.set()
+
+def watch_response(interaction):
+    """Makes interaction.response a WatchedResponse, unless it has already been responded to. Returns it"""
+    response = interaction.response
+    if not isinstance(response, WatchedResponse) and not response.is_done():
+        interaction._cs_response = response = WatchedResponse(interaction)  # Where Interaction.response caches it
+    return response
+
+async def defer_once(ctx, ephemeral=False):
+    """Defers ctx unless it has already been responded to, which the watchdog may have done at any await"""
+    if ctx.interaction.response.is_done():
+        return
+    try:
+        await ctx.defer(ephemeral=ephemeral)
+    except discord.InteractionResponded:
+        pass  # The watchdog's defer was already on its way
+
+class InteractionWatchdog:
+    """Defers interactions whose command hasn't responded within the budget, and times first responses.
+
+    Call start() before a command runs and finish() after it. An interaction that's already past the
+    budget when its command starts (because the event loop was busy) is deferred straight away, before
+    the command can block the loop again. Otherwise a task waits for the command's first response
+    until the budget runs out. Commands can respond with ctx.respond either way, and should defer
+    with defer_once rather than ctx.defer.
+    """
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.response_times = ResponseTimes()
+        self.auto_deferred = Counter()  # Format: command name: times deferred by the watchdog
+        self.watches = {}  # Format: interaction id: asyncio.Task
+
+    async def defer(self, ctx, ephemeral):
+        name = ctx.command.qualified_name
+        try:
+            await ctx.defer(ephemeral=ephemeral)
+        except discord.InteractionResponded:
+            return  # The command's own response got in first
+        except discord.HTTPException as e:
+            self.logger.warning(f"Couldn't defer /{name}: {e}")
+            return
+        self.auto_deferred[name] += 1
+        self.logger.warning(f"Deferred /{name} {interaction_age(ctx.interaction):.2f}s after it was created")
+
+    def record(self, ctx, response):
+        # Times the first response, or now if nothing has responded
+        sent_at = getattr(response, "sent_at", None) or discord.utils.utcnow()
+        self.response_times.record(ctx.command.qualified_name, (sent_at - created_at(ctx.interaction)).total_seconds())
+
+    async def start(self, ctx, budget, ephemeral=False):
+        response = watch_response(ctx.interaction)
+        if response.is_done():
+            self.record(ctx, response)
+            return
+        if interaction_age(ctx.interaction) >= budget:
+            await self.defer(ctx, ephemeral)
+            self.record(ctx, response)
+            return
+        self.watches[ctx.interaction.id] = asyncio.create_task(self.watch(ctx, response, budget, ephemeral))
+
+    async def watch(self, ctx, response, budget, ephemeral):
+        try:
+            await asyncio.wait_for(response.sent.wait(), budget - interaction_age(ctx.interaction))
+        except asyncio.TimeoutError:
+            await self.defer(ctx, ephemeral)
+        self.record(ctx, response)
+
+    def finish(self, ctx):
+        task = self.watches.pop(ctx.interaction.id, None)
+        if task is None or task.done():
+            return
+        task.cancel()
+        # The command responded and returned before the task woke up, or never responded at all
+        if ctx.interaction.response.is_done():
+            self.record(ctx, ctx.interaction.response)
@@ -0,0 +1,112 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from collections import Counter, deque
+from constants import LOG_BUFFER_SIZE, LOG_MAX_BYTES, LOG_BACKUPS
+
+class LogBuffer:
+    """Bounded queue of log records between the threads that log and the thread that writes them.
+
+    When it's full, the least important record goes: a new record no more important than anything
+    waiting is dropped, otherwise the oldest waiting record of the lowest level is pushed out. So
+    DEBUG goes first and a burst of it can never hold up a warning. Drops are counted and reported by
+    a warning the next time the writer takes a record. Records of each level wait in their own deque,
+    tagged with a sequence number so they still come out in the order they were logged.
+    """
+    def __init__(self, size=LOG_BUFFER_SIZE):
+        self.size = size
+        self.levels = {}  # Format: levelno: deque of (sequence number, record)
+        self.count = 0
+        self.seq = 0
+        self.sentinel = False  # QueueListener.stop() puts None, which is never dropped
+        self.dropped = Counter()  # Format: level name: records dropped since the last report
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+
+    def put_nowait(self, record):
+        with self.lock:
+            if record is None:
+                self.sentinel = True
+            elif self.count < self.size or self._drop_for(record):
+                self.seq += 1
+                self.levels.setdefault(record.levelno, deque()).append((self.seq, record))
+                self.count += 1
+            self.not_empty.notify()
+
+    def _drop_for(self, record):
+        # Makes room for record if something less important is waiting. Returns whether it can be added
+        lowest = min(level for level, waiting in self.levels.items() if waiting)
+        if record.levelno <= lowest:
+            self.dropped[record.levelname] += 1
+            return False
+        _, dropped = self.levels[lowest].popleft()
+        self.dropped[dropped.levelname] += 1
+        self.count -= 1
+        return True
+
+    def get(self, block=True):
+        with self.lock:
+            while not self.count and not self.sentinel and not self.dropped:
+                if not block:
+                    raise queue.Empty
+                self.not_empty.wait()
+            if self.dropped:
+                return self._drop_report()
+            if not self.count:
+                self.sentinel = False
+                return None
+            oldest = min((waiting for waiting in self.levels.values() if waiting), key=lambda waiting: waiting[0][0])
+            self.count -= 1
+            return oldest.popleft()[1]
+
+    def _drop_report(self):
+        counts = ", ".join(f"{count} {level}" for level, count in self.dropped.items())
+        self.dropped.clear()
+        return logging.LogRecord(__name__, logging.WARNING, __file__, 0, f"Log buffer full, dropped {counts} record(s)", None, None)
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log collectors"""
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+def setup_logging(path, level=logging.INFO, json_lines=False, rotate_when=None, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS, console=True):
+    """Routes every log record through a LogBuffer to a writer thread, so logging never waits on disk.
+
+    The log file rotates at `rotate_when` (a TimedRotatingFileHandler `when`, like "midnight") if
+    given, otherwise once it reaches max_bytes, keeping `backups` old files. Returns the started
+    QueueListener, which is stopped at exit so buffered records are written out.
+    """
+    if rotate_when:
+        file_handler = logging.handlers.TimedRotatingFileHandler(path, when=rotate_when, backupCount=backups, encoding="utf-8")
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    handlers = [file_handler]
+    if console:
+        handlers.append(logging.StreamHandler())
+
+    formatter = JsonFormatter() if json_lines else logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    buffer = LogBuffer()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(buffer))  # Formats the message on the logging thread, the writer adds the rest
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(buffer, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from constants import LOOP_LAG_INTERVAL, LOOP_LAG_THRESHOLD, LOOP_STALLS_KEPT
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COGS_DIR = os.path.join(SRC_DIR, "cogs")
+
+def blame(frame):
+    """Names the code a stack is stuck in: the innermost cog frame, else the innermost frame of our own source, else the innermost frame"""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    for directory in (COGS_DIR, SRC_DIR, ""):
+        for f in frames:
+            if f.f_code.co_filename.startswith(directory):
+                return f"{f.f_globals.get('__name__')}.{f.f_code.co_qualname} line {f.f_lineno}"
+    return None
+
+class LoopLagMonitor:
+    """Measures how late the event loop runs a timer, and finds out what blocked it when it's late.
+
+    A coroutine sleeps for `interval` and measures how much longer than that it took to wake up. A
+    watchdog thread checks in on it, and while a wake up is more than `threshold` overdue it takes the
+    loop thread's stack, since whatever is on it is what's blocking the loop. Stalls are logged with
+    that stack and the last LOOP_STALLS_KEPT are kept for the health server.
+    """
+    def __init__(self, interval=LOOP_LAG_INTERVAL, threshold=LOOP_LAG_THRESHOLD, history=LOOP_STALLS_KEPT):
+        self.logger = logging.getLogger(__name__)
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = 0.0  # Lag of the latest wake up, in seconds
+        self.max_lag = 0.0
+        self.stall_count = 0
+        self.stalls = deque(maxlen=history)  # Latest stalls as dicts, oldest first
+        self.current = None  # (beat number, monotonic time the current sleep started), swapped as one so the thread reads a matching pair
+        self.captured = {}  # Format: beat number: (culprit, stack) taken by the watchdog thread while that beat was overdue
+        self.loop_thread_id = None
+        self.stopped = threading.Event()
+
+    async def run(self):
+        # Measures lag until cancelled
+        self.loop_thread_id = threading.get_ident()
+        self.stopped.clear()
+        threading.Thread(target=self.watch, name="loop-lag-watchdog", daemon=True).start()
+        beat = 0
+        try:
+            while True:
+                self.current = (beat, time.monotonic())
+                await asyncio.sleep(self.interval)
+                self.lag = max(0.0, time.monotonic() - self.current[1] - self.interval)
+                self.max_lag = max(self.max_lag, self.lag)
+                culprit, stack = self.captured.pop(beat, (None, None))
+                if self.lag >= self.threshold:
+                    self.record_stall(self.lag, culprit, stack)
+                beat += 1
+        finally:
+            self.stopped.set()
+
+    def watch(self):
+        # Runs in its own thread. Anything on the loop thread's stack while a beat is overdue is blocking the loop
+        while not self.stopped.wait(self.threshold / 2):
+            if self.current is None:
+                continue
+            beat, started = self.current
+            if beat in self.captured or time.monotonic() - started - self.interval < self.threshold:
+                continue
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is not None:
+                self.captured[beat] = (blame(frame), "".join(traceback.format_stack(frame)))
+
+    def record_stall(self, lag, culprit, stack):
+        self.stall_count += 1
+        self.stalls.append({"at": time.time(), "lag": round(lag, 3), "culprit": culprit})
+        if stack:
+            self.logger.warning(f"Event loop blocked for {lag:.2f}s in {culprit}:\n{stack}")
+        else:
+            self.logger.warning(f"Event loop blocked for {lag:.2f}s, it ended before the stack could be taken")
+
+    def snapshot(self):
+        """Current lag figures and recent stalls, for the health server"""
+        return {
+            "lag": round(self.lag, 3),
+            "max_lag": round(self.max_lag, 3),
+            "threshold": self.threshold,
+            "stall_count": self.stall_count,
+            "recent_stalls": list(self.stalls),
+        }
@@ -0,0 +1,75 @@
+import logging
+import time
+from collections import OrderedDict
+import discord
+from constants import MEMBER_CACHE_SIZE, MEMBER_CACHE_SECONDS
+
+def member_cache_options(mode):
+    """Bot keyword arguments for a MEMBER_CACHE mode.
+
+    "full" chunks every guild at startup and caches every member, as py-cord does by default. "lazy"
+    caches no members (apart from the bot's own), so startup and memory don't grow with the server,
+    and members are looked up on demand through a MemberResolver.
+    """
+    if mode == "full":
+        return {}
+    if mode == "lazy":
+        return {"chunk_guilds_at_startup": False, "member_cache_flags": discord.MemberCacheFlags.none()}
+    raise ValueError(f"Unknown member cache mode {mode!r}, expected 'full' or 'lazy'")
+
+class MemberResolver:
+    """Finds guild members whether or not py-cord has them cached.
+
+    Looks in py-cord's member cache first, then in an LRU of the last `size` members fetched, and
+    finally asks Discord with fetch_member. Fetched members are kept for up to `max_age` seconds so
+    their roles and names don't go stale for long.
+    """
+    def __init__(self, size=MEMBER_CACHE_SIZE, max_age=MEMBER_CACHE_SECONDS, clock=time.monotonic):
+        self.logger = logging.getLogger(__name__)
+        self.size = size
+        self.max_age = max_age
+        self.clock = clock
+        self.members = OrderedDict()  # Format: (guild_id, member_id): (discord.Member, time fetched), least recently used first
+        self.fetches = 0  # Members fetched from Discord
+
+    def __len__(self):
+        return len(self.members)
+
+    def remember(self, member):
+        key = (member.guild.id, member.id)
+        self.members[key] = (member, self.clock())
+        self.members.move_to_end(key)
+        if len(self.members) > self.size:
+            self.members.popitem(last=False)
+
+    def forget(self, guild_id, member_id):
+        self.members.pop((guild_id, member_id), None)
+
+    def cached(self, guild, member_id):
+        # The member if py-cord or the LRU has a fresh copy, without asking Discord
+        member = guild.get_member(member_id)
+        if member is not None:
+            return member
+        key = (guild.id, member_id)
+        entry = self.members.get(key)
+        if entry is None:
+            return None
+        if self.clock() - entry[1] > self.max_age:
+            del self.members[key]
+            return None
+        self.members.move_to_end(key)
+        return entry[0]
+
+    async def get(self, guild, member_id):
+        """The member with member_id, or None if they aren't in the guild"""
+        member = self.cached(guild, member_id)
+        if member is not None:
+            return member
+        try:
+            member = await guild.fetch_member(member_id)
+        except discord.NotFound:
+            return None
+        self.fetches += 1
+        self.logger.debug(f"Fetched member {member_id} of guild {guild.id}")
+        self.remember(member)
+        return member
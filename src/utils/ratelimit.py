@@ -0,0 +1,49 @@
+import time
+from collections import Counter, OrderedDict
+import discord
+from constants import RATE_LIMIT_BUCKETS
+
+class RateLimited(discord.CheckFailure):
+    """Raised by the cog's check when a user has used a command more often than its rate limit allows"""
+    def __init__(self, command, retry_after):
+        self.command = command
+        self.retry_after = retry_after  # Seconds until the user can use the command again
+        super().__init__(f"/{command} is rate limited for another {retry_after:.1f}s")
+
+class RateLimiter:
+    """Token buckets keyed by (guild_id, user_id, command).
+
+    A bucket holds up to `uses` tokens and refills at uses/seconds tokens a second, so a user can
+    use a command `uses` times at once and then keeps to that many every `seconds`. Buckets are
+    updated when used rather than on a timer, and only the `size` most recently used are kept. A
+    dropped bucket starts again full, which is where it would have refilled to for anyone who hasn't
+    used a command in a while.
+    """
+    def __init__(self, size=RATE_LIMIT_BUCKETS, clock=time.monotonic):
+        self.size = size
+        self.clock = clock
+        self.buckets = OrderedDict()  # Format: (guild_id, user_id, command): (tokens, time last used), least recently used first
+        self.allowed = Counter()  # Format: command name: uses let through
+        self.limited = Counter()  # Format: command name: uses refused
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def acquire(self, key, uses, seconds):
+        # Takes a token from key's bucket. Returns 0 if there was one, otherwise the seconds until there will be
+        now = self.clock()
+        rate = uses / seconds
+        tokens, last_used = self.buckets.pop(key, (uses, now))
+        tokens = min(uses, tokens + (now - last_used) * rate)
+        command = key[-1]
+        if tokens >= 1:
+            tokens -= 1
+            retry_after = 0
+            self.allowed[command] += 1
+        else:
+            retry_after = (1 - tokens) / rate
+            self.limited[command] += 1
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.size:
+            self.buckets.popitem(last=False)
+        return retry_after
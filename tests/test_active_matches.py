@@ -0,0 +1,118 @@
+import unittest
+import sqlite3
+import sys
+import os
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from cogs.active_matches import ActiveMatches, MatchStore, open_match_guilds
+from cogs.custom_views import custom_id, parse_custom_id
+from cogs.database import setup_database
+from cogs.matchmaking import MatchmakingEngine
+from utils.config import LadderConfig
+
+def daniel(discord_id, character, dan):
+    return {"player_name": f"Player{discord_id}", "discord_id": discord_id, "character": character, "dan": dan}
+
+class TestActiveMatches(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.active = ActiveMatches(clock=lambda: self.now)
+
+    def test_lookup_by_player(self):
+        """Test matches are found by id and by either player, and ending one only works once."""
+        match = self.active.start(daniel(1, "Hyde", 1), daniel(2, "Linne", 1))
+
+        self.assertIs(self.active.get(match.match_id), match)
+        self.assertIs(self.active.for_player(2), match)
+        self.assertIs(self.active.end(match.match_id), match)
+        self.assertIsNone(self.active.end(match.match_id))
+        self.assertIsNone(self.active.for_player(1))
+        self.assertEqual(len(self.active), 0)
+
+    def test_expiry(self):
+        """Test only matches older than the expiry are returned, oldest first."""
+        first = self.active.start(daniel(1, "Hyde", 1), daniel(2, "Linne", 1))
+        self.now = 1500.0
+        self.active.start(daniel(3, "Hyde", 1), daniel(4, "Linne", 1))
+
+        self.assertEqual(self.active.expires_at(600), 1600.0)
+        self.assertIsNone(self.active.expires_at(0))
+        self.now = 1700.0
+        self.assertEqual(self.active.expired(600), [first])
+        self.assertEqual(self.active.expired(0), [])
+
+class TestMatchExpiry(unittest.TestCase):
+    def test_expired_match_frees_slot(self):
+        """Test an unreported match expires, frees its slot and can't be reported afterwards."""
+        now = [1000.0]
+        engine = MatchmakingEngine(1, LadderConfig.from_dict({"max_active_matches": 1, "match_expiry_seconds": 60}), clock=lambda: now[0])
+        engine.add_to_queue(daniel(1, "Hyde", 1))
+        engine.add_to_queue(daniel(2, "Linne", 1))
+        engine.matchmake()
+        match = engine.active.for_player(1)
+
+        engine.add_to_queue(daniel(3, "Hyde", 1))
+        engine.add_to_queue(daniel(4, "Linne", 1))
+        self.assertFalse(engine.has_legal_pair())
+        self.assertEqual(engine.seconds_until_match_expires(), 60)
+
+        now[0] = 1061.0
+        self.assertEqual(engine.expire_matches(), [match])
+        self.assertFalse(engine.is_in_match(1))
+        self.assertTrue(engine.has_legal_pair())
+        self.assertIsNone(engine.end_match(match.match_id))
+
+class TestMatchStore(unittest.TestCase):
+    def setUp(self):
+        self.con = sqlite3.connect(":memory:")
+        self.con.row_factory = sqlite3.Row
+        setup_database(self.con)
+        for discord_id, character in ((1, "Hyde"), (2, "Linne"), (3, "Hyde")):
+            self.con.execute("INSERT INTO users (guild_id, discord_id, player_name, nickname) VALUES (100, ?, ?, ?)", (discord_id, f"Player{discord_id}", f"Player{discord_id}"))
+            self.con.execute("INSERT INTO players VALUES (100, ?, ?, 1, 0)", (discord_id, character))
+
+    def tearDown(self):
+        self.con.close()
+
+    def test_open_matches_survive_restart(self):
+        """Test open matches and their message ids are read back, and their players are kept out of the queue."""
+        engine = MatchmakingEngine(100, LadderConfig.from_dict({}), store=MatchStore(self.con, 100))
+        engine.add_to_queue(daniel(1, "Hyde", 1))
+        engine.add_to_queue(daniel(2, "Linne", 1))
+        engine.matchmake()
+        match = engine.active.for_player(1)
+        match.report_message = (10, 11)
+        engine.active.update(match)
+
+        restarted = MatchmakingEngine(100, LadderConfig.from_dict({}), store=MatchStore(self.con, 100))
+        restored = restarted.active.get(match.match_id)
+
+        self.assertEqual(open_match_guilds(self.con), [100])
+        self.assertEqual(restored.report_message, (10, 11))
+        self.assertIsNone(restored.ongoing_message)
+        self.assertEqual(restored.p2['nickname'], "Player2")
+        self.assertTrue(restarted.is_in_match(1) and restarted.is_in_match(2))
+
+        restarted.end_match(match.match_id)
+        self.assertEqual(open_match_guilds(self.con), [])
+
+    def test_unregistered_player_drops_match(self):
+        """Test a stored match is dropped if one of its players unregistered while the bot was down."""
+        store = MatchStore(self.con, 100)
+        ActiveMatches(store=store).start(daniel(1, "Hyde", 1), daniel(3, "Hyde", 1))
+        self.con.execute("DELETE FROM players WHERE discord_id=3")
+
+        self.assertEqual(store.load(), [])
+        self.assertEqual(open_match_guilds(self.con), [])
+
+class TestCustomIds(unittest.TestCase):
+    def test_round_trip(self):
+        """Test our custom_ids parse back to their action and id, and other custom_ids are ignored."""
+        self.assertEqual(parse_custom_id(custom_id("report", 42)), ("report", 42))
+        self.assertIsNone(parse_custom_id("some_other_bot:report:42"))
+        self.assertIsNone(parse_custom_id(custom_id("report", "x")))
+
+if __name__ == "__main__":
+    unittest.main()
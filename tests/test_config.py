@@ -0,0 +1,84 @@
+import unittest
+import asyncio
+import tempfile
+import json
+import sys
+import os
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from utils.config import LadderConfig, ConfigWatcher, parse_config_value
+
+class TestConfig(unittest.IsolatedAsyncioTestCase):
+    def test_config_is_read_only(self):
+        """Test a built config can't be changed in place, only replaced."""
+        config = LadderConfig.from_dict({"max_active_matches": 3})
+        with self.assertRaises(AttributeError):
+            config.max_active_matches = 4
+
+        replaced = config.replace(max_active_matches=4)
+        self.assertEqual(config.max_active_matches, 3)
+        self.assertEqual(replaced.max_active_matches, 4)
+
+    def test_config_validation(self):
+        """Test values are coerced to their setting's type and out of range values are rejected."""
+        config = LadderConfig.from_dict({"total_dans": "12", "queue_status": "off", "ACTIVE_MATCHES_CHANNEL_ID": "123", "bot_token": "x"})
+        self.assertEqual(config.total_dans, 12)
+        self.assertFalse(config.queue_status)
+        self.assertEqual(config.ACTIVE_MATCHES_CHANNEL_ID, 123)
+
+        with self.assertRaises(ValueError):
+            LadderConfig.from_dict({"max_active_matches": 0})
+        with self.assertRaises(ValueError):
+            LadderConfig.from_dict({"total_dans": 5, "minimum_derank": 6})
+        with self.assertRaises(ValueError):
+            LadderConfig.from_dict({"point_rollover": "maybe"})
+
+    def test_character_lookups(self):
+        """Test the alias, validity and autocomplete lookups built from the character settings."""
+        config = LadderConfig.from_dict({"characters": ["Hyde", "Linne", "Londrekia"], "character_aliases": {"HY": "Hyde"}})
+        self.assertEqual(config.alias_lookup["hy"], "Hyde")
+        self.assertIn("Linne", config.character_set)
+        self.assertEqual(config.prefix_index["l"], ("Linne", "Londrekia"))
+        self.assertEqual(config.prefix_index[""], ("Hyde", "Linne", "Londrekia"))
+        self.assertEqual(config.emoji_mapping["Hyde"], "")
+
+    def test_rate_limits(self):
+        """Test rate limits are parsed into (uses, seconds) and malformed ones are rejected."""
+        config = LadderConfig.from_dict({"rate_limits": {"joinqueue": "5/30", "leaderboard": "1/2.5"}})
+        self.assertEqual(config.rate_limit_lookup["joinqueue"], (5, 30.0))
+        self.assertEqual(config.rate_limit_lookup["leaderboard"], (1, 2.5))
+        for bad in ("5", "0/30", "5/0", "five/30"):
+            with self.assertRaises(ValueError):
+                LadderConfig.from_dict({"rate_limits": {"joinqueue": bad}})
+
+    def test_parse_config_value(self):
+        """Test /setconfig values are parsed by the setting's type."""
+        self.assertEqual(parse_config_value("recent_opponents_limit", " 4 "), 4)
+        self.assertTrue(parse_config_value("point_rollover", "yes"))
+        self.assertEqual(parse_config_value("matchmaking_debounce", "1.5"), 1.5)
+        with self.assertRaises(ValueError):
+            parse_config_value("total_dans", "ten")
+        with self.assertRaises(ValueError):
+            parse_config_value("bot_token", "x")
+
+    async def test_watcher_sees_edits(self):
+        """Test the watcher calls back once the file changes on disk."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "config.json")
+            with open(path, "w") as f:
+                json.dump({"total_dans": 10}, f)
+
+            changed = asyncio.Event()
+            task = asyncio.create_task(ConfigWatcher(path, changed.set, interval=0.01).run())
+            await asyncio.sleep(0.03)
+            self.assertFalse(changed.is_set())
+
+            with open(path, "w") as f:
+                json.dump({"total_dans": 12}, f)
+            await asyncio.wait_for(changed.wait(), 1)
+            task.cancel()
+
+if __name__ == "__main__":
+    unittest.main()
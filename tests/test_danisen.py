@@ -1,6 +1,10 @@
 import unittest
 import coverage
 import json
+import asyncio
+import tempfile
+from time import time
+from datetime import timedelta
 from unittest.mock import AsyncMock, MagicMock, patch
 from collections import deque
 import logging
@@ -27,6 +31,8 @@ def mock_slash_command(*args, **kwargs):
 patch("discord.commands.slash_command", mock_slash_command).start()
 
 from cogs.danisen import Danisen  # Import after patching
+from constants import DEFAULT_CONFIG
+from cogs.custom_views import handle_report, handle_requeue
 import discord
 
 class TestDanisen(unittest.IsolatedAsyncioTestCase):
@@ -186,7 +192,7 @@ class TestDanisen(unittest.IsolatedAsyncioTestCase):
 
     async def test_leaderboard(self):
         """Test viewing the leaderboard."""
-        self.mock_database_response(fetchall=[
+        self.mock_database_response(fetchone={"total": 2}, fetchall=[
             {"name": "Player1 Hyde", "value": "Dan: 2 Points: 3"},
             {"name": "Player2 Linne", "value": "Dan: 1 Points: 1"}
         ])
@@ -201,7 +207,7 @@ class TestDanisen(unittest.IsolatedAsyncioTestCase):
 
         await self.danisen.update_max_matches(self.ctx, max_matches)
 
-        self.assertEqual(self.danisen.max_active_matches, 5)
+        self.assertEqual(self.danisen.get_config(self.ctx.guild_id).max_active_matches, 5)
         self.ctx.respond.assert_called_with("Max matches updated to 5")
 
     async def test_unregister_player_in_match(self):
@@ -533,11 +539,244 @@ class TestDanisen(unittest.IsolatedAsyncioTestCase):
 
     async def test_matchmake_insufficient_players(self):
         """Test matchmaking when there are fewer than two players in the queue."""
-        self.danisen.matchmaking_queue.append({"player_name": "Player1", "dan": 1})
+        engine = self.danisen.get_engine(self.ctx.interaction.guild_id)
+        engine.matchmaking_queue.append({"player_name": "Player1", "dan": 1})
 
         await self.danisen.matchmake(self.ctx.interaction)
 
-        self.assertEqual(len(self.danisen.matchmaking_queue), 1)
+        self.assertEqual(len(engine.matchmaking_queue), 1)
+
+    async def test_guilds_have_separate_queues(self):
+        """Test each guild gets its own matchmaking engine and config."""
+        engine1 = self.danisen.get_engine(1)
+        engine2 = self.danisen.get_engine(2)
+        engine1.add_to_queue({"player_name": "Player1", "discord_id": 12345, "character": "Hyde", "dan": 1})
+
+        self.assertIsNot(engine1, engine2)
+        self.assertIs(engine1, self.danisen.get_engine(1))
+        self.assertTrue(engine1.is_queued(12345, "Hyde"))
+        self.assertFalse(engine2.is_queued(12345, "Hyde"))
+        self.assertEqual(len(engine2.matchmaking_queue), 0)
+
+        self.danisen.set_runtime_config(1, max_active_matches=1)
+        self.assertNotEqual(self.danisen.get_config(2).max_active_matches, 1)
+
+    async def test_queue_usable_while_match_announced(self):
+        """Test the queue can be joined while a match announcement is still waiting on Discord."""
+        engine = self.danisen.get_engine(self.ctx.interaction.guild_id)
+        engine.add_to_queue({"player_name": "Player1", "discord_id": 1, "character": "Hyde", "dan": 1})
+        engine.add_to_queue({"player_name": "Player2", "discord_id": 2, "character": "Linne", "dan": 1})
+
+        announcing = asyncio.Event()
+        release = asyncio.Event()
+        async def slow_announce(ctx, daniel1, daniel2):
+            announcing.set()
+            await release.wait()
+        self.danisen.create_match_interaction = slow_announce
+
+        task = asyncio.create_task(self.danisen.matchmake(self.ctx.interaction))
+        await announcing.wait()
+
+        self.assertTrue(engine.is_in_match(1) and engine.is_in_match(2))
+        engine.add_to_queue({"player_name": "Player3", "discord_id": 3, "character": "Hyde", "dan": 1})
+        self.assertTrue(engine.is_queued(3, "Hyde"))
+
+        release.set()
+        await task
+
+    async def test_scheduler_pairs_after_join(self):
+        """Test the scheduler runs a pass once a legal pair is queued, without waiting for a fixed timer."""
+        guild_id = self.ctx.interaction.guild_id
+        self.danisen.set_runtime_config(guild_id, matchmaking_debounce=0.01, matchmaking_max_wait=0.05)
+        engine = self.danisen.get_engine(guild_id)
+        self.danisen.create_match_interaction = AsyncMock()
+
+        self.danisen.start_matchmaking_scheduler(guild_id)
+        engine.add_to_queue({"player_name": "Player1", "discord_id": 1, "character": "Hyde", "dan": 1})
+        await asyncio.sleep(0.1)
+        self.danisen.create_match_interaction.assert_not_called()
+
+        engine.add_to_queue({"player_name": "Player2", "discord_id": 2, "character": "Linne", "dan": 1})
+        await asyncio.sleep(0.1)
+        self.danisen.create_match_interaction.assert_called_once()
+
+        engine.matchmaking_coro.cancel()
+
+    async def test_has_legal_pair(self):
+        """Test the scheduler's check skips the same user, recent opponents and full match slots."""
+        engine = self.danisen.get_engine(self.ctx.interaction.guild_id)
+        engine.add_to_queue({"player_name": "Player1", "discord_id": 1, "character": "Hyde", "dan": 1})
+        engine.add_to_queue({"player_name": "Player1", "discord_id": 1, "character": "Linne", "dan": 1})
+        self.assertFalse(engine.has_legal_pair())
+
+        engine.add_to_queue({"player_name": "Player2", "discord_id": 2, "character": "Hyde", "dan": 1})
+        self.assertTrue(engine.has_legal_pair())
+
+        engine.recent.record(2, "Hyde", 1, played_at=time() - 100)
+        self.assertFalse(engine.has_legal_pair())
+
+        engine.recent.configure(engine.config.recent_opponents_limit, 60)
+        self.assertTrue(engine.has_legal_pair())
+        engine.active.store = None  # The database is a mock, so fill the slots in memory only
+        for discord_id in range(engine.config.max_active_matches):
+            engine.active.start({"discord_id": 100 + 2 * discord_id}, {"discord_id": 101 + 2 * discord_id})
+        self.assertFalse(engine.has_legal_pair())
+
+    async def test_update_config_keeps_config_on_bad_file(self):
+        """Test a broken config file is ignored and a fixed one is swapped in, keeping runtime changes."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.danisen.config_path = os.path.join(tmp_dir, "config.json")
+            engine = self.danisen.get_engine(1)
+            self.danisen.set_runtime_config(1, queue_status=False)
+
+            with open(self.danisen.config_path, "w") as f:
+                f.write("{ not json")
+            self.assertFalse(self.danisen.update_config())
+            self.assertIs(engine.config, self.danisen.get_config(1))
+
+            with open(self.danisen.config_path, "w") as f:
+                json.dump({"max_active_matches": 2, "guilds": {"1": {"total_dans": 12}}}, f)
+            self.assertTrue(self.danisen.update_config())
+            self.assertEqual(engine.config.max_active_matches, 2)
+            self.assertEqual(engine.config.total_dans, 12)
+            self.assertIn(12, engine.dans_in_queue)
+            self.assertFalse(engine.config.queue_status)
+
+    async def reset_season(self):
+        # Runs /resetseason for guild 1 without touching the database
+        self.ctx.guild_id = 1
+        self.ctx.interaction.response.is_done = MagicMock(return_value=False)
+        with patch("cogs.danisen.rollover_season", AsyncMock(return_value=("season.db", 2))):
+            await self.danisen.reset_season(self.ctx)
+
+    async def test_reset_season_restores_runtime_config(self):
+        """Test the rollover's queue closure doesn't leave queue_status pinned against config.json."""
+        await self.reset_season()
+        self.assertNotIn(1, self.danisen.runtime_overrides)
+
+        self.danisen.set_runtime_config(1, point_multiplier=2)
+        await self.reset_season()
+        self.assertEqual(self.danisen.runtime_overrides[1], {"point_multiplier": 2})
+
+    async def test_report_after_reset_season(self):
+        """Test a match opened before a rollover can't be reported afterwards with the old season's dans."""
+        engine = self.danisen.get_engine(1)
+        engine.active.store = None  # The database is a mock, so keep matches in memory only
+        match = engine.active.start({"discord_id": 1, "character": "Hyde", "dan": 5, "points": 2.0}, {"discord_id": 2, "character": "Linne", "dan": 5, "points": 0.0})
+        engine.sessions.set_in_match(1, True)
+        engine.sessions.set_in_match(2, True)
+        await self.reset_season()
+        self.assertFalse(engine.is_in_match(1))
+
+        interaction = MagicMock()
+        interaction.guild_id = 1
+        interaction.user.id = 1
+        interaction.data = {"values": ["player1"]}
+        interaction.response.defer = AsyncMock()
+        interaction.respond = AsyncMock()
+        self.danisen.report_match_queue = AsyncMock()
+        await handle_report(self.danisen, interaction, match.match_id)
+
+        self.danisen.report_match_queue.assert_not_called()
+        interaction.respond.assert_awaited_once_with("This match has already been reported, cancelled or expired.", ephemeral=True)
+
+    async def test_requeue_button_works_once(self):
+        """Test a player can only rejoin the queue once from a reported match's button."""
+        self.danisen.set_runtime_config(1, queue_status=True)
+        self.danisen.start_matchmaking_scheduler = MagicMock()
+        engine = self.danisen.get_engine(1)
+        report = {"winner_discord_id": 1, "winner_character": "Hyde", "loser_discord_id": 2, "loser_character": "Linne", "played_at": time()}
+        player = {"guild_id": 1, "discord_id": 1, "player_name": "p1", "nickname": "P1", "keyword": None, "character": "Hyde", "dan": 1, "points": 0.0}
+        self.database_cur.fetchone.side_effect = [report, player, report]
+
+        interaction = MagicMock()
+        interaction.guild_id = 1
+        interaction.user.id = 1
+        interaction.response.defer = AsyncMock()
+        interaction.respond = AsyncMock()
+        await handle_requeue(self.danisen, interaction, 5)
+        self.assertTrue(engine.is_queued(1, "Hyde"))
+
+        engine.remove_from_queue(1, "Hyde")  # Matched again, or left the queue
+        await handle_requeue(self.danisen, interaction, 5)
+        self.assertFalse(engine.is_queued(1, "Hyde"))
+        interaction.respond.assert_awaited_with(content="You've already re-joined the queue.", ephemeral=True)
+
+    async def test_match_ended_while_announcing(self):
+        """Test a match that ends while its messages are being sent has them deleted instead of stored."""
+        self.danisen.set_runtime_config(1, characters=("Hyde", "Linne"))
+        engine = self.danisen.get_engine(1)
+        engine.active.store = None  # The database is a mock, so keep matches in memory only
+        daniel1 = {"guild_id": 1, "discord_id": 1, "player_name": "p1", "nickname": "P1", "character": "Hyde", "dan": 1, "points": 0.0, "keyword": None}
+        daniel2 = {"guild_id": 1, "discord_id": 2, "player_name": "p2", "nickname": "P2", "character": "Linne", "dan": 1, "points": 0.0, "keyword": None}
+        match = engine.active.start(daniel1, daniel2)
+
+        channel = MagicMock()
+        channel.id = 10
+        channel.get_partial_message.return_value.delete = AsyncMock()
+        async def send(*args, **kwargs):
+            engine.end_match(match.match_id)  # Reported while the message was on its way
+            return MagicMock(id=20, channel=channel)
+        channel.send = send
+        self.bot.get_channel.return_value = channel
+
+        await self.danisen.create_match_interaction(None, daniel1, daniel2)
+
+        channel.get_partial_message.assert_called_once_with(20)
+        channel.get_partial_message.return_value.delete.assert_awaited_once()
+        self.assertIsNone(match.ongoing_message)
+
+    async def test_bad_runtime_config_is_not_kept(self):
+        """Test an invalid admin change is refused without breaking later config reloads."""
+        self.danisen.set_runtime_config(1, point_multiplier=2)
+        with self.assertRaises(ValueError):
+            self.danisen.set_runtime_config(1, point_multiplier=-1)
+        self.assertEqual(self.danisen.get_config(1).point_multiplier, 2)
+        self.assertEqual(self.danisen.runtime_overrides[1], {"point_multiplier": 2})
+
+        await self.danisen.set_point_multiplier(self.ctx, -1)
+        self.ctx.respond.assert_called_with("Invalid value: point_multiplier: can't be negative")
+        self.assertTrue(self.danisen.update_config())
+
+    async def run_late(self, name, command, *args):
+        # Runs a command whose interaction is already past the defer budget, so the watchdog defers it before it runs
+        self.ctx.guild_id = 1
+        self.ctx.command.qualified_name = name
+        self.ctx.interaction = MagicMock(id=discord.utils.time_snowflake(discord.utils.utcnow() - timedelta(seconds=5)))
+        self.ctx.interaction.response.is_done = MagicMock(return_value=False)
+        self.ctx.respond.reset_mock()
+        await self.danisen.cog_before_invoke(self.ctx)
+        await command(self.ctx, *args)
+        await self.danisen.cog_after_invoke(self.ctx)
+        return self.ctx.defer.call_args.kwargs["ephemeral"]
+
+    async def test_auto_deferred_replies_match_defer(self):
+        """Test replies after a watchdog defer ask for the visibility the defer already gave them."""
+        self.bot.is_owner = AsyncMock(return_value=False)
+        self.ctx.guild = MagicMock()
+        self.ctx.guild.get_member.return_value.guild_permissions.create_instant_invite = False
+        self.danisen.season_rollover_running.add(1)
+
+        for name, command, args in [
+            ("profilebot", self.danisen.profile_bot, (10,)),
+            ("getinvite", self.danisen.get_invite_link, ()),
+            ("resetseason", self.danisen.reset_season, ()),
+            ("setpointmultiplier", self.danisen.set_point_multiplier, (-1,)),
+        ]:
+            with self.subTest(name):
+                ephemeral = await self.run_late(name, command, *args)
+                self.assertEqual(ephemeral, name in self.danisen.ephemeral_commands)
+                self.ctx.respond.assert_awaited_once()
+                self.assertEqual(self.ctx.respond.call_args.kwargs.get("ephemeral", False), ephemeral)
+
+    async def test_startup_with_bad_config_file(self):
+        """Test the cog starts on default settings when the config file is broken."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_path = os.path.join(tmp_dir, "config.json")
+            with open(config_path, "w") as f:
+                f.write("{ not json")
+            danisen = Danisen(self.bot, self.database_con, config_path)
+            self.assertEqual(danisen.get_config(1).total_dans, DEFAULT_CONFIG["total_dans"])
 
     async def test_report_match_invalid_player(self):
         """Test reporting a match when one or both players do not exist."""
@@ -0,0 +1,54 @@
+import unittest
+import sqlite3
+import sys
+import os
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from cogs.database import create_tables, migrate_guild_columns, adopt_legacy_rows, table_columns, LEGACY_GUILD_ID
+from cogs.season import create_seasons_table
+
+class TestGuildMigration(unittest.TestCase):
+    def setUp(self):
+        self.con = sqlite3.connect(":memory:")
+        # Schema from before multi guild support
+        self.con.execute("CREATE TABLE users(discord_id INT PRIMARY KEY, player_name TEXT NOT NULL, nickname TEXT, keyword TEXT)")
+        self.con.execute("CREATE TABLE players(discord_id INT NOT NULL, character TEXT NOT NULL, dan INT NOT NULL, points FLOAT NOT NULL, PRIMARY KEY (discord_id, character))")
+        self.con.execute("CREATE TABLE matches(id INTEGER PRIMARY KEY, winner_discord_id INT, winner_character TEXT, loser_discord_id INT, loser_character TEXT)")
+        self.con.execute("INSERT INTO users VALUES (1, 'alice', 'Alice', NULL)")
+        self.con.execute("INSERT INTO players VALUES (1, 'Hyde', 3, 1.0)")
+        self.con.execute("INSERT INTO matches VALUES (7, 1, 'Hyde', 2, 'Linne')")
+        self.con.commit()
+
+    def tearDown(self):
+        self.con.close()
+
+    def test_migration_keeps_rows(self):
+        """Test legacy tables are rebuilt with guild_id and keep their data."""
+        create_tables(self.con)
+        migrated = migrate_guild_columns(self.con)
+
+        self.assertEqual(sorted(migrated), ["matches", "players", "users"])
+        for table in ("users", "players", "matches", "invites"):
+            self.assertIn("guild_id", table_columns(self.con, table))
+        self.assertEqual(self.con.execute("SELECT guild_id, discord_id, character, dan FROM players").fetchall(), [(LEGACY_GUILD_ID, 1, "Hyde", 3)])
+        self.assertEqual(self.con.execute("SELECT id, guild_id FROM matches").fetchall(), [(7, LEGACY_GUILD_ID)])
+        self.assertEqual(migrate_guild_columns(self.con), [])
+
+    def test_same_user_in_two_guilds(self):
+        """Test a user can register the same character in two guilds after migration."""
+        create_tables(self.con)
+        migrate_guild_columns(self.con)
+        create_seasons_table(self.con)
+        adopt_legacy_rows(self.con, 100)
+
+        self.con.execute("INSERT INTO users (guild_id, discord_id, player_name) VALUES (200, 1, 'alice')")
+        self.con.execute("INSERT INTO players (guild_id, discord_id, character, dan, points) VALUES (200, 1, 'Hyde', 1, 0)")
+
+        self.assertEqual(self.con.execute("SELECT guild_id, dan FROM players ORDER BY guild_id").fetchall(), [(100, 3), (200, 1)])
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.con.execute("INSERT INTO players (guild_id, discord_id, character, dan, points) VALUES (200, 1, 'Hyde', 1, 0)")
+
+if __name__ == "__main__":
+    unittest.main()
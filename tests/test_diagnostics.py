@@ -0,0 +1,53 @@
+import unittest
+import asyncio
+import time
+import sys
+import os
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from utils.diagnostics import Diagnostics, count_instances
+
+def busy_wait(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+class Tracked:
+    pass
+
+class TestDiagnostics(unittest.IsolatedAsyncioTestCase):
+    async def test_profile_finds_hot_function(self):
+        """Test the sampling profiler attributes loop time to the function using it."""
+        diagnostics = Diagnostics()
+
+        async def work():
+            await asyncio.sleep(0.02)
+            busy_wait(0.3)
+
+        stacks, _ = await asyncio.gather(diagnostics.profile(0.4), work())
+
+        report = diagnostics.format_profile(stacks)
+        self.assertIn("busy_wait", report.split("Top functions including callees:")[0])
+        folded = diagnostics.format_profile(stacks, folded=True)
+        self.assertTrue(any("busy_wait" in line for line in folded.splitlines()))
+
+    async def test_memory_report_diffs_sizes(self):
+        """Test memory reports start with a baseline, then show growth in watched structures."""
+        items = []
+        diagnostics = Diagnostics(lambda: {"items": len(items), "tracked": lambda: count_instances(Tracked)})
+        try:
+            self.assertIn("Baseline taken", await diagnostics.memory_report())
+            items += [Tracked() for _ in range(3)]
+            report = await diagnostics.memory_report()
+        finally:
+            diagnostics.stop_tracing()
+
+        self.assertIn("Largest growth since the last snapshot", report)
+        self.assertIn("items: 3 (+3)", report)
+        self.assertIn("tracked: 3 (+3)", report)
+        self.assertEqual(count_instances(Tracked), 3)
+
+if __name__ == "__main__":
+    unittest.main()
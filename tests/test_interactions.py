@@ -0,0 +1,126 @@
+import unittest
+import asyncio
+import sys
+import os
+from datetime import timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+import discord
+from utils.interactions import InteractionWatchdog, ResponseTimes, defer_once
+
+class Adapter:
+    # Stands in for py-cord's webhook adapter. Each interaction response takes `delay` seconds to reach Discord
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.responses = []  # Interaction response types sent, in order
+
+    async def create_interaction_response(self, *args, type, **kwargs):
+        await asyncio.sleep(self.delay)
+        self.responses.append(type)
+
+def make_ctx(age, name="profile"):
+    # Context for a real interaction created `age` seconds ago that hasn't been responded to
+    created = discord.utils.utcnow() - timedelta(seconds=age)
+    interaction = discord.Interaction(data={"id": str(discord.utils.time_snowflake(created)), "type": 2, "token": "token", "version": 1,
+                                            "application_id": "1", "data": {"id": "2", "name": name, "type": 1}}, state=MagicMock())
+    interaction._cs_followup = MagicMock(send=AsyncMock())
+    ctx = MagicMock()
+    ctx.command.qualified_name = name
+    ctx.interaction = interaction
+    ctx.defer = lambda **kwargs: interaction.response.defer(**kwargs)
+    ctx.respond = interaction.respond
+    return ctx
+
+DEFERRED = discord.InteractionResponseType.deferred_channel_message.value
+MESSAGE = discord.InteractionResponseType.channel_message.value
+
+class TestInteractions(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.adapter = Adapter()
+        patcher = patch("discord.interactions.async_context")
+        patcher.start().get.return_value = self.adapter
+        self.addCleanup(patcher.stop)
+
+    async def test_late_interaction_deferred_before_command(self):
+        """Test an interaction already past the budget is deferred before its command runs."""
+        watchdog = InteractionWatchdog()
+        ctx = make_ctx(2.5)
+
+        await watchdog.start(ctx, 2.0, ephemeral=True)
+
+        self.assertEqual(self.adapter.responses, [DEFERRED])
+        self.assertEqual(watchdog.auto_deferred["profile"], 1)
+        self.assertEqual(sum(watchdog.response_times.counts["profile"]), 1)
+
+    async def test_slow_command_deferred_at_budget(self):
+        """Test a command still awaiting when the budget runs out gets deferred."""
+        watchdog = InteractionWatchdog()
+        ctx = make_ctx(0)
+
+        await watchdog.start(ctx, 0.05)
+        await asyncio.sleep(0.1)
+        watchdog.finish(ctx)
+
+        self.assertEqual(self.adapter.responses, [DEFERRED])
+        self.assertEqual(watchdog.auto_deferred["profile"], 1)
+
+    async def test_fast_command_not_deferred(self):
+        """Test a command that responds in time is timed but not deferred."""
+        watchdog = InteractionWatchdog()
+        ctx = make_ctx(0)
+
+        await watchdog.start(ctx, 1.0)
+        await ctx.respond("Done")
+        await asyncio.sleep(0)
+        watchdog.finish(ctx)
+
+        self.assertEqual(self.adapter.responses, [MESSAGE])
+        self.assertFalse(watchdog.auto_deferred)
+        self.assertEqual(watchdog.response_times.counts["profile"][0], 1)
+
+    async def test_command_answers_after_watchdog_defer(self):
+        """Test a command that defers or responds while the watchdog's defer is on its way falls back to a followup."""
+        self.adapter.delay = 0.3
+        watchdog = InteractionWatchdog()
+        ctx = make_ctx(0)
+
+        await watchdog.start(ctx, 0.1)
+        await asyncio.sleep(0.2)  # The watchdog's defer has been sent but hasn't completed
+        self.assertFalse(ctx.interaction.response.is_done())
+        await defer_once(ctx)
+        await ctx.respond("Done")
+        watchdog.finish(ctx)
+
+        self.assertEqual(self.adapter.responses, [DEFERRED])
+        ctx.interaction.followup.send.assert_awaited_once_with("Done")
+        self.assertEqual(watchdog.auto_deferred["profile"], 1)
+
+    async def test_watchdog_yields_to_command_response(self):
+        """Test the watchdog doesn't defer when the command's own response is on its way at the budget."""
+        self.adapter.delay = 0.3
+        watchdog = InteractionWatchdog()
+        ctx = make_ctx(0)
+
+        await watchdog.start(ctx, 0.1)
+        await ctx.respond("Done")  # Still on its way when the budget runs out
+        await asyncio.sleep(0)
+        watchdog.finish(ctx)
+
+        self.assertEqual(self.adapter.responses, [MESSAGE])
+        self.assertFalse(watchdog.auto_deferred)
+
+    def test_histogram_buckets(self):
+        """Test response times land in the bucket of their upper bound, with an overflow bucket."""
+        response_times = ResponseTimes(buckets=(1, 2))
+        for seconds in (0.5, 1, 1.5, 5):
+            response_times.record("rank", seconds)
+
+        self.assertEqual(response_times.counts["rank"], [2, 1, 1])
+        self.assertEqual(response_times.slowest["rank"], 5)
+        self.assertEqual(response_times.labels(), ["<=1s", "<=2s", ">2s"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import sqlite3
+import sys
+import os
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from cogs.lazy_pages import LazyPages, list_source, query_source
+
+def format_row(idx, row):
+    return f"#{idx + 1}", str(row[0])
+
+class TestLazyPages(unittest.TestCase):
+    def test_no_rows_dropped(self):
+        """Test every row gets shown, including a partial last page."""
+        rows = [(n,) for n in range(25)]
+        embeds = LazyPages("Title", len(rows), list_source(rows), format_row, fields_per_page=11)
+
+        self.assertEqual(len(embeds), 3)
+        self.assertEqual([len(em.fields) for em in embeds], [11, 11, 3])
+        self.assertEqual(embeds[-1].fields[-1].name, "#25")
+        self.assertEqual(embeds[0].title, "Title (1/3)")
+
+    def test_empty_source(self):
+        """Test an empty source still has one page."""
+        embeds = LazyPages("Title", 0, list_source([]), format_row)
+        self.assertEqual(len(embeds), 1)
+        self.assertEqual(embeds[0].fields, [])
+
+    def test_pages_built_on_demand(self):
+        """Test only shown pages are fetched, and recently shown ones come from the cache."""
+        con = sqlite3.connect(":memory:")
+        con.execute("CREATE TABLE t (n INT)")
+        con.executemany("INSERT INTO t VALUES (?)", [(n,) for n in range(100)])
+        fetches = []
+        source = query_source(con, "SELECT n FROM t WHERE n >= ? ORDER BY n", (0,))
+        embeds = LazyPages("Title", 100, lambda offset, limit: fetches.append(offset) or source(offset, limit), format_row, fields_per_page=10, cache_size=2)
+
+        self.assertEqual(embeds[3].fields[0].value, "30")
+        embeds[4]
+        embeds[3]
+        self.assertEqual(fetches, [30, 40])
+
+        embeds[5]  # Pushes page 4 out of the cache
+        embeds[4]
+        self.assertEqual(fetches, [30, 40, 50, 40])
+        con.close()
+
+if __name__ == "__main__":
+    unittest.main()
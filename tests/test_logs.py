@@ -0,0 +1,64 @@
+import unittest
+import atexit
+import logging
+import json
+import os
+import sys
+import tempfile
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from utils.logs import LogBuffer, JsonFormatter, setup_logging
+
+def record(level, msg):
+    return logging.LogRecord("test", level, __file__, 0, msg, None, None)
+
+class TestLogBuffer(unittest.TestCase):
+    def test_drops_debug_first(self):
+        """Test a full buffer drops DEBUG records to make room for more important ones, keeping log order."""
+        buffer = LogBuffer(size=3)
+        buffer.put_nowait(record(logging.DEBUG, "d1"))
+        buffer.put_nowait(record(logging.INFO, "i1"))
+        buffer.put_nowait(record(logging.DEBUG, "d2"))
+        buffer.put_nowait(record(logging.WARNING, "w1"))  # Pushes out d1
+        buffer.put_nowait(record(logging.DEBUG, "d3"))  # Dropped, d2 is as important
+
+        report = buffer.get()
+        self.assertEqual(report.levelno, logging.WARNING)
+        self.assertIn("2 DEBUG", report.getMessage())
+        self.assertEqual([buffer.get().getMessage() for _ in range(3)], ["i1", "d2", "w1"])
+
+    def test_sentinel_after_records(self):
+        """Test the listener's stop sentinel only comes out once everything before it is written."""
+        buffer = LogBuffer(size=1)
+        buffer.put_nowait(record(logging.INFO, "i1"))
+        buffer.put_nowait(None)
+
+        self.assertEqual(buffer.get().getMessage(), "i1")
+        self.assertIsNone(buffer.get())
+
+class TestSetupLogging(unittest.TestCase):
+    def test_json_lines_written_in_background(self):
+        """Test records reach the log file as JSON lines once the writer thread is stopped."""
+        root = logging.getLogger()
+        old_handlers, old_level = root.handlers[:], root.level
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "bot.log")
+            listener = setup_logging(path, json_lines=True, console=False)
+            try:
+                logging.getLogger("test").warning("queue %s", "closed")
+            finally:
+                atexit.unregister(listener.stop)
+                listener.stop()
+                for handler in listener.handlers:
+                    handler.close()
+                root.handlers[:] = old_handlers
+                root.setLevel(old_level)
+
+            with open(path) as f:
+                entry = json.loads(f.readline())
+        self.assertEqual((entry["level"], entry["logger"], entry["message"]), ("WARNING", "test", "queue closed"))
+
+if __name__ == "__main__":
+    unittest.main()
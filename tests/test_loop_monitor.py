@@ -0,0 +1,45 @@
+import unittest
+import asyncio
+import time
+import sys
+import os
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from utils.loop_monitor import LoopLagMonitor
+
+def block_the_loop(seconds):
+    time.sleep(seconds)
+
+class TestLoopMonitor(unittest.IsolatedAsyncioTestCase):
+    async def test_stall_blamed_on_blocking_call(self):
+        """Test a blocking call on the loop is recorded as a stall and attributed to the function making it."""
+        monitor = LoopLagMonitor(interval=0.02, threshold=0.1)
+        task = asyncio.create_task(monitor.run())
+        await asyncio.sleep(0.05)
+
+        with self.assertLogs("utils.loop_monitor", level="WARNING") as logs:
+            block_the_loop(0.4)
+            await asyncio.sleep(0.05)
+        task.cancel()
+
+        self.assertEqual(monitor.stall_count, 1)
+        stall = monitor.stalls[0]
+        self.assertGreaterEqual(stall["lag"], 0.3)
+        self.assertIn("block_the_loop", stall["culprit"])
+        self.assertIn("time.sleep(seconds)", logs.output[0])
+        self.assertEqual(monitor.snapshot()["stall_count"], 1)
+
+    async def test_no_stall_when_idle(self):
+        """Test an idle loop records no stalls."""
+        monitor = LoopLagMonitor(interval=0.01, threshold=0.1)
+        task = asyncio.create_task(monitor.run())
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+        self.assertEqual(monitor.stall_count, 0)
+        self.assertLess(monitor.max_lag, 0.1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+from unittest.mock import patch
+import random
+import time
+import sys
+import os
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from cogs.matchmaking import MatchmakingEngine
+from cogs.pair_matrix import np
+from utils.config import LadderConfig
+
+def daniel(discord_id, character, dan):
+    return {"player_name": f"Player{discord_id}", "discord_id": discord_id, "character": character, "dan": dan}
+
+class TestMatchmakingEngine(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.engine = MatchmakingEngine(1, LadderConfig.from_dict({}))
+
+    def test_unmatched_player_keeps_place(self):
+        """Test a player nobody can play stays at the front and is matched first once someone can."""
+        first = daniel(1, "Hyde", 5)
+        self.engine.add_to_queue(first)
+        self.engine.add_to_queue(daniel(2, "Linne", 5))
+        self.engine.recent.record(1, "Hyde", 2)
+
+        self.assertEqual(self.engine.matchmake(), [])
+        self.assertIs(self.engine.matchmaking_queue[0], first)
+
+        self.engine.add_to_queue(daniel(3, "Linne", 5))
+        matches = self.engine.matchmake()
+
+        self.assertEqual([(d1['discord_id'], d2['discord_id']) for d1, d2 in matches], [(1, 3)])
+        self.assertEqual([d['discord_id'] for d in self.engine.matchmaking_queue], [2])
+
+    def test_dan_window_relaxes_with_wait(self):
+        """Test a large dan gap is only matched once the longer waiting player has waited long enough."""
+        self.engine.apply_config(self.engine.config.replace(rank_window_relax_seconds=10, maximum_rank_difference=1))
+        low = daniel(1, "Hyde", 1)
+        self.engine.add_to_queue(low)
+        self.engine.add_to_queue(daniel(2, "Linne", 4))
+
+        self.assertFalse(self.engine.has_legal_pair())
+        self.assertEqual(self.engine.matchmake(), [])
+
+        low['enqueued_at'] = time.monotonic() - 25
+        self.assertTrue(self.engine.has_legal_pair())
+        self.assertEqual(len(self.engine.matchmake()), 1)
+
+    def test_pair_change_wakeups_stop_once_windows_cover_queue(self):
+        """Test waiting only schedules a wakeup for when a window reaches another occupied dan, and none after that."""
+        now = 1000.0
+        engine = MatchmakingEngine(1, LadderConfig.from_dict({"rank_window_relax_seconds": 10, "maximum_rank_difference": 1}), clock=lambda: now)
+        engine.add_to_queue(daniel(1, "Hyde", 1))
+        engine.add_to_queue(daniel(2, "Linne", 4))
+        self.assertEqual(engine.seconds_until_pair_change(), 20)  # Both windows reach a gap of 3 after 20s
+
+        now = 1025.0
+        self.assertIsNone(engine.seconds_until_pair_change())
+
+        engine.recent.record(1, "Hyde", 2)  # No pair can form, but windows can't widen into anything new either
+        self.assertIsNone(engine.seconds_until_pair_change())
+
+    def test_maximum_rank_difference_enforced(self):
+        """Test players further apart than maximum_rank_difference are never paired."""
+        self.engine.apply_config(self.engine.config.replace(maximum_rank_difference=2))
+        self.engine.add_to_queue(daniel(1, "Hyde", 1))
+        self.engine.add_to_queue(daniel(2, "Linne", 10))
+        self.assertEqual(self.engine.matchmake(), [])
+
+        self.engine.add_to_queue(daniel(3, "Linne", 3))
+        matches = self.engine.matchmake()
+        self.assertEqual([(d1['discord_id'], d2['discord_id']) for d1, d2 in matches], [(1, 3)])
+
+    def test_occupied_dans_near(self):
+        """Test only non-empty buckets in the window are visited, nearest first with the higher dan winning ties."""
+        for discord_id, dan in ((1, 2), (2, 4), (3, 6), (4, 9), (5, 5)):
+            self.engine.add_to_queue(daniel(discord_id, "Hyde", dan))
+
+        self.assertEqual(list(self.engine.occupied_dans_near(5, 3)), [5, 6, 4, 2])
+        self.assertEqual(list(self.engine.occupied_dans_near(1, 2)), [2])
+
+        self.engine.remove_from_queue(5)
+        self.assertEqual(list(self.engine.occupied_dans_near(5, 1)), [6, 4])
+
+    def test_apply_config_resizes_dans(self):
+        """Test changing total_dans adds buckets and drops players queued in dans that no longer exist."""
+        self.engine.add_to_queue(daniel(1, "Hyde", 2))
+        self.engine.add_to_queue(daniel(2, "Linne", 9))
+
+        self.engine.apply_config(self.engine.config.replace(total_dans=5))
+        self.assertEqual(sorted(self.engine.dans_in_queue), [1, 2, 3, 4, 5])
+        self.assertEqual([d['discord_id'] for d in self.engine.matchmaking_queue], [1])
+        self.assertFalse(self.engine.is_queued(2, "Linne"))
+
+        self.engine.apply_config(self.engine.config.replace(total_dans=12))
+        self.engine.add_to_queue(daniel(3, "Linne", 12))
+        self.assertEqual(list(self.engine.occupied_dans_near(12, 12)), [12, 2])
+
+    def test_wait_percentiles(self):
+        """Test matched waits are recorded per dan."""
+        self.engine.add_to_queue(daniel(1, "Hyde", 3))
+        self.engine.add_to_queue(daniel(2, "Linne", 3))
+        self.engine.matchmake()
+
+        stats = self.engine.wait_percentiles()
+        self.assertEqual(list(stats), [3])
+        p50, p95, p99, samples = stats[3]
+        self.assertEqual(samples, 2)
+        self.assertTrue(0 <= p50 <= p95 <= p99)
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_matrix_path_matches_pure_python(self):
+        """Test the numpy pairing path makes the same matches as the pure Python one."""
+        for seed in range(20):
+            rng = random.Random(seed)
+            config = {"maximum_rank_difference": rng.randint(0, 3), "rank_window_relax_seconds": rng.choice([0, 20]), "max_active_matches": rng.randint(5, 40)}
+            entries = [daniel(rng.randint(1, 40), rng.choice(["Hyde", "Linne", "Vatista"]), rng.randint(1, 10)) for _ in range(80)]
+            recent = [(rng.randint(1, 40), rng.randint(1, 40)) for _ in range(60)]
+            busy = rng.sample(range(1, 41), 3)
+
+            stamps = sorted(rng.uniform(1000, 1100) for _ in entries)
+
+            results = []
+            for threshold in (0, 10**6):
+                engine = MatchmakingEngine(1, LadderConfig.from_dict(config), clock=lambda: 1100.0)
+                for entry, stamp in zip(entries, stamps):
+                    if not engine.is_queued(entry['discord_id'], entry['character']):
+                        engine.add_to_queue(dict(entry))
+                        engine.matchmaking_queue[-1]['enqueued_at'] = stamp
+                for entry in engine.waiting():
+                    for player, opponent in recent:
+                        if entry['discord_id'] == player:
+                            engine.recent.record(player, entry['character'], opponent)
+                for discord_id in busy:
+                    engine.sessions.set_in_match(discord_id, True)
+
+                with patch("cogs.matchmaking.MATRIX_QUEUE_THRESHOLD", threshold):
+                    pairs = engine.matchmake()
+                results.append([((d1['discord_id'], d1['character']), (d2['discord_id'], d2['character'])) for d1, d2 in pairs])
+
+            self.assertEqual(results[0], results[1], f"seed {seed}")
+            self.assertTrue(results[0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+import sys
+import os
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+import discord
+from utils.members import MemberResolver, member_cache_options
+
+def guild(guild_id, cached=(), remote=()):
+    # A guild with `cached` members in py-cord's cache and `remote` ones only fetchable from Discord
+    g = MagicMock()
+    g.id = guild_id
+    cached = {m.id: m for m in cached}
+    remote = {m.id: m for m in remote}
+    g.get_member.side_effect = cached.get
+
+    async def fetch_member(member_id):
+        if member_id not in remote:
+            raise discord.NotFound(MagicMock(status=404), "Unknown Member")
+        return remote[member_id]
+    g.fetch_member = AsyncMock(side_effect=fetch_member)
+    return g
+
+def member(member_id, g):
+    m = MagicMock()
+    m.id = member_id
+    m.guild = g
+    return m
+
+class TestMemberResolver(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.resolver = MemberResolver(size=2, max_age=60, clock=lambda: self.now)
+
+    async def test_cached_member_is_not_fetched(self):
+        """Test members in py-cord's cache are returned without asking Discord."""
+        g = guild(1)
+        m = member(10, g)
+        g.get_member.side_effect = {10: m}.get
+
+        self.assertIs(await self.resolver.get(g, 10), m)
+        g.fetch_member.assert_not_awaited()
+        self.assertEqual(len(self.resolver), 0)
+
+    async def test_fetched_member_is_kept(self):
+        """Test a fetched member is reused until it's older than max_age."""
+        g = guild(1)
+        m = member(10, g)
+        g.fetch_member = AsyncMock(return_value=m)
+
+        self.assertIs(await self.resolver.get(g, 10), m)
+        self.assertIs(await self.resolver.get(g, 10), m)
+        self.assertEqual(g.fetch_member.await_count, 1)
+
+        self.now = 61
+        await self.resolver.get(g, 10)
+        self.assertEqual(g.fetch_member.await_count, 2)
+        self.assertEqual(self.resolver.fetches, 2)
+
+    async def test_missing_member(self):
+        """Test members that left the guild resolve to None and aren't cached."""
+        g = guild(1)
+        self.assertIsNone(await self.resolver.get(g, 10))
+        self.assertEqual(len(self.resolver), 0)
+
+    async def test_least_recently_used_evicted(self):
+        """Test the cache keeps only the most recently used members, per guild."""
+        g1, g2 = guild(1), guild(2)
+        a, b, c = member(10, g1), member(10, g2), member(11, g1)
+        g1.fetch_member = AsyncMock(side_effect=lambda member_id: {10: a, 11: c}[member_id])
+        g2.fetch_member = AsyncMock(return_value=b)
+
+        await self.resolver.get(g1, 10)
+        await self.resolver.get(g2, 10)
+        await self.resolver.get(g1, 10)  # Now more recently used than g2's member
+        await self.resolver.get(g1, 11)
+
+        self.assertEqual(list(self.resolver.members), [(1, 10), (1, 11)])
+
+    async def test_forget(self):
+        """Test forgotten members are fetched again."""
+        g = guild(1)
+        g.fetch_member = AsyncMock(return_value=member(10, g))
+        await self.resolver.get(g, 10)
+        self.resolver.forget(1, 10)
+        await self.resolver.get(g, 10)
+        self.assertEqual(g.fetch_member.await_count, 2)
+
+class TestMemberCacheOptions(unittest.TestCase):
+    def test_modes(self):
+        """Test lazy mode turns off chunking and the member cache, full mode keeps py-cord's defaults."""
+        self.assertEqual(member_cache_options("full"), {})
+        options = member_cache_options("lazy")
+        self.assertFalse(options["chunk_guilds_at_startup"])
+        self.assertEqual(options["member_cache_flags"].value, discord.MemberCacheFlags.none().value)
+        with self.assertRaises(ValueError):
+            member_cache_options("some")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import sqlite3
+import sys
+import os
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from cogs.database import create_tables
+from cogs.profiles import ProfileCache, query_profile
+
+class TestProfiles(unittest.TestCase):
+    def test_query_profile(self):
+        """Test one query returns the user, overall record and per character record."""
+        con = sqlite3.connect(":memory:")
+        con.row_factory = sqlite3.Row
+        create_tables(con)
+        con.executemany("INSERT INTO users (guild_id, discord_id, player_name, nickname, keyword) VALUES (?, ?, ?, ?, ?)",
+                        [(100, 1, "a", "A", "pw"), (100, 2, "b", "B", None)])
+        con.executemany("INSERT INTO players (guild_id, discord_id, character, dan, points) VALUES (?, ?, ?, ?, ?)",
+                        [(100, 1, "Hyde", 3, 1.5), (100, 1, "Linne", 1, 0), (100, 2, "Hyde", 2, 0)])
+        con.executemany("INSERT INTO matches (guild_id, winner_discord_id, winner_character, loser_discord_id, loser_character) VALUES (?, ?, ?, ?, ?)",
+                        [(100, 1, "Hyde", 2, "Hyde"), (100, 1, "Hyde", 2, "Hyde"), (100, 2, "Hyde", 1, "Hyde"),
+                         (100, 1, "Gran", 2, "Hyde"), (200, 2, "Hyde", 1, "Hyde")])
+
+        profile = query_profile(con, 100, 1)
+
+        self.assertEqual((profile['nickname'], profile['keyword'], profile['wins'], profile['losses']), ("A", "pw", 3, 1))
+        self.assertEqual(sorted(profile['characters'], key=lambda char: char['character']), [
+            {"character": "Hyde", "dan": 3, "points": 1.5, "wins": 2, "losses": 1},
+            {"character": "Linne", "dan": 1, "points": 0, "wins": 0, "losses": 0},
+        ])
+        self.assertIsNone(query_profile(con, 100, 3))
+        con.close()
+
+    def test_cache_invalidation(self):
+        """Test cached profiles are dropped per user, per guild and least recently viewed first."""
+        cache = ProfileCache(size=2)
+        cache.put(100, 1, "one")
+        cache.put(100, 2, "two")
+        cache.get(100, 1)
+        cache.put(200, 1, "other guild")
+
+        self.assertIsNone(cache.get(100, 2))
+        cache.invalidate(100, 1)
+        self.assertIsNone(cache.get(100, 1))
+        cache.put(100, 1, "one")
+        cache.clear(100)
+        self.assertIsNone(cache.get(100, 1))
+        self.assertEqual(cache.get(200, 1), "other guild")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+import sys
+import os
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from utils.ratelimit import RateLimiter, RateLimited
+from cogs.danisen import Danisen
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.limiter = RateLimiter(size=2, clock=lambda: self.now)
+
+    def test_burst_then_refill(self):
+        """Test a bucket allows `uses` at once, then one more use per seconds/uses."""
+        key = (1, 10, "joinqueue")
+        for _ in range(3):
+            self.assertEqual(self.limiter.acquire(key, 3, 30), 0)
+        self.assertAlmostEqual(self.limiter.acquire(key, 3, 30), 10)
+
+        self.now = 10
+        self.assertEqual(self.limiter.acquire(key, 3, 30), 0)
+        self.assertGreater(self.limiter.acquire(key, 3, 30), 0)
+        self.assertEqual(self.limiter.allowed["joinqueue"], 4)
+        self.assertEqual(self.limiter.limited["joinqueue"], 2)
+
+    def test_buckets_are_separate(self):
+        """Test users and commands each have their own bucket."""
+        self.assertEqual(self.limiter.acquire((1, 10, "leaderboard"), 1, 30), 0)
+        self.assertEqual(self.limiter.acquire((1, 11, "leaderboard"), 1, 30), 0)
+        self.assertGreater(self.limiter.acquire((1, 10, "leaderboard"), 1, 30), 0)
+
+    def test_bounded(self):
+        """Test only the most recently used buckets are kept."""
+        for user_id in range(5):
+            self.limiter.acquire((1, user_id, "leaderboard"), 1, 30)
+        self.assertEqual(len(self.limiter), 2)
+        self.assertEqual(list(self.limiter.buckets), [(1, 3, "leaderboard"), (1, 4, "leaderboard")])
+
+class TestCogRateLimit(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.danisen = Danisen(MagicMock(), MagicMock(), "nonexistent_config.json")
+        self.danisen.raw_config = {"rate_limits": {"joinqueue": "1/60"}}
+        self.danisen.guild_configs = {}
+
+    def ctx(self, name, user_id=10):
+        ctx = MagicMock()
+        ctx.command.qualified_name = name
+        ctx.guild_id = 1
+        ctx.author.id = user_id
+        ctx.respond = AsyncMock()
+        return ctx
+
+    async def test_check_and_response(self):
+        """Test the cog check refuses a user over the limit, aliases included, with an ephemeral reply."""
+        self.assertTrue(self.danisen.cog_check(self.ctx("joinqueue")))
+        self.assertTrue(self.danisen.cog_check(self.ctx("jq", user_id=11)))
+        self.assertTrue(self.danisen.cog_check(self.ctx("leavequeue")))  # Not limited in this config
+
+        ctx = self.ctx("jq")
+        with self.assertRaises(RateLimited) as raised:
+            self.danisen.cog_check(ctx)
+        await self.danisen.cog_command_error(ctx, raised.exception)
+        ctx.respond.assert_awaited_once_with("Slow down! You can use /joinqueue again in 60 seconds.", ephemeral=True)
+        self.assertEqual(self.danisen.rate_limiter.limited["joinqueue"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import sqlite3
+import sys
+import os
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from cogs.database import create_tables, add_match_timestamps
+from cogs.recent_opponents import RecentOpponents, player_history
+
+class TestRecentOpponents(unittest.TestCase):
+    def test_count_expiry(self):
+        """Test only the last `limit` opponents are remembered, repeats included."""
+        recent = RecentOpponents(2)
+        recent.record(1, "Hyde", 2)
+        recent.record(1, "Hyde", 3)
+        recent.record(1, "Hyde", 3)
+
+        self.assertFalse(recent.has_played(1, "Hyde", 2))
+        self.assertTrue(recent.has_played(1, "Hyde", 3))
+        self.assertFalse(recent.has_played(1, "Linne", 3))
+
+    def test_time_expiry(self):
+        """Test opponents drop out once expiry_seconds have passed since the match."""
+        recent = RecentOpponents(3, expiry_seconds=60)
+        recent.record(1, "Hyde", 2, played_at=1000)
+        recent.record(1, "Hyde", 3, played_at=1050)
+
+        self.assertEqual(recent.expires_at(1, "Hyde", now=1010), 1060)
+        self.assertEqual(sorted(recent.opponents(1, "Hyde", now=1059)), [2, 3])
+        self.assertEqual(recent.opponents(1, "Hyde", now=1061), [3])
+        self.assertFalse(recent.has_played(1, "Hyde", 3, now=1111))
+
+    def test_configure_shrinks_limit(self):
+        """Test lowering the limit keeps the newest opponents instead of failing."""
+        recent = RecentOpponents(3)
+        for opponent in (2, 3, 4):
+            recent.record(1, "Hyde", opponent)
+
+        recent.configure(1, 0)
+
+        self.assertEqual(recent.opponents(1, "Hyde"), [4])
+        recent.record(1, "Hyde", 5)
+        self.assertEqual(recent.opponents(1, "Hyde"), [5])
+
+    def test_player_history(self):
+        """Test a player's recent opponents are refilled from their own matches in the guild, oldest first."""
+        con = sqlite3.connect(":memory:")
+        create_tables(con)
+        add_match_timestamps(con)
+        con.executemany(
+            "INSERT INTO matches (guild_id, winner_discord_id, winner_character, loser_discord_id, loser_character, played_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [(100, 1, "Hyde", 2, "Linne", 10), (100, 3, "Hyde", 1, "Hyde", 20), (200, 1, "Hyde", 4, "Linne", 30), (100, 2, "Linne", 3, "Hyde", 40)]
+        )
+
+        history = player_history(con, 100, 1)
+        self.assertEqual(history, [("Hyde", 2, 10), ("Hyde", 3, 20)])
+
+        recent = RecentOpponents(1)
+        recent.record(1, "Vatista", 5)
+        recent.restore(1, history)
+
+        self.assertEqual(recent.opponents(1, "Hyde"), [3])
+        self.assertEqual(recent.opponents(1, "Vatista"), [])
+        self.assertEqual(recent.opponents(2, "Linne"), [])
+        con.close()
+
+if __name__ == "__main__":
+    unittest.main()
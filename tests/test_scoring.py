@@ -0,0 +1,35 @@
+import unittest
+import sys
+import os
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from cogs.scoring import score_match
+from utils.config import LadderConfig
+
+class TestScoring(unittest.TestCase):
+    def setUp(self):
+        self.config = LadderConfig.from_dict({"minimum_derank": 1, "rank_gap_for_more_points_1": 2, "rank_gap_for_more_points_2": 4})
+
+    def test_even_match(self):
+        """Test a match between equal dans moves one point each way."""
+        winner, loser = score_match(3, 0.0, 3, 0.0, self.config)
+        self.assertEqual(winner, [3, 1.0, False, 1.0, False])
+        self.assertEqual(loser, [3, -1.0, False, -1.0, False])
+
+    def test_upset_rankup_and_rankdown(self):
+        """Test an upset across the second rank gap ranks the winner up and the loser down."""
+        winner, loser = score_match(2, 1.0, 6, -2.5, self.config)
+        self.assertEqual(winner[:3], [3, 1.0, True])
+        self.assertEqual(loser[:3], [5, 0.0, True])
+
+    def test_special_rank_up_block(self):
+        """Test special rules stop a high dan ranking up off a lower dan."""
+        winner, _ = score_match(7, 4.8, 6, 0.0, self.config.replace(special_rank_up_rules=True))
+        self.assertEqual(winner[0], 7)
+        self.assertAlmostEqual(winner[1], 4.9)
+        self.assertTrue(winner[4])
+
+if __name__ == "__main__":
+    unittest.main()
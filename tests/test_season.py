@@ -0,0 +1,54 @@
+import unittest
+from unittest.mock import patch
+import sqlite3
+import tempfile
+import sys
+import os
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from cogs.season import rollover_season, create_seasons_table
+
+class TestSeason(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "danisen.db")
+        self.con = sqlite3.connect(self.db_path)
+        self.con.execute("CREATE TABLE players(discord_id INT, character TEXT, dan INT, points FLOAT)")
+        self.con.executemany("INSERT INTO players VALUES (?, ?, ?, ?)", [(1, "Hyde", 5, 2.0), (2, "Linne", 3, -1.0)])
+        self.con.commit()
+
+    def tearDown(self):
+        self.con.close()
+        self.tmp_dir.cleanup()
+
+    async def test_rollover_archives_and_resets(self):
+        """Test the archive keeps the finished season and the live database is reset."""
+        archive_path = os.path.join(self.tmp_dir.name, "seasons", "season_1.db")
+
+        path, players_reset = await rollover_season(self.con, archive_path)
+
+        self.assertEqual(path, archive_path)
+        self.assertEqual(players_reset, 2)
+        self.assertEqual(self.con.execute("SELECT DISTINCT dan, points FROM players").fetchall(), [(1, 0.0)])
+        self.assertEqual(self.con.execute("SELECT archive_path, players_reset FROM seasons").fetchall(), [(archive_path, 2)])
+
+        archive = sqlite3.connect(archive_path)
+        self.assertEqual(archive.execute("SELECT dan, points FROM players ORDER BY discord_id").fetchall(), [(5, 2.0), (3, -1.0)])
+        archive.close()
+
+    async def test_rollover_default_archive_path(self):
+        """Test the default archive name is numbered by season."""
+        create_seasons_table(self.con)
+        self.con.execute("INSERT INTO seasons (ended_at, archive_path, players_reset) VALUES (0, 'old.db', 0)")
+        self.con.commit()
+
+        with patch("cogs.season.SEASONS_DIR", self.tmp_dir.name):
+            path, _ = await rollover_season(self.con)
+
+        self.assertTrue(os.path.basename(path).startswith("danisen_season_2_"))
+        self.assertTrue(os.path.exists(path))
+
+if __name__ == "__main__":
+    unittest.main()
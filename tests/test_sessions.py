@@ -0,0 +1,78 @@
+import unittest
+import sys
+import os
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from cogs.matchmaking import MatchmakingEngine
+from cogs.recent_opponents import RecentOpponents
+from cogs.sessions import SessionTable
+from utils.config import LadderConfig
+
+class TestSessionTable(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.loaded = []
+        self.recent = RecentOpponents(3, clock=lambda: self.now)
+        self.sessions = SessionTable(self.recent, clock=lambda: self.now, idle_seconds=100, history=self.history)
+
+    def history(self, discord_id):
+        self.loaded.append(discord_id)
+        return [("Hyde", 9, 0.0)]
+
+    def test_state_is_per_character_and_player(self):
+        """Test queued state is kept per character and match state per player."""
+        self.sessions.set_queued(1, "Hyde", True)
+        self.sessions.set_in_match(2, True)
+
+        self.assertTrue(self.sessions.is_queued(1, "Hyde"))
+        self.assertFalse(self.sessions.is_queued(1, "Linne"))
+        self.assertFalse(self.sessions.is_in_match(1))
+        self.assertTrue(self.sessions.is_in_match(2))
+        self.assertFalse(self.sessions.is_queued(3, "Hyde"))
+        self.assertEqual(len(self.sessions), 2)
+
+    def test_idle_sessions_evicted(self):
+        """Test only sessions idle for longer than the TTL are dropped, along with their recent opponents."""
+        self.sessions.set_queued(1, "Hyde", True)
+        self.sessions.set_queued(1, "Hyde", False)
+        self.sessions.set_queued(2, "Hyde", True)
+        self.sessions.set_in_match(3, True)
+        self.now = 50.0
+        self.sessions.set_queued(4, "Hyde", False)
+
+        self.now = 120.0
+        self.assertEqual(self.sessions.evict_idle(), 1)
+
+        self.assertIsNone(self.sessions.get(1))
+        self.assertNotIn(1, self.recent.rings)
+        self.assertTrue(self.sessions.is_queued(2, "Hyde"))
+        self.assertTrue(self.sessions.is_in_match(3))
+        self.assertIsNotNone(self.sessions.get(4))
+
+    def test_returning_player_history_restored(self):
+        """Test a new session refills the player's recent opponents from their history once."""
+        self.sessions.set_queued(1, "Hyde", True)
+        self.sessions.set_queued(1, "Linne", True)
+
+        self.assertEqual(self.loaded, [1])
+        self.assertTrue(self.recent.has_played(1, "Hyde", 9))
+
+    def test_engine_frees_players(self):
+        """Test the engine's sessions follow a player from the queue into a match and out again."""
+        engine = MatchmakingEngine(1, LadderConfig.from_dict({}))
+        p1 = {"player_name": "Player1", "discord_id": 1, "character": "Hyde", "dan": 1}
+        p2 = {"player_name": "Player2", "discord_id": 2, "character": "Linne", "dan": 1}
+        engine.add_to_queue(p1)
+        engine.add_to_queue(p2)
+
+        engine.matchmake()
+        self.assertFalse(engine.is_queued(1, "Hyde"))
+        self.assertTrue(engine.is_in_match(1) and engine.is_in_match(2))
+
+        engine.end_match(engine.active.for_player(1).match_id)
+        self.assertFalse(engine.is_in_match(1) or engine.is_in_match(2))
+
+if __name__ == "__main__":
+    unittest.main()
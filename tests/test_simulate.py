@@ -0,0 +1,36 @@
+import unittest
+import sys
+import os
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from simulate import simulate, parse_grid, spearman
+
+class TestSimulate(unittest.TestCase):
+    def test_simulation_is_deterministic(self):
+        """Test a seeded run plays matches and gives the same summary every time."""
+        first = simulate({"max_active_matches": 3}, players=30, hours=2, seed=4)
+        second = simulate({"max_active_matches": 3}, players=30, hours=2, seed=4)
+
+        self.assertEqual(first, second)
+        self.assertGreater(first["matches"], 0)
+        self.assertEqual(sum(first["dan_distribution"].values()), 30)
+        self.assertEqual(len(first["skill_dan_correlation"]), 2)
+
+    def test_parse_grid(self):
+        """Test grid arguments expand to every combination with JSON typed values."""
+        self.assertEqual(parse_grid(["point_rollover=true,false", "point_multiplier=1,1.5"]), [
+            {"point_rollover": True, "point_multiplier": 1}, {"point_rollover": True, "point_multiplier": 1.5},
+            {"point_rollover": False, "point_multiplier": 1}, {"point_rollover": False, "point_multiplier": 1.5},
+        ])
+        self.assertEqual(parse_grid([]), [{}])
+
+    def test_spearman(self):
+        """Test rank correlation at both extremes and with a constant column."""
+        self.assertAlmostEqual(spearman([1, 2, 3], [10, 20, 30]), 1.0)
+        self.assertAlmostEqual(spearman([1, 2, 3], [3, 2, 1]), -1.0)
+        self.assertEqual(spearman([1, 2, 3], [5, 5, 5]), 0.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+import sqlite3
+import tempfile
+import sys
+import os
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from main import prepare_database
+from utils.startup import StartupProfiler
+
+class TestStartup(unittest.TestCase):
+    def test_prepare_database(self):
+        """Test the startup database step creates every table on a fresh file."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "danisen.db")
+            prepare_database(path)
+            prepare_database(path)  # Already prepared, nothing left to do
+
+            con = sqlite3.connect(path)
+            tables = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            con.close()
+            self.assertTrue({"users", "players", "matches", "seasons"} <= tables)
+
+    def test_profiler_phases(self):
+        """Test phases are recorded in order, with the modules they imported."""
+        profiler = StartupProfiler(enabled=True)
+        with profiler.phase("first"):
+            sys.modules["_startup_test_module"] = object()
+        with profiler.phase("second"):
+            pass
+        del sys.modules["_startup_test_module"]
+
+        self.assertEqual([name for name, _, _ in profiler.phases], ["first", "second"])
+        self.assertEqual(profiler.phases[0][2], 1)
+        with self.assertLogs("utils.startup", level="INFO"):
+            profiler.report("test")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import sqlite3
+import tempfile
+import threading
+from unittest.mock import patch
+import sys
+import os
+
+# Add the project src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from cogs.database import create_tables, enable_wal
+from cogs.stats import StatsSnapshots, query_stats, _query_stats_file
+
+class TestStats(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.con = sqlite3.connect(os.path.join(self.tmp_dir.name, "danisen.db"))
+        self.con.row_factory = sqlite3.Row
+        create_tables(self.con)
+        self.con.executemany("INSERT INTO users (guild_id, discord_id, player_name) VALUES (?, ?, ?)", [(100, 1, "a"), (100, 2, "b"), (200, 3, "c")])
+        self.con.executemany("INSERT INTO players (guild_id, discord_id, character, dan, points) VALUES (?, ?, ?, ?, ?)",
+                             [(100, 1, "Hyde", 1, 0), (100, 2, "Hyde", 2, 0), (200, 3, "Linne", 1, 0)])
+        self.con.execute("INSERT INTO matches (guild_id, winner_discord_id, winner_character, loser_discord_id, loser_character) VALUES (100, 1, 'Hyde', 2, 'Hyde')")
+        self.con.commit()
+
+    def tearDown(self):
+        self.con.close()
+        self.tmp_dir.cleanup()
+
+    def test_query_stats(self):
+        """Test the aggregates only count the given guild."""
+        general, characters, dans = query_stats(self.con, 100)
+        self.assertEqual(general, {"accounts": 2, "characters": 2, "total_games": 1})
+        self.assertEqual(characters, [{"name": "Hyde", "character_count": 2, "wins": 1, "losses": 1, "winrate": 50.0}])
+        self.assertEqual(dans, [{"name": 1, "value": 1}, {"name": 2, "value": 1}])
+
+    async def test_pages_cached_until_refresh(self):
+        """Test pages are served from memory and only recomputed once the guild is marked stale and refreshed."""
+        renders = []
+        stats = StatsSnapshots(self.con, lambda *data: renders.append(data) or [data[0]["total_games"]])
+
+        self.assertEqual(await stats.get(100), [1])
+        self.con.execute("INSERT INTO matches (guild_id, winner_discord_id, winner_character, loser_discord_id, loser_character) VALUES (100, 2, 'Hyde', 1, 'Hyde')")
+        self.con.commit()
+        self.assertEqual(await stats.get(100), [1])
+        self.assertEqual(len(renders), 1)
+
+        stats.mark_stale(100)
+        self.assertEqual(stats.stale, {100})
+        self.assertEqual(await stats.refresh(100), [2])
+        self.assertEqual(await stats.get(100), [2])
+        self.assertFalse(stats.stale)
+
+    def test_commit_during_stats_read(self):
+        """Test reports can commit while the stats thread is in the middle of a read."""
+        self.assertEqual(enable_wal(self.con), "wal")
+        self.con.execute("PRAGMA busy_timeout=100")
+        reading, committed, results = threading.Event(), threading.Event(), []
+
+        def slow_query(con, guild_id):
+            con.execute("BEGIN")
+            con.execute("SELECT COUNT(*) FROM matches").fetchone()  # The read transaction stays open until the query returns
+            reading.set()
+            committed.wait(5)
+            return query_stats(con, guild_id)
+
+        with patch("cogs.stats.query_stats", slow_query):
+            thread = threading.Thread(target=lambda: results.append(_query_stats_file(os.path.join(self.tmp_dir.name, "danisen.db"), 100)))
+            thread.start()
+            self.assertTrue(reading.wait(5))
+            self.con.execute("INSERT INTO matches (guild_id, winner_discord_id, winner_character, loser_discord_id, loser_character) VALUES (100, 2, 'Hyde', 1, 'Hyde')")
+            self.con.commit()
+            committed.set()
+            thread.join(5)
+
+        self.assertEqual(results[0][0]["total_games"], 1)  # The read sees the database as it was when it started
+
+if __name__ == "__main__":
+    unittest.main()